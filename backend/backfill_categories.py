@@ -0,0 +1,56 @@
+"""One-time backfill of status_class/ownership_class on existing camera_info documents.
+
+Usage: python backfill_categories.py [--dry-run]
+"""
+import argparse
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+
+from categories import with_categories
+
+
+BATCH_SIZE = 500
+
+
+def backfill(db, dry_run: bool = False) -> int:
+    batch = db.batch()
+    operations_count = 0
+    updated = 0
+
+    for doc in db.collection("camera_info").stream():
+        camera_data = doc.to_dict()
+        categories = with_categories(dict(camera_data))
+        changes = {
+            key: categories[key]
+            for key in ("status_class", "ownership_class")
+            if camera_data.get(key) != categories[key]
+        }
+        if not changes:
+            continue
+
+        updated += 1
+        if dry_run:
+            continue
+        batch.update(doc.reference, changes)
+        operations_count += 1
+        if operations_count == BATCH_SIZE:
+            batch.commit()
+            batch = db.batch()
+            operations_count = 0
+
+    if operations_count > 0:
+        batch.commit()
+    return updated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="Only count the documents that need updating")
+    args = parser.parse_args()
+
+    cred = credentials.Certificate("cctv-locator-police-hackathon-firebase-adminsdk-w7zln-e12925260e.json")
+    firebase_admin.initialize_app(cred)
+
+    count = backfill(firestore.client(), dry_run=args.dry_run)
+    print(f"{'Would update' if args.dry_run else 'Updated'} {count} camera documents")
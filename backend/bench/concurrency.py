@@ -0,0 +1,112 @@
+"""Concurrency load test for a single uvicorn worker backed by the Firestore emulator.
+
+Fires the same mix of read requests at increasing concurrency levels and
+reports throughput and latency per level. With Firestore calls offloaded from
+the event loop, throughput of one worker keeps growing with concurrency until
+the Firestore thread pool (FIRESTORE_THREADS) saturates; with blocking calls it
+stays flat at the single-request rate.
+
+Setup:
+    gcloud emulators firestore start --host-port=localhost:8081
+    export FIRESTORE_EMULATOR_HOST=localhost:8081
+    python bench/concurrency.py --seed 5000          # seed cameras and tickets once
+    uvicorn main:app --port 8080 --workers 1          # from the backend directory
+    python bench/concurrency.py --url http://localhost:8080
+
+Requires httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from fleet import CENTER_LAT, CENTER_LON  # noqa: E402
+
+
+def seed(cameras: int, tickets: int) -> None:
+    import firebase_admin
+    from firebase_admin import firestore
+
+    from fleet import seed as seed_fleet
+
+    firebase_admin.initialize_app(options={"projectId": os.environ.get("FIREBASE_PROJECT_ID", "cctv-locator-local")})
+    seed_fleet(firestore.client(), cameras, tickets)
+    print(f"Seeded {cameras} cameras and {tickets} tickets")
+
+
+async def run_level(client: httpx.AsyncClient, concurrency: int, requests: int, camera_ids):
+    latencies = []
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(i)
+
+    async def one(i):
+        if i % 3 == 0:
+            return await client.get("/tickets")
+        if i % 3 == 1 and camera_ids:
+            return await client.get(f"/cameras/{camera_ids[i % len(camera_ids)]}")
+        return await client.post("/nearby_cameras", json={
+            "latitude": CENTER_LAT + random.uniform(-0.1, 0.1),
+            "longitude": CENTER_LON + random.uniform(-0.1, 0.1),
+            "radius_meters": 2000,
+        })
+
+    async def worker():
+        while True:
+            try:
+                i = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            await one(i)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "throughput": requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+async def main(url: str, levels, requests: int):
+    async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+        # Camera IDs for the read_camera part of the mix
+        response = await client.post("/nearby_cameras", json={
+            "latitude": CENTER_LAT, "longitude": CENTER_LON, "radius_meters": 5000,
+        })
+        camera_ids = [camera["id"] for camera in response.json()][:200] if response.is_success else []
+
+        print(f"{'concurrency':>11} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9}")
+        for level in levels:
+            result = await run_level(client, level, requests, camera_ids)
+            print(f"{result['concurrency']:>11} {result['throughput']:>9.1f} "
+                  f"{result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8080")
+    parser.add_argument("--levels", default="1,4,16,64", help="Comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=300, help="Requests per concurrency level")
+    parser.add_argument("--seed", type=int, metavar="CAMERAS", help="Seed the emulator with this many cameras and exit")
+    parser.add_argument("--tickets", type=int, default=1000, help="Tickets to seed along with --seed")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        if not os.environ.get("FIRESTORE_EMULATOR_HOST"):
+            sys.exit("Refusing to seed: FIRESTORE_EMULATOR_HOST is not set")
+        seed(args.seed, args.tickets)
+    else:
+        asyncio.run(main(args.url, [int(level) for level in args.levels.split(",")], args.requests))
@@ -0,0 +1,300 @@
+"""In-memory stand-in for the parts of the Firestore client the API uses.
+
+Implements collection/document references, where/order_by/limit/start_after/
+select queries, batches, get_all and on_snapshot listeners, with the same
+call signatures as google.cloud.firestore. Data lives in plain dicts, so
+benchmarks measure the API's own work rather than network round trips.
+Not a faithful emulator: transactions, composite index rules and
+sentinels other than Increment are not modelled. Write preconditions are,
+with update times that are per-document write counters.
+"""
+import copy
+import enum
+import operator
+import threading
+import uuid
+from typing import Dict, List, Optional
+
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition
+from google.cloud.firestore import Increment
+
+_OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda value, options: value in options,
+}
+
+
+def _apply(document: dict, data: dict, merge: bool) -> None:
+    """Write data into document, resolving Increment and merging nested maps when ``merge``."""
+    for key, value in data.items():
+        if isinstance(value, Increment):
+            current = document.get(key)
+            document[key] = (current if isinstance(current, (int, float)) else 0) + value.value
+        elif merge and isinstance(value, dict):
+            if not isinstance(document.get(key), dict):
+                document[key] = {}
+            _apply(document[key], value, merge)
+        else:
+            document[key] = copy.deepcopy(value)
+
+
+class ChangeType(enum.Enum):
+    ADDED = 1
+    MODIFIED = 2
+    REMOVED = 3
+
+
+class DocumentSnapshot:
+    def __init__(self, reference: "DocumentReference", data: Optional[dict], update_time: Optional[int] = None):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.exists = data is not None
+        self.update_time = update_time
+
+    def to_dict(self) -> Optional[dict]:
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field: str):
+        return (self._data or {}).get(field)
+
+
+class DocumentChange:
+    def __init__(self, change_type: ChangeType, document: DocumentSnapshot):
+        self.type = change_type
+        self.document = document
+
+
+def _passes(data: dict, filters) -> bool:
+    return all(data.get(field) is not None and test(data[field], value) for field, test, value in filters)
+
+
+class Watch:
+    def __init__(self, client: "Client", collection: str, callback, filters=()):
+        self._client, self._collection, self._callback = client, collection, callback
+        self._filters = list(filters)
+        self.is_active = True
+
+    def matches(self, data: Optional[dict]) -> bool:
+        # Deletes are always reported, whether or not the document was in the result set
+        return data is None or _passes(data, self._filters)
+
+    def unsubscribe(self) -> None:
+        self.is_active = False
+        self._client._watches.remove(self)
+
+
+class DocumentReference:
+    def __init__(self, client: "Client", collection: str, document_id: str):
+        self._client = client
+        self._collection = collection
+        self.id = document_id
+
+    def get(self) -> DocumentSnapshot:
+        with self._client._lock:
+            data = self._client._store(self._collection).get(self.id)
+            update_time = self._client._versions.get((self._collection, self.id)) if data is not None else None
+            return DocumentSnapshot(self, copy.deepcopy(data), update_time)
+
+    def set(self, data: dict, merge: bool = False) -> None:
+        self._client._write([(self, "set", data, merge, None)])
+
+    def update(self, data: dict) -> None:
+        self._client._write([(self, "update", data, False, None)])
+
+    def delete(self) -> None:
+        self._client._write([(self, "delete", None, False, None)])
+
+
+class Query:
+    def __init__(self, client: "Client", collection: str, filters=(), orders=(), limit=None, start_after=None,
+                 fields=None):
+        self._client = client
+        self._collection = collection
+        self._filters = list(filters)
+        self._orders = list(orders)
+        self._limit = limit
+        self._start_after = start_after
+        self._fields = fields
+
+    def _with(self, **changes) -> "Query":
+        query = Query(self._client, self._collection, self._filters, self._orders, self._limit,
+                      self._start_after, self._fields)
+        for name, value in changes.items():
+            setattr(query, f"_{name}", value)
+        return query
+
+    def where(self, field: str, op: str, value) -> "Query":
+        return self._with(filters=self._filters + [(field, _OPERATORS[op], value)])
+
+    def order_by(self, field: str, direction: str = "ASCENDING") -> "Query":
+        return self._with(orders=self._orders + [(field, direction)])
+
+    def limit(self, count: int) -> "Query":
+        return self._with(limit=count)
+
+    def start_after(self, snapshot: DocumentSnapshot) -> "Query":
+        return self._with(start_after=snapshot)
+
+    def select(self, fields: List[str]) -> "Query":
+        return self._with(fields=list(fields))
+
+    def _sort_key(self, field: str, document_id: str, data: dict):
+        return document_id if field == "__name__" else data.get(field)
+
+    def stream(self):
+        with self._client._lock:
+            rows = [
+                (document_id, copy.deepcopy(data))
+                for document_id, data in self._client._store(self._collection).items()
+                if _passes(data, self._filters)
+            ]
+
+        # Like Firestore, ordering by a field drops documents without it
+        for field, direction in reversed(self._orders + [("__name__", "ASCENDING")]):
+            rows = [row for row in rows if field == "__name__" or row[1].get(field) is not None]
+            rows.sort(key=lambda row: self._sort_key(field, *row), reverse=(direction == "DESCENDING"))
+
+        if self._start_after is not None:
+            ids = [document_id for document_id, _ in rows]
+            if self._start_after.id in ids:
+                rows = rows[ids.index(self._start_after.id) + 1:]
+            else:
+                cursor = self._start_after.to_dict() or {}
+                rows = [row for row in rows if self._after_cursor(row, cursor)]
+        if self._limit is not None:
+            rows = rows[:self._limit]
+
+        for document_id, data in rows:
+            if self._fields is not None:
+                data = {field: value for field, value in data.items() if field in self._fields}
+            yield DocumentSnapshot(DocumentReference(self._client, self._collection, document_id), data)
+
+    def _after_cursor(self, row, cursor: dict) -> bool:
+        for field, direction in self._orders:
+            value, bound = row[1].get(field), cursor.get(field)
+            if value != bound:
+                return value > bound if direction == "ASCENDING" else value < bound
+        return False
+
+    def get(self) -> List[DocumentSnapshot]:
+        return list(self.stream())
+
+    def on_snapshot(self, callback) -> Watch:
+        watch = Watch(self._client, self._collection, callback, self._filters)
+        with self._client._lock:
+            documents = self.get()
+            self._client._watches.append(watch)
+        threading.Thread(target=callback, args=(documents, [], None), daemon=True).start()
+        return watch
+
+
+class CollectionReference(Query):
+    def document(self, document_id: Optional[str] = None) -> DocumentReference:
+        return DocumentReference(self._client, self._collection, document_id or uuid.uuid4().hex[:20])
+
+
+class WriteOption:
+    def __init__(self, last_update_time=None, exists: Optional[bool] = None):
+        self.last_update_time = last_update_time
+        self.exists = exists
+
+
+class WriteBatch:
+    def __init__(self, client: "Client"):
+        self._client = client
+        self._writes = []
+
+    def create(self, reference: DocumentReference, data: dict) -> None:
+        self._writes.append((reference, "create", data, False, None))
+
+    def set(self, reference: DocumentReference, data: dict, merge: bool = False) -> None:
+        self._writes.append((reference, "set", data, merge, None))
+
+    def update(self, reference: DocumentReference, data: dict, option: Optional[WriteOption] = None) -> None:
+        self._writes.append((reference, "update", data, False, option))
+
+    def delete(self, reference: DocumentReference, option: Optional[WriteOption] = None) -> None:
+        self._writes.append((reference, "delete", None, False, option))
+
+    def __len__(self) -> int:
+        return len(self._writes)
+
+    def commit(self) -> None:
+        self._client._write(self._writes)
+        self._writes = []
+
+
+class Client:
+    def __init__(self):
+        self._data: Dict[str, Dict[str, dict]] = {}
+        self._lock = threading.RLock()
+        self._watches: List[Watch] = []
+        self._versions: Dict[tuple, int] = {}
+        self._version = 0
+
+    def _store(self, collection: str) -> Dict[str, dict]:
+        return self._data.setdefault(collection, {})
+
+    def collection(self, name: str) -> CollectionReference:
+        return CollectionReference(self, name)
+
+    def write_option(self, last_update_time=None, exists: Optional[bool] = None) -> WriteOption:
+        return WriteOption(last_update_time, exists)
+
+    def batch(self) -> WriteBatch:
+        return WriteBatch(self)
+
+    def get_all(self, references):
+        for reference in references:
+            yield reference.get()
+
+    def _write(self, writes) -> None:
+        """Apply writes atomically, then notify listeners of the changed documents."""
+        changes = []
+        with self._lock:
+            for reference, kind, data, merge, option in writes:
+                key = (reference._collection, reference.id)
+                if kind == "update" and reference.id not in self._store(reference._collection):
+                    raise KeyError(f"No document to update: {reference._collection}/{reference.id}")
+                if option is not None:
+                    exists = reference.id in self._store(reference._collection)
+                    if option.exists is not None and option.exists != exists:
+                        raise FailedPrecondition(f"Document existence mismatch: {reference._collection}/{reference.id}")
+                    if option.last_update_time is not None and (
+                            not exists or self._versions.get(key) != option.last_update_time):
+                        raise FailedPrecondition(f"Document changed: {reference._collection}/{reference.id}")
+                if kind == "create" and reference.id in self._store(reference._collection):
+                    raise AlreadyExists(f"Document already exists: {reference._collection}/{reference.id}")
+            for reference, kind, data, merge, _ in writes:
+                self._version += 1
+                self._versions[(reference._collection, reference.id)] = self._version
+                store = self._store(reference._collection)
+                existed = reference.id in store
+                if kind == "delete":
+                    store.pop(reference.id, None)
+                    if existed:
+                        changes.append((reference, ChangeType.REMOVED, None))
+                    continue
+                if kind == "update" or merge:
+                    _apply(store.setdefault(reference.id, {}), data, merge=(kind != "update"))
+                else:
+                    store[reference.id] = {}
+                    _apply(store[reference.id], data, merge=False)
+                changes.append((reference, ChangeType.MODIFIED if existed else ChangeType.ADDED,
+                                copy.deepcopy(store[reference.id])))
+            watches = list(self._watches)
+
+        for watch in watches:
+            watched = [
+                DocumentChange(change_type, DocumentSnapshot(reference, data))
+                for reference, change_type, data in changes
+                if reference._collection == watch._collection and watch.matches(data)
+            ]
+            if watched and watch.is_active:
+                watch._callback([], watched, None)
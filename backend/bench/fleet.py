@@ -0,0 +1,87 @@
+"""Synthetic camera fleets and tickets for the benchmarks."""
+import math
+import random
+from datetime import datetime, timedelta
+from typing import Iterator, List, Tuple
+
+from categories import with_categories
+from coordinates import with_coordinates
+
+# Center of the synthetic fleet (Hyderabad)
+CENTER_LAT, CENTER_LON = 17.385, 78.4867
+
+KM_PER_DEGREE = 111.32
+
+
+def synthetic_cameras(count: int, spread_km: float = 20.0, hotspots: int = 0, seed: int = 42
+                      ) -> Iterator[Tuple[str, dict]]:
+    """(camera_id, document) pairs shaped like stored camera_info documents.
+
+    Cameras are spread uniformly over a square of ``spread_km`` around the
+    center. With ``hotspots``, half of them are instead packed around that
+    many random points within ~300 m, which is what dense junctions and
+    markets look like and what makes nearby queries expensive.
+    """
+    rng = random.Random(seed)
+    half_lat = spread_km / 2 / KM_PER_DEGREE
+    half_lon = half_lat / math.cos(math.radians(CENTER_LAT))
+    centers = [(CENTER_LAT + rng.uniform(-half_lat, half_lat), CENTER_LON + rng.uniform(-half_lon, half_lon))
+               for _ in range(hotspots)]
+    for i in range(count):
+        if centers and i % 2 == 0:
+            lat, lon = rng.choice(centers)
+            lat, lon = lat + rng.gauss(0, 0.003), lon + rng.gauss(0, 0.003)
+        else:
+            lat, lon = CENTER_LAT + rng.uniform(-half_lat, half_lat), CENTER_LON + rng.uniform(-half_lon, half_lon)
+        camera_data = {
+            "location": f"Junction {rng.randint(1, 5000)}, Ward {rng.randint(1, 150)}",
+            "private_govt": rng.choice(["Govt.", "Private"]),
+            "owner_name": f"Owner {rng.randint(1, count // 4 + 1)}",
+            "contact_no": str(rng.randint(6000000000, 9999999999)),
+            "status": rng.choice(["Working", "Not Working", "Yes", "-do-"]),
+            "latitude": round(lat, 6),
+            "longitude": round(lon, 6),
+            "coverage": rng.choice(["Road", "Junction", "Entrance", "Parking"]),
+            "backup": rng.choice(["7 days", "15 days", "30 days"]),
+            "connected_network": rng.choice(["Yes", "No"]),
+        }
+        yield f"cam{i:09d}", with_coordinates(with_categories(camera_data))
+
+
+def synthetic_tickets(camera_ids: List[str], count: int, seed: int = 42) -> Iterator[Tuple[str, dict]]:
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    for i in range(count):
+        ticket_id = f"tkt{i:09d}"
+        yield ticket_id, {
+            "id": ticket_id,
+            "camera_id": rng.choice(camera_ids) if camera_ids else None,
+            "location": "Synthetic",
+            "description": "Camera offline",
+            "status": rng.choice(["Pending", "Pending", "Accepted", "Rejected", "Closed"]),
+            "reported_by": "Load test",
+            "reported_at": start + timedelta(minutes=i),
+        }
+
+
+def seed(db, cameras: int, tickets: int, spread_km: float = 20.0, hotspots: int = 0) -> List[str]:
+    """Write a synthetic fleet and tickets to ``db`` in 500-write batches; returns the camera IDs."""
+    batch, pending = db.batch(), 0
+    camera_ids = []
+
+    def add(collection: str, document_id: str, data: dict):
+        nonlocal batch, pending
+        batch.set(db.collection(collection).document(document_id), data)
+        pending += 1
+        if pending == 500:
+            batch.commit()
+            batch, pending = db.batch(), 0
+
+    for camera_id, camera_data in synthetic_cameras(cameras, spread_km, hotspots):
+        camera_ids.append(camera_id)
+        add("camera_info", camera_id, camera_data)
+    for ticket_id, ticket_data in synthetic_tickets(camera_ids, tickets):
+        add("tickets", ticket_id, ticket_data)
+    if pending:
+        batch.commit()
+    return camera_ids
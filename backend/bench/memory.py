@@ -0,0 +1,101 @@
+"""Memory footprint of the in-process camera store for synthetic fleets.
+
+Builds the same synthetic fleet three ways and reports the memory held per
+camera by each:
+
+    dicts     one dict per camera document, as the index stored them before
+    pydantic  one CameraInfo model per camera
+    index     the column store in camera_index.CameraIndex
+    snapshot  a CameraIndex layered over a snapshot written from the fleet
+
+Every uvicorn worker holds its own copy, so multiply by the worker count,
+except for the snapshot's memory-mapped arrays, which the workers share and
+which are not counted here.
+
+Usage (from the backend directory):
+    python bench/memory.py                       # 10k, 100k and 1M cameras
+    python bench/memory.py --sizes 10000 --skip pydantic
+"""
+import argparse
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from camera_index import CameraIndex, _normalize  # noqa: E402
+from fleet import synthetic_cameras  # noqa: E402
+from snapshot import read_snapshot, write_snapshot  # noqa: E402
+
+
+def build_dicts(fleet):
+    return {camera_id: _normalize(camera_id, camera_data) for camera_id, camera_data in fleet}
+
+
+def build_pydantic(fleet):
+    from main import CameraInfo
+    return {camera_id: CameraInfo(id=camera_id, **camera_data) for camera_id, camera_data in fleet}
+
+
+def build_index(fleet):
+    index = CameraIndex()
+    index.replace_all(fleet)
+    return index
+
+
+def build_snapshot(fleet):
+    directory = tempfile.mkdtemp()
+    try:
+        write_snapshot(directory, build_index(fleet).records())
+        index = CameraIndex()
+        index.load_snapshot(read_snapshot(directory))
+    finally:
+        # The mapping outlives the files on POSIX
+        shutil.rmtree(directory, ignore_errors=True)
+    return index
+
+
+BUILDERS = {"dicts": build_dicts, "pydantic": build_pydantic, "index": build_index, "snapshot": build_snapshot}
+
+
+def measure(builder, count: int):
+    # Documents are generated inside the traced region, like a Firestore
+    # scan creates them, so strings the store keeps count towards it
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    store = builder(synthetic_cameras(count))
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del store
+    return current, peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--skip", nargs="*", default=[], choices=list(BUILDERS))
+    args = parser.parse_args()
+    if "pydantic" not in args.skip:
+        # Importing main initializes Firebase; the emulator settings avoid
+        # needing the service account key, and nothing connects until startup
+        os.environ.setdefault("FIRESTORE_EMULATOR_HOST", "localhost:8081")
+        import main  # noqa: F401
+
+    print(f"{'store':>9} {'cameras':>9} {'held MB':>9} {'bytes/cam':>10} {'peak MB':>9} {'load s':>8}")
+    for count in args.sizes:
+        for name, builder in BUILDERS.items():
+            if name in args.skip:
+                continue
+            current, peak, elapsed = measure(builder, count)
+            print(f"{name:>9} {count:>9} {current / 2**20:>9.1f} {current / count:>10.0f} "
+                  f"{peak / 2**20:>9.1f} {elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+"""Benchmark suite for the API: micro-benchmarks and HTTP load scenarios.
+
+Seeds a synthetic fleet, starts the app in-process and runs:
+
+    micro     distance (geodesic, haversine), bbox lookup, filter/rank and
+              serialization (JSON, MessagePack, Arrow, NDJSON) on the
+              candidates of a typical nearby query
+    nearby    concurrent /nearby_cameras queries at several concurrency levels
+    batch     one /nearby_cameras:batch request against the same queries sent
+              as sequential /nearby_cameras requests, per radius
+    tickets   paging through /tickets, with and without embedded cameras
+    upload    a large CSV through /upload_camera_data, then the same file
+              again in upsert mode (all rows unchanged)
+
+Every result reports p50/p95/p99 latency, throughput and the process RSS
+afterwards, and the whole run is saved as JSON so two runs can be compared.
+
+By default Firestore is replaced by the in-memory fake in fake_firestore.py,
+which isolates the API's own cost. With --emulator the suite seeds and uses
+the Firestore emulator at FIRESTORE_EMULATOR_HOST instead.
+
+Usage (from the backend directory):
+    python bench/suite.py --cameras 50000 --output bench-results.json
+    python bench/suite.py --only micro nearby --hotspots 20
+    python bench/suite.py --compare baseline.json bench-results.json
+
+Requires httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+SCENARIOS = ["micro", "nearby", "batch", "tickets", "upload"]
+
+
+def summarize(samples: List[float], elapsed: float = None) -> dict:
+    """Latency percentiles in ms for samples in seconds, plus throughput when elapsed is given."""
+    ordered = sorted(samples)
+
+    def percentile(q):
+        return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))] * 1000
+
+    result = {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "max_ms": ordered[-1] * 1000,
+        "throughput": len(ordered) / (elapsed if elapsed is not None else sum(ordered)),
+    }
+    result["rss_mb"] = rss_mb()
+    return result
+
+
+def rss_mb() -> float:
+    """Resident set size of this process, in MB."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        import resource  # Peak rather than current RSS outside Linux
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20
+
+
+def time_calls(fn: Callable, repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def run_micro(main, args) -> Dict[str, dict]:
+    from encoders import ARROW, MSGPACK, NDJSON, NEARBY_CAMERA_FIELDS, encode_rows
+    from fleet import CENTER_LAT, CENTER_LON
+    from geo import bbox_around, distance_km
+
+    radius_km = 3.0
+    bbox = bbox_around(CENTER_LAT, CENTER_LON, radius_km)
+    candidates = main.CandidateSet(main.camera_index.query_bbox(*bbox))
+    distances = distance_km(CENTER_LAT, CENTER_LON, candidates.lats, candidates.lons)
+    rows = candidates.rank(distances, radius_km)
+    print(f"micro: {len(candidates)} candidates, {len(rows)} rows")
+
+    def encode(media_type):
+        def run():
+            response = encode_rows(rows, NEARBY_CAMERA_FIELDS, media_type)
+            if hasattr(response, "body_iterator"):
+                async def drain():
+                    async for _ in response.body_iterator:
+                        pass
+                asyncio.run(drain())
+        return run
+
+    benchmarks = {
+        "bbox_query": lambda: main.camera_index.query_bbox(*bbox),
+        "distance_geodesic": lambda: distance_km(CENTER_LAT, CENTER_LON, candidates.lats, candidates.lons,
+                                                 method="geodesic"),
+        "distance_haversine": lambda: distance_km(CENTER_LAT, CENTER_LON, candidates.lats, candidates.lons,
+                                                  method="haversine"),
+        "filter_rank": lambda: main.CandidateSet(main.camera_index.query_bbox(*bbox)).rank(
+            distances, radius_km, status_filter="working"),
+        "serialize_json": lambda: json.dumps(rows),
+        "serialize_msgpack": encode(MSGPACK),
+        "serialize_arrow": encode(ARROW),
+        "serialize_ndjson": encode(NDJSON),
+    }
+    results = {}
+    for name, fn in benchmarks.items():
+        fn()  # Warm up
+        results[f"micro.{name}"] = {**summarize(time_calls(fn, args.repeat)), "items": len(candidates)}
+    return results
+
+
+async def run_requests(client, make_request, count: int, concurrency: int):
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for i in range(count):
+        queue.put_nowait(i)
+
+    async def worker():
+        nonlocal errors
+        while True:
+            try:
+                i = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            response = await make_request(client, i)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - start, errors
+
+
+async def run_nearby(client, args) -> Dict[str, dict]:
+    from fleet import CENTER_LAT, CENTER_LON
+
+    rng = random.Random(1)
+    spread = args.spread_km / 2 / 111.32
+    queries = [{
+        "latitude": CENTER_LAT + rng.uniform(-spread, spread),
+        "longitude": CENTER_LON + rng.uniform(-spread, spread),
+        "radius_meters": rng.choice([500, 1000, 2000, 5000]),
+    } for _ in range(args.requests)]
+
+    async def nearby(client, i):
+        return await client.post("/nearby_cameras", json=queries[i])
+
+    results = {}
+    for level in args.levels:
+        latencies, elapsed, errors = await run_requests(client, nearby, args.requests, level)
+        results[f"nearby.c{level}"] = {**summarize(latencies, elapsed), "errors": errors}
+        print(f"nearby c={level}: {results[f'nearby.c{level}']['throughput']:.0f} req/s")
+    return results
+
+
+async def run_batch(client, args) -> Dict[str, dict]:
+    from fleet import CENTER_LAT, CENTER_LON
+
+    rng = random.Random(2)
+    spread = args.spread_km / 2 / 111.32
+    results = {}
+    for radius in args.batch_radii:
+        queries = [{
+            "latitude": CENTER_LAT + rng.uniform(-spread, spread),
+            "longitude": CENTER_LON + rng.uniform(-spread, spread),
+            "radius_meters": radius,
+        } for _ in range(args.batch_size)]
+
+        batch_samples, sequential_samples = [], []
+        for _ in range(args.batch_rounds):
+            start = time.perf_counter()
+            response = await client.post("/nearby_cameras:batch", json={"queries": queries})
+            batch_samples.append(time.perf_counter() - start)
+            response.raise_for_status()
+            start = time.perf_counter()
+            for query in queries:
+                (await client.post("/nearby_cameras", json=query)).raise_for_status()
+            sequential_samples.append(time.perf_counter() - start)
+
+        batch, sequential = summarize(batch_samples), summarize(sequential_samples)
+        speedup = sequential["p50_ms"] / batch["p50_ms"]
+        results[f"batch.r{radius}"] = {**batch, "queries": args.batch_size, "speedup": speedup}
+        results[f"batch.r{radius}.sequential"] = {**sequential, "queries": args.batch_size}
+        print(f"batch r={radius}m: {batch['p50_ms']:.0f} ms for {args.batch_size} queries, "
+              f"{sequential['p50_ms']:.0f} ms sequentially ({speedup:.1f}x)")
+    return results
+
+
+async def run_tickets(client, args) -> Dict[str, dict]:
+    results = {}
+    for name, params in (("tickets.page", {"limit": 100}), ("tickets.page_embed", {"limit": 100, "embed_camera": True})):
+        latencies = []
+        cursor = None
+        start = time.perf_counter()
+        for _ in range(args.ticket_pages):
+            request_start = time.perf_counter()
+            response = await client.get("/tickets", params={**params, **({"cursor": cursor} if cursor else {})})
+            latencies.append(time.perf_counter() - request_start)
+            cursor = response.json().get("next_cursor")
+            if not cursor:
+                break
+        results[name] = summarize(latencies, time.perf_counter() - start)
+        print(f"{name}: p50 {results[name]['p50_ms']:.1f} ms over {len(latencies)} pages")
+    return results
+
+
+def write_upload_csv(path: str, rows: int) -> None:
+    from fleet import synthetic_cameras
+    from ingest import COLUMN_FIELDS
+
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(list(COLUMN_FIELDS))
+        for _, camera_data in synthetic_cameras(rows, seed=7):
+            writer.writerow([camera_data.get(field) for field in COLUMN_FIELDS.values()])
+
+
+async def run_upload(client, args) -> Dict[str, dict]:
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "cameras.csv")
+        write_upload_csv(path, args.upload_rows)
+        for mode in ("append", "upsert"):
+            start = time.perf_counter()
+            with open(path, "rb") as f:
+                response = await client.post("/upload_camera_data", params={"mode": mode},
+                                             files={"file": ("cameras.csv", f, "text/csv")})
+            job = response.json()
+            while job["status"] not in ("completed", "failed"):
+                await asyncio.sleep(0.05)
+                job = (await client.get(f"/upload_camera_data/{job['job_id']}")).json()
+            elapsed = time.perf_counter() - start
+            results[f"upload.{mode}"] = {
+                "rows": job["rows_read"],
+                "rows_written": job["rows_written"],
+                "status": job["status"],
+                "seconds": elapsed,
+                "throughput": job["rows_read"] / elapsed,
+                "rss_mb": rss_mb(),
+            }
+            print(f"upload {mode}: {job['rows_read'] / elapsed:.0f} rows/s ({job['status']})")
+    return results
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__)).stdout.strip()
+    except OSError:
+        return ""
+
+
+async def run(args) -> dict:
+    if args.emulator:
+        if not os.environ.get("FIRESTORE_EMULATOR_HOST"):
+            sys.exit("--emulator needs FIRESTORE_EMULATOR_HOST")
+    else:
+        # Only used by main's Firebase initialization; nothing connects to it
+        os.environ["FIRESTORE_EMULATOR_HOST"] = "localhost:0"
+    os.environ.setdefault("CAMERA_SNAPSHOT_DIR", "")
+    os.environ.setdefault("NEARBY_CACHE_SIZE", "0")  # Measure the queries, not the cache
+
+    import httpx
+
+    import datastore
+    from fleet import seed
+
+    import main
+    if args.emulator:
+        db = datastore.get_db()
+    else:
+        from fake_firestore import Client
+        db = Client()
+        datastore.use_client(db)
+
+    if not args.emulator or args.seed:
+        start = time.perf_counter()
+        seed(db, args.cameras, args.tickets, args.spread_km, args.hotspots)
+        print(f"Seeded {args.cameras} cameras and {args.tickets} tickets in {time.perf_counter() - start:.1f}s")
+
+    results = {}
+    async with main.app.router.lifespan_context(main.app):
+        # Give the camera_info listener time to deliver the fleet
+        for _ in range(600):
+            if main.camera_sync.is_fresh():
+                break
+            await asyncio.sleep(0.1)
+        results["index.load"] = {"cameras": len(main.camera_index), "rss_mb": rss_mb()}
+
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+            if "micro" in args.only:
+                results.update(await asyncio.to_thread(run_micro, main, args))
+            if "nearby" in args.only:
+                results.update(await run_nearby(client, args))
+            if "batch" in args.only:
+                results.update(await run_batch(client, args))
+            if "tickets" in args.only:
+                results.update(await run_tickets(client, args))
+            if "upload" in args.only:
+                results.update(await run_upload(client, args))
+
+    return {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": "emulator" if args.emulator else "fake",
+            "parameters": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        },
+        "results": results,
+    }
+
+
+COMPARED_METRICS = [("p50_ms", -1), ("p95_ms", -1), ("p99_ms", -1), ("throughput", 1), ("rss_mb", -1)]
+
+
+def compare(baseline_path: str, current_path: str) -> None:
+    """Print the change of every shared metric; positive means better."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    with open(current_path) as f:
+        current = json.load(f)["results"]
+
+    print(f"{'benchmark':<28} {'metric':<11} {'baseline':>11} {'current':>11} {'change':>8}")
+    for name in sorted(set(baseline) & set(current)):
+        for metric, better in COMPARED_METRICS:
+            old, new = baseline[name].get(metric), current[name].get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100 * better
+            print(f"{name:<28} {metric:<11} {old:>11.2f} {new:>11.2f} {change:>+7.1f}%")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cameras", type=int, default=20000, help="Synthetic fleet size")
+    parser.add_argument("--spread-km", type=float, default=20.0, help="Side of the square the fleet covers")
+    parser.add_argument("--hotspots", type=int, default=0, help="Dense clusters holding half of the fleet")
+    parser.add_argument("--tickets", type=int, default=5000)
+    parser.add_argument("--only", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--repeat", type=int, default=200, help="Repetitions per micro-benchmark")
+    parser.add_argument("--requests", type=int, default=500, help="Nearby requests per concurrency level")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 8, 32], help="Nearby concurrency levels")
+    parser.add_argument("--batch-size", type=int, default=100, help="Queries per batch request")
+    parser.add_argument("--batch-radii", type=int, nargs="+", default=[150, 1000], help="Batch query radii in meters")
+    parser.add_argument("--batch-rounds", type=int, default=5, help="Batch and sequential runs per radius")
+    parser.add_argument("--ticket-pages", type=int, default=20)
+    parser.add_argument("--upload-rows", type=int, default=20000)
+    parser.add_argument("--emulator", action="store_true", help="Use the Firestore emulator instead of the fake")
+    parser.add_argument("--seed", action="store_true", help="With --emulator, seed the fleet first")
+    parser.add_argument("--output", default="bench-results.json")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="Compare two result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = asyncio.run(run(args))
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main_cli()
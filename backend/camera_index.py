@@ -0,0 +1,616 @@
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from categories import with_categories
+from coordinates import DERIVED_FIELDS, parse_coordinate
+
+
+# Grid cell size in degrees. 0.01 degrees of latitude is roughly 1.1 km, which
+# keeps the number of cells touched by a typical 0.5-5 km radius query small.
+CELL_SIZE_DEG = 0.01
+
+# Text fields of a camera document. Low-cardinality fields are
+# dictionary-encoded as int32 codes into a string table shared by all rows;
+# the rest are kept as one Python list per field.
+TEXT_FIELDS = ["location", "latitude", "longitude", "private_govt", "owner_name", "contact_no",
+               "coverage", "backup", "connected_network", "status"]
+DICTIONARY_FIELDS = ["private_govt", "coverage", "backup", "connected_network", "status"]
+OBJECT_FIELDS = [field for field in TEXT_FIELDS if field not in DICTIONARY_FIELDS]
+_DICTIONARY_COLUMNS = {field: column for column, field in enumerate(DICTIONARY_FIELDS)}
+_STATUS = _DICTIONARY_COLUMNS["status"]
+
+# Dictionary codes that are not string table entries
+MISSING = -1
+NULL = -2
+
+# Object column markers: the field is missing, or it is a coordinate equal
+# to the stored float, either as a number or as exactly its repr() text.
+_ABSENT = object()
+_NUMERIC = object()
+_FROM_FLOAT = object()
+
+# listener(camera_id, old_data, new_data); old/new are None when the camera
+# did not exist before/after. A full reload calls listener(None, None, None).
+Listener = Callable[[Optional[str], Optional[dict], Optional[dict]], None]
+
+# (min_lat, max_lat, min_lon, max_lon)
+BBox = Tuple[float, float, float, float]
+
+
+def _normalize(camera_id: str, camera_data: Optional[dict]) -> dict:
+    camera_data = dict(camera_data or {})
+    camera_data["id"] = camera_id
+    # location_point/geohash only serve Firestore queries; the index has its own.
+    # updated_at only serves exports, and would cost a dict per row here.
+    for field in DERIVED_FIELDS + ("updated_at",):
+        camera_data.pop(field, None)
+    # Documents written before status_class/ownership_class existed are
+    # classified here until the backfill has run.
+    if "status_class" not in camera_data or "ownership_class" not in camera_data:
+        with_categories(camera_data)
+    return camera_data
+
+
+def parse_coordinates(camera_data: dict) -> Optional[Tuple[float, float]]:
+    """Return the camera's (lat, lon) as floats, or None if missing/invalid."""
+    lat = parse_coordinate(camera_data.get("latitude"), 90)
+    lon = parse_coordinate(camera_data.get("longitude"), 180)
+    if lat is None or lon is None:
+        return None
+    return lat, lon
+
+
+class _Store:
+    """One generation of the index's column storage.
+
+    Each camera occupies a row: float64 coordinates (NaN when missing), int8
+    categories and int32 codes for the dictionary-encoded fields in NumPy
+    arrays, plus a slot in each object column. Coordinates are only kept in
+    the float columns, unless stored as text other than the float's repr(). Rows freed by removals
+    are reused. Strings are never dropped from the string table; a full
+    reload starts a fresh store.
+    """
+
+    def __init__(self, cell_size: float, capacity: int = 1024):
+        self.cell_size = cell_size
+        self.ids: List[Optional[str]] = []
+        self.rows: Dict[str, int] = {}
+        self.free: List[int] = []
+        self.lat = np.full(capacity, np.nan)
+        self.lon = np.full(capacity, np.nan)
+        self.status_class = np.zeros(capacity, dtype=np.int8)
+        self.ownership_class = np.zeros(capacity, dtype=np.int8)
+        self.codes = np.full((capacity, len(DICTIONARY_FIELDS)), MISSING, dtype=np.int32)
+        self.objects: Dict[str, list] = {field: [] for field in OBJECT_FIELDS}
+        # Fields outside TEXT_FIELDS, and dictionary fields holding non-string values
+        self.extra: Dict[int, dict] = {}
+        self.strings: List[str] = []
+        self.string_codes: Dict[str, int] = {}
+        self.cells: Dict[Tuple[int, int], List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_size), math.floor(lon / self.cell_size)
+
+    def intern(self, value: str) -> int:
+        code = self.string_codes.get(value)
+        if code is None:
+            code = self.string_codes[value] = len(self.strings)
+            self.strings.append(value)
+        return code
+
+    def _grow(self) -> None:
+        capacity = len(self.lat) * 2
+        self.lat = np.resize(self.lat, capacity)
+        self.lon = np.resize(self.lon, capacity)
+        self.status_class = np.resize(self.status_class, capacity)
+        self.ownership_class = np.resize(self.ownership_class, capacity)
+        self.codes = np.resize(self.codes, (capacity, len(DICTIONARY_FIELDS)))
+
+    def insert(self, camera_data: dict) -> int:
+        """Store a normalized camera document; returns its row."""
+        if self.free:
+            row = self.free.pop()
+            self.ids[row] = camera_data["id"]
+        else:
+            row = len(self.ids)
+            if row == len(self.lat):
+                self._grow()
+            self.ids.append(camera_data["id"])
+            for column in self.objects.values():
+                column.append(_ABSENT)
+        self.rows[camera_data["id"]] = row
+
+        location = parse_coordinates(camera_data)
+        lat, lon = location if location is not None else (np.nan, np.nan)
+        self.lat[row], self.lon[row] = lat, lon
+        self.status_class[row] = camera_data["status_class"]
+        self.ownership_class[row] = camera_data["ownership_class"]
+
+        codes = [MISSING] * len(DICTIONARY_FIELDS)
+        extra = {}
+        for field, value in camera_data.items():
+            column = _DICTIONARY_COLUMNS.get(field)
+            if column is not None:
+                if value is None:
+                    codes[column] = NULL
+                elif isinstance(value, str):
+                    codes[column] = self.intern(value)
+                else:
+                    extra[field] = value
+            elif field in self.objects:
+                if field == "latitude" or field == "longitude":
+                    coordinate = lat if field == "latitude" else lon
+                    if isinstance(value, float) and value == coordinate:
+                        value = _NUMERIC
+                    elif isinstance(value, str) and location is not None and value == repr(coordinate):
+                        value = _FROM_FLOAT
+                self.objects[field][row] = value
+            elif field not in ("id", "status_class", "ownership_class"):
+                extra[field] = value
+        for field, column in self.objects.items():
+            if field not in camera_data:
+                column[row] = _ABSENT
+        self.codes[row] = codes
+        if extra:
+            self.extra[row] = extra
+
+        if location is not None:
+            self.cells.setdefault(self.cell(lat, lon), []).append(row)
+        return row
+
+    def delete(self, camera_id: str) -> None:
+        row = self.rows.pop(camera_id)
+        if not np.isnan(self.lat[row]):
+            cell = self.cell(self.lat[row], self.lon[row])
+            members = self.cells[cell]
+            members.remove(row)
+            if not members:
+                del self.cells[cell]
+        for column in self.objects.values():
+            column[row] = _ABSENT
+        self.extra.pop(row, None)
+        self.ids[row] = None
+        self.free.append(row)
+
+    def record(self, row: int) -> dict:
+        """Rebuild the camera document stored in a row."""
+        camera_data = {"id": self.ids[row]}
+        for field, column in self.objects.items():
+            value = column[row]
+            if value is _NUMERIC:
+                value = float(self.lat[row] if field == "latitude" else self.lon[row])
+            elif value is _FROM_FLOAT:
+                value = repr(float(self.lat[row] if field == "latitude" else self.lon[row]))
+            if value is not _ABSENT:
+                camera_data[field] = value
+        for field, code in zip(DICTIONARY_FIELDS, self.codes[row].tolist()):
+            if code >= 0:
+                camera_data[field] = self.strings[code]
+            elif code == NULL:
+                camera_data[field] = None
+        camera_data["status_class"] = int(self.status_class[row])
+        camera_data["ownership_class"] = int(self.ownership_class[row])
+        extra = self.extra.get(row)
+        if extra:
+            camera_data.update(extra)
+        return camera_data
+
+    def values(self, rows: np.ndarray, field: str, default=None) -> list:
+        """One field of many rows, ``default`` where it is missing.
+
+        Reads the columns directly instead of rebuilding each document.
+        """
+        row_list = rows.tolist()
+        if field == "id":
+            return [self.ids[row] for row in row_list]
+        column = _DICTIONARY_COLUMNS.get(field)
+        if column is not None:
+            # Codes index the string table; NULL and MISSING point past its end
+            table = np.array(self.strings + [None, default], dtype=object)
+            codes = self.codes[rows, column]
+            codes = np.where(codes >= 0, codes, np.where(codes == NULL, len(self.strings), len(self.strings) + 1))
+            values = table[codes].tolist()
+        elif field in self.objects:
+            values = [self.objects[field][row] for row in row_list]
+            if field == "latitude" or field == "longitude":
+                coordinates = (self.lat if field == "latitude" else self.lon)[rows].tolist()
+                values = [coordinate if value is _NUMERIC else repr(coordinate) if value is _FROM_FLOAT else value
+                          for value, coordinate in zip(values, coordinates)]
+            return [default if value is _ABSENT else value for value in values]
+        else:
+            values = [default] * len(row_list)
+        # Dictionary fields holding non-string values, and unknown fields
+        if self.extra:
+            for i, row in enumerate(row_list):
+                extra = self.extra.get(row)
+                if extra and field in extra:
+                    values[i] = extra[field]
+        return values
+
+
+class Candidates:
+    """Cameras matched by a bounding box query, as parallel arrays.
+
+    The arrays are copied out of the index, so they stay consistent while the
+    index changes. Camera documents are only rebuilt, through ``record`` or
+    ``values``, for the candidates a caller actually returns, and the ids of
+    cameras read from the snapshot are only decoded when asked for.
+    """
+
+    def __init__(self, index: "CameraIndex", positions: np.ndarray, store: _Store, base, ids: List[Optional[str]],
+                 lats: np.ndarray, lons: np.ndarray, status_class: np.ndarray, ownership_class: np.ndarray,
+                 working: np.ndarray):
+        self._index = index
+        # Where each candidate was found, as CameraIndex positions into store and base
+        self._positions = positions
+        self._store = store
+        self._base = base
+        self._ids = ids
+        self.lats = lats
+        self.lons = lons
+        self.status_class = status_class
+        self.ownership_class = ownership_class
+        # status is exactly "Working", the tie-breaker used when ranking
+        self.working = working
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def camera_id(self, i: int) -> str:
+        camera_id = self._ids[i]
+        if camera_id is None:
+            camera_id = self._ids[i] = self._base.camera_id(int(self._positions[i]))
+        return camera_id
+
+    def camera_ids(self, positions: np.ndarray) -> List[str]:
+        return [self.camera_id(i) for i in positions.tolist()]
+
+    def record(self, i: int) -> Optional[dict]:
+        """Current document of candidate i, or None if it has been removed since."""
+        return self._index.get(self.camera_id(i))
+
+    def values(self, positions: np.ndarray, fields: Sequence[str],
+               defaults: Optional[dict] = None) -> Tuple[np.ndarray, Dict[str, list]]:
+        """Current values of ``fields`` for the candidates at ``positions``.
+
+        See CameraIndex.field_values; the returned positions are the ones
+        still indexed.
+        """
+        return self._index._candidate_values(self, positions, fields, defaults or {})
+
+
+class CameraIndex:
+    """Process-resident grid index over the ``camera_info`` collection.
+
+    Cameras are bucketed into fixed-size lat/lon cells so that bounding box
+    lookups only touch the cells overlapping the box instead of the whole
+    fleet. The write endpoints apply their own changes through ``upsert`` and
+    ``remove``; ``CameraSync`` loads the index and applies everyone else's.
+    Documents are held column-wise (see ``_Store``) rather than as dicts.
+
+    The index may be layered over a memory-mapped snapshot.CameraSnapshot
+    (the base), which all workers share: lookups read the base's arrays in
+    place, and only cameras added or changed since it was written live in
+    the worker's own ``_Store``. Base rows of cameras changed or removed
+    since are hidden. Positions number the base rows first, then the store's
+    rows offset by the size of the base.
+    """
+
+    def __init__(self, cell_size_deg: float = CELL_SIZE_DEG):
+        self.cell_size = cell_size_deg
+        self.loaded = False
+        self._store = _Store(cell_size_deg)
+        self._base = None
+        self._hidden = np.zeros(0, dtype=bool)
+        self._lock = threading.RLock()
+        # Serializes full rebuilds; ids changed while rebase() runs are recorded in _touched
+        self._rebuild_lock = threading.Lock()
+        self._touched: Optional[set] = None
+        self._listeners: List[Listener] = []
+
+    def add_listener(self, listener: Listener) -> None:
+        """Register a callback notified after every change to the index."""
+        self._listeners.append(listener)
+
+    def _notify(self, camera_id: Optional[str], old_data: Optional[dict], new_data: Optional[dict]) -> None:
+        for listener in self._listeners:
+            listener(camera_id, old_data, new_data)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._store) + len(self._hidden) - int(self._hidden.sum())
+
+    @property
+    def base_created_at(self) -> Optional[float]:
+        """Creation time of the snapshot the index is layered over, if any."""
+        base = self._base
+        return base.created_at if base is not None else None
+
+    @property
+    def _offset(self) -> int:
+        return len(self._hidden)
+
+    def load(self, db) -> int:
+        """(Re)build the index from a full scan of ``camera_info``."""
+        documents = ((doc.id, doc.to_dict()) for doc in db.collection("camera_info").stream())
+        return self.replace_all(documents)
+
+    def _layer(self, base, documents: Iterable[Tuple[str, dict]]) -> Tuple[_Store, np.ndarray]:
+        """Store and hidden base rows holding ``documents`` over ``base``.
+
+        Documents identical to their base row stay in the base.
+        """
+        store = _Store(self.cell_size)
+        base_rows = base.rows_by_id() if base is not None else {}
+        hidden = np.ones(len(base_rows), dtype=bool)
+        for camera_id, camera_data in documents:
+            camera_data = _normalize(camera_id, camera_data)
+            if camera_id in store.rows:
+                store.delete(camera_id)
+            row = base_rows.get(camera_id)
+            if row is not None:
+                hidden[row] = base.record(row) != camera_data
+                if not hidden[row]:
+                    continue
+            store.insert(camera_data)
+        return store, hidden
+
+    def replace_all(self, documents: Iterable[Tuple[str, dict]]) -> int:
+        with self._rebuild_lock:
+            store, hidden = self._layer(self._base, documents)
+            with self._lock:
+                self._store, self._hidden = store, hidden
+                self.loaded = True
+        self._notify(None, None, None)
+        return len(self)
+
+    def load_snapshot(self, snapshot) -> int:
+        """Serve the cameras of a snapshot.CameraSnapshot in place of the current contents."""
+        with self._rebuild_lock, self._lock:
+            self._store = _Store(self.cell_size)
+            self._base = snapshot
+            self._hidden = np.zeros(len(snapshot), dtype=bool)
+            self.loaded = True
+        self._notify(None, None, None)
+        return len(self)
+
+    def rebase(self, snapshot) -> None:
+        """Layer the current contents over a newer snapshot, moving the cameras it holds out of the store.
+
+        The contents do not change, so listeners are not notified.
+        """
+        with self._rebuild_lock:
+            with self._lock:
+                self._touched = set()
+            try:
+                store, hidden = self._layer(snapshot, ((camera_data["id"], camera_data)
+                                                       for camera_data in self.records()))
+                with self._lock:
+                    # Replay the changes made while the new layers were built
+                    changed = {camera_id: self._record(camera_id) for camera_id in self._touched}
+                    self._store, self._base, self._hidden = store, snapshot, hidden
+                    for camera_id, camera_data in changed.items():
+                        position = self._find(camera_id)
+                        if position is not None:
+                            self._delete(position, camera_id)
+                        if camera_data is not None:
+                            store.insert(camera_data)
+            finally:
+                self._touched = None
+
+    def _find(self, camera_id: str) -> Optional[int]:
+        row = self._store.rows.get(camera_id)
+        if row is not None:
+            return self._offset + row
+        if self._base is not None:
+            row = self._base.find(camera_id)
+            if row is not None and not self._hidden[row]:
+                return row
+        return None
+
+    def _record(self, camera_id: str) -> Optional[dict]:
+        position = self._find(camera_id)
+        if position is None:
+            return None
+        if position < self._offset:
+            return self._base.record(position)
+        return self._store.record(position - self._offset)
+
+    def _delete(self, position: int, camera_id: str) -> None:
+        if position < self._offset:
+            self._hidden[position] = True
+        else:
+            self._store.delete(camera_id)
+
+    def get(self, camera_id: str) -> Optional[dict]:
+        with self._lock:
+            return self._record(camera_id)
+
+    def _values(self, positions: np.ndarray, fields: Sequence[str], defaults: dict) -> Dict[str, list]:
+        offset = self._offset
+        in_base = positions < offset
+        if not in_base.any():
+            return {field: self._store.values(positions - offset, field, defaults.get(field)) for field in fields}
+        if in_base.all():
+            return {field: self._base.values(positions, field, defaults.get(field)) for field in fields}
+        base_slots, store_slots = np.flatnonzero(in_base).tolist(), np.flatnonzero(~in_base).tolist()
+        base_rows, store_rows = positions[in_base], positions[~in_base] - offset
+        values = {}
+        for field in fields:
+            column = [None] * len(positions)
+            for i, value in zip(base_slots, self._base.values(base_rows, field, defaults.get(field))):
+                column[i] = value
+            for i, value in zip(store_slots, self._store.values(store_rows, field, defaults.get(field))):
+                column[i] = value
+            values[field] = column
+        return values
+
+    def field_values(self, camera_ids: Sequence[str], fields: Sequence[str],
+                     defaults: Optional[dict] = None) -> Tuple[np.ndarray, Dict[str, list]]:
+        """Current values of ``fields`` for many cameras, one list per field.
+
+        Returns the positions in ``camera_ids`` of the cameras still indexed
+        and, per field, their values in that order. Missing fields take
+        their value from ``defaults``, or None. Much cheaper than ``get`` per
+        camera when many rows are returned.
+        """
+        with self._lock:
+            positions = [self._find(camera_id) for camera_id in camera_ids]
+            found = np.array([i for i, position in enumerate(positions) if position is not None], dtype=np.int64)
+            positions = np.array([position for position in positions if position is not None], dtype=np.int64)
+            return found, self._values(positions, fields, defaults or {})
+
+    def _candidate_values(self, candidates: Candidates, positions: np.ndarray, fields: Sequence[str],
+                          defaults: dict) -> Tuple[np.ndarray, Dict[str, list]]:
+        with self._lock:
+            current = candidates._positions[positions]
+            offset = self._offset
+            if candidates._store is not self._store or candidates._base is not self._base:
+                # Rebuilt since the lookup: find every camera again
+                stale = range(len(positions))
+            else:
+                in_base = current < offset
+                stale = np.flatnonzero(in_base)[self._hidden[current[in_base]]].tolist()
+                # Store rows are reused once freed
+                stale += [i for i, k in zip(np.flatnonzero(~in_base).tolist(), positions[~in_base].tolist())
+                          if self._store.ids[current[i] - offset] != candidates._ids[k]]
+            if len(stale):
+                current = current.copy()
+                for i in stale:
+                    position = self._find(candidates.camera_id(int(positions[i])))
+                    current[i] = -1 if position is None else position
+            found = np.flatnonzero(current >= 0)
+            return positions[found], self._values(current[found], fields, defaults)
+
+    def records(self) -> List[dict]:
+        """Snapshot of every indexed camera document."""
+        with self._lock:
+            store, base, visible = self._store, self._base, ~self._hidden
+            records = [store.record(row) for row in store.rows.values()]
+        if base is None:
+            return records
+        # Base rows never change, so they can be decoded outside the lock
+        return [base.record(row) for row in np.flatnonzero(visible).tolist()] + records
+
+    def columns(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Copies of (lat, lon, status_class, ownership_class) for every indexed camera."""
+        with self._lock:
+            store, base = self._store, self._base
+            rows = np.fromiter(store.rows.values(), dtype=np.int64, count=len(store.rows))
+            columns = store.lat[rows], store.lon[rows], store.status_class[rows], store.ownership_class[rows]
+            if base is None:
+                return columns
+            visible = np.flatnonzero(~self._hidden)
+            base_columns = base.latitude, base.longitude, base.status_class, base.ownership_class
+            return tuple(np.concatenate((base_column[visible], column))
+                         for base_column, column in zip(base_columns, columns))
+
+    def upsert(self, camera_id: str, camera_data: dict) -> None:
+        camera_data = _normalize(camera_id, camera_data)
+        with self._lock:
+            old_data = None
+            position = self._find(camera_id)
+            if position is not None:
+                old_data = self._record(camera_id)
+                self._delete(position, camera_id)
+            new_data = self._store.record(self._store.insert(camera_data))
+            if self._touched is not None:
+                self._touched.add(camera_id)
+        self._notify(camera_id, old_data, new_data)
+
+    def remove(self, camera_id: str) -> None:
+        with self._lock:
+            position = self._find(camera_id)
+            if position is None:
+                return
+            old_data = self._record(camera_id)
+            self._delete(position, camera_id)
+            if self._touched is not None:
+                self._touched.add(camera_id)
+        self._notify(camera_id, old_data, None)
+
+    def _bbox_rows(self, store: _Store, min_lat: float, max_lat: float, min_lon: float, max_lon: float) -> np.ndarray:
+        lat_lo, lon_lo = store.cell(min_lat, min_lon)
+        lat_hi, lon_hi = store.cell(max_lat, max_lon)
+        cell_count = (lat_hi - lat_lo + 1) * (lon_hi - lon_lo + 1)
+
+        # Very large boxes touch more cells than are occupied; walk the
+        # occupied cells instead of enumerating empty ones.
+        if cell_count > len(store.cells):
+            cells = [
+                members for (cy, cx), members in store.cells.items()
+                if lat_lo <= cy <= lat_hi and lon_lo <= cx <= lon_hi
+            ]
+        else:
+            cells = [
+                store.cells[(cy, cx)]
+                for cy in range(lat_lo, lat_hi + 1)
+                for cx in range(lon_lo, lon_hi + 1)
+                if (cy, cx) in store.cells
+            ]
+
+        rows = np.fromiter((row for members in cells for row in members), dtype=np.int64)
+        lats, lons = store.lat[rows], store.lon[rows]
+        return rows[(lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)]
+
+    def _bbox_positions(self, box: BBox) -> np.ndarray:
+        positions = self._bbox_rows(self._store, *box) + self._offset
+        if self._base is None:
+            return positions
+        rows = self._base.bbox_rows(*box)
+        return np.concatenate((rows[~self._hidden[rows]], positions))
+
+    def _candidates(self, positions: np.ndarray) -> Candidates:
+        store, base, offset = self._store, self._base, self._offset
+        in_base = positions < offset
+        base_rows, store_rows = positions[in_base], positions[~in_base] - offset
+
+        def column(base_column, store_column):
+            values = np.empty(len(positions), dtype=store_column.dtype)
+            values[~in_base] = store_column[store_rows]
+            if len(base_rows):
+                values[in_base] = base_column[base_rows]
+            return values
+
+        working_code = store.string_codes.get("Working", MISSING)
+        store_working = (store.codes[store_rows, _STATUS] == working_code if working_code != MISSING
+                         else np.zeros(len(store_rows), dtype=bool))
+        working = np.empty(len(positions), dtype=bool)
+        working[~in_base] = store_working
+        ids: List[Optional[str]] = [None] * len(positions)
+        for i, row in zip(np.flatnonzero(~in_base).tolist(), store_rows.tolist()):
+            ids[i] = store.ids[row]
+        if base is None:
+            base_columns = (None,) * 4
+        else:
+            base_columns = base.latitude, base.longitude, base.status_class, base.ownership_class
+            working[in_base] = base.working(base_rows)
+        return Candidates(
+            self, positions, store, base, ids,
+            column(base_columns[0], store.lat), column(base_columns[1], store.lon),
+            column(base_columns[2], store.status_class), column(base_columns[3], store.ownership_class),
+            working,
+        )
+
+    def query_bbox(self, min_lat: float, max_lat: float, min_lon: float, max_lon: float) -> Candidates:
+        """Every indexed camera whose coordinates fall inside the box."""
+        with self._lock:
+            return self._candidates(self._bbox_positions((min_lat, max_lat, min_lon, max_lon)))
+
+    def query_bboxes(self, boxes: Sequence[BBox]) -> Tuple[Candidates, List[np.ndarray]]:
+        """Cameras inside any of the boxes, plus each box's candidate positions.
+
+        Every camera appears once in the candidates however many boxes it
+        falls in; ``members[i]`` indexes the candidates inside ``boxes[i]``.
+        """
+        with self._lock:
+            per_box = [self._bbox_positions(box) for box in boxes]
+            positions = np.unique(np.concatenate(per_box)) if per_box else np.zeros(0, dtype=np.int64)
+            members = [np.searchsorted(positions, box_positions) for box_positions in per_box]
+            return self._candidates(positions), members
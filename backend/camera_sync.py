@@ -0,0 +1,162 @@
+import threading
+import time
+from typing import Optional
+
+import metrics
+from camera_index import CameraIndex
+from snapshot import CameraSnapshot, read_snapshot, snapshot_lock, write_snapshot
+
+
+class CameraSync:
+    """Keeps a worker's CameraIndex in step with the camera_info collection.
+
+    At startup the index is layered over the on-disk snapshot shared by all
+    workers, so a worker can serve reads before touching Firestore. A
+    Firestore listener then reconciles it with the live collection and
+    applies every later change incrementally. When the listener is disabled
+    the index is reloaded from a full scan every ``refresh_seconds`` instead.
+    The snapshot is rewritten once it is ``snapshot_max_age`` old, and every
+    worker then rebases its index onto the new one, so the cameras each
+    worker holds in its own memory stay few.
+
+    ``staleness()`` is how far behind Firestore the index may be: zero while
+    the listener is connected and synced, otherwise the time since the index
+    was last known to be current.
+    """
+
+    def __init__(self, index: CameraIndex, snapshot_dir: Optional[str], snapshot_max_age: float,
+                 max_staleness: float, use_listener: bool = True, refresh_seconds: float = 300):
+        self.index = index
+        self.snapshot_dir = snapshot_dir
+        self.snapshot_max_age = snapshot_max_age
+        self.max_staleness = max_staleness
+        self.use_listener = use_listener
+        self.refresh_seconds = refresh_seconds
+        self.source: Optional[str] = None  # snapshot, listener or scan
+        self.synced_at: Optional[float] = None
+        self.snapshot_created_at: Optional[float] = None
+        self._synced = threading.Event()
+        self._watch = None
+        self._db = None
+        self._snapshot_writer: Optional[threading.Thread] = None
+
+    def start(self, db, wait_seconds: float = 120) -> int:
+        """Load the index (blocking). Returns the number of cameras loaded."""
+        self._db = db
+        snapshot = read_snapshot(self.snapshot_dir) if self.snapshot_dir else None
+        if snapshot is not None:
+            self.index.load_snapshot(snapshot)
+            self.source = "snapshot"
+            self.synced_at = self.snapshot_created_at = snapshot.created_at
+
+        if not self.use_listener:
+            self.reload()
+        else:
+            self._listen()
+            # Without a snapshot there is nothing to serve until the listener
+            # has delivered the collection once
+            if snapshot is None and not self._synced.wait(wait_seconds):
+                print("Timed out waiting for the camera_info listener; falling back to a full scan")
+                self.reload()
+        return len(self.index)
+
+    def reload(self) -> int:
+        with metrics.stage("index_load"):
+            count = self.index.load(self._db)
+        metrics.count_reads(max(1, count))
+        self.source = "scan"
+        self.synced_at = time.time()
+        self._maybe_write_snapshot()
+        return count
+
+    def _listen(self) -> None:
+        self._synced.clear()
+        self._watch = self._db.collection("camera_info").on_snapshot(self._on_snapshot)
+
+    def _on_snapshot(self, documents, changes, read_time) -> None:
+        try:
+            if not self._synced.is_set():
+                # The first callback carries the whole collection; replacing the
+                # index also drops cameras deleted since the snapshot was taken
+                self.index.replace_all((doc.id, doc.to_dict()) for doc in documents)
+                metrics.count_reads(len(documents))
+                self.source = "listener"
+                self._synced.set()
+                self._write_snapshot_in_background()
+            else:
+                metrics.count_reads(len(changes))
+                for change in changes:
+                    doc = change.document
+                    if change.type.name == "REMOVED":
+                        self.index.remove(doc.id)
+                    else:
+                        self.index.upsert(doc.id, doc.to_dict())
+            self.synced_at = time.time()
+        except Exception as e:
+            print(f"Failed to apply camera_info changes: {e}")
+
+    @property
+    def listening(self) -> bool:
+        return self._watch is not None and self._synced.is_set() and self._watch.is_active
+
+    def check(self) -> None:
+        """Periodic upkeep: restart a dead listener or reload in polling mode, refresh the snapshot."""
+        if not self.use_listener:
+            if time.time() - (self.synced_at or 0) >= self.refresh_seconds:
+                self.reload()
+        elif self.listening:
+            self.synced_at = time.time()
+            if self.snapshot_dir and time.time() - (self.snapshot_created_at or 0) >= self.snapshot_max_age:
+                self._write_snapshot_in_background()
+        elif self._watch is not None and not self._watch.is_active:
+            print("camera_info listener stopped; restarting it")
+            self._listen()
+
+    def staleness(self) -> Optional[float]:
+        if self.listening:
+            return 0.0
+        if self.synced_at is None:
+            return None
+        return max(0.0, time.time() - self.synced_at)
+
+    def is_fresh(self) -> bool:
+        staleness = self.staleness()
+        return self.index.loaded and staleness is not None and staleness <= self.max_staleness
+
+    def _write_snapshot_in_background(self) -> None:
+        if self._snapshot_writer is None or not self._snapshot_writer.is_alive():
+            self._snapshot_writer = threading.Thread(target=self._maybe_write_snapshot, daemon=True)
+            self._snapshot_writer.start()
+
+    def _maybe_write_snapshot(self) -> None:
+        """Refresh the shared snapshot from the index if it is too old, then rebase onto it."""
+        if not self.snapshot_dir:
+            return
+        try:
+            with snapshot_lock(self.snapshot_dir):
+                # Another worker may have written one while we waited
+                current = read_snapshot(self.snapshot_dir)
+                if current is None or time.time() - current.created_at >= self.snapshot_max_age:
+                    path = write_snapshot(self.snapshot_dir, self.index.records(), self.index.cell_size)
+                    current = CameraSnapshot(path)
+                    print(f"Wrote camera snapshot {path}")
+            self.snapshot_created_at = current.created_at
+            if self.index.base_created_at != current.created_at:
+                self.index.rebase(current)
+        except Exception as e:
+            print(f"Failed to write camera snapshot: {e}")
+
+    def status(self) -> dict:
+        return {
+            "ready": self.is_fresh(),
+            "cameras": len(self.index),
+            "source": self.source,
+            "listening": self.listening,
+            "staleness_seconds": self.staleness(),
+            "max_staleness_seconds": self.max_staleness,
+            "snapshot_created_at": self.snapshot_created_at,
+        }
+
+    def stop(self) -> None:
+        if self._watch is not None:
+            self._watch.unsubscribe()
@@ -0,0 +1,51 @@
+from enum import IntEnum
+from typing import Optional
+
+
+WORKING_KEYWORDS = ["working", "yes", "-do-", "active"]
+GOVERNMENT_KEYWORDS = ["govt.", "govt", "government"]
+
+
+class StatusClass(IntEnum):
+    NOT_WORKING = 0
+    WORKING = 1
+
+
+class OwnershipClass(IntEnum):
+    PRIVATE = 0
+    GOVERNMENT = 1
+
+
+def classify_status(status) -> StatusClass:
+    """Normalize the free-text 'Working or not' column into a StatusClass."""
+    status = str(status).lower()
+    if any(keyword in status for keyword in WORKING_KEYWORDS) and "not working" not in status:
+        return StatusClass.WORKING
+    return StatusClass.NOT_WORKING
+
+
+def classify_ownership(private_govt) -> OwnershipClass:
+    """Normalize the free-text 'Private/Govt' column into an OwnershipClass."""
+    private_govt = str(private_govt).lower()
+    if any(keyword in private_govt for keyword in GOVERNMENT_KEYWORDS):
+        return OwnershipClass.GOVERNMENT
+    return OwnershipClass.PRIVATE
+
+
+def with_categories(camera_data: dict) -> dict:
+    """Set the status_class/ownership_class fields derived from the text fields."""
+    camera_data["status_class"] = int(classify_status(camera_data.get("status", "")))
+    camera_data["ownership_class"] = int(classify_ownership(camera_data.get("private_govt", "")))
+    return camera_data
+
+
+def parse_status_filter(value: Optional[str]) -> Optional[StatusClass]:
+    if value:
+        return {"working": StatusClass.WORKING, "not working": StatusClass.NOT_WORKING}.get(value.lower())
+    return None
+
+
+def parse_ownership_filter(value: Optional[str]) -> Optional[OwnershipClass]:
+    if value:
+        return {"government": OwnershipClass.GOVERNMENT, "private": OwnershipClass.PRIVATE}.get(value.lower())
+    return None
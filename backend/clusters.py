@@ -0,0 +1,162 @@
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from camera_index import parse_coordinates
+from categories import OwnershipClass, StatusClass
+
+
+MAX_CLUSTER_ZOOM = 16
+# Each map tile is split into 2**CELL_ZOOM_OFFSET x 2**CELL_ZOOM_OFFSET cells
+# (8x8 cells of 32px on a 256px tile).
+CELL_ZOOM_OFFSET = 3
+MAX_MERCATOR_LAT = 85.05112878
+
+# Per cell: [count, working, government, sum of latitudes, sum of longitudes]
+COUNT, WORKING, GOVERNMENT, SUM_LAT, SUM_LON = range(5)
+
+Cells = Dict[Tuple[int, int], list]
+# (lat, lon, status_class, ownership_class) arrays, one entry per camera
+Columns = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+def mercator_cells(lats: np.ndarray, lons: np.ndarray, zoom: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Slippy-map tile (x, y) arrays containing the points at the given zoom."""
+    n = 1 << zoom
+    lat_rad = np.radians(np.clip(lats, -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT))
+    xs = np.floor((lons + 180.0) / 360.0 * n)
+    ys = np.floor((1.0 - np.log(np.tan(lat_rad) + 1.0 / np.cos(lat_rad)) / np.pi) / 2.0 * n)
+    return np.clip(xs, 0, n - 1).astype(np.int64), np.clip(ys, 0, n - 1).astype(np.int64)
+
+
+class ClusterAggregate:
+    """Zoom-dependent camera counts per map cell, maintained incrementally.
+
+    For every zoom level 0..MAX_CLUSTER_ZOOM each camera adds to exactly one
+    cell, so a change to one camera touches one cell per zoom level and a tile
+    request only reads the cells inside that tile.
+
+    Cells are computed once at the deepest zoom; a coarser zoom's cell is the
+    same (x, y) shifted right, so every zoom agrees on where a camera is and
+    incremental updates always hit the cells the rebuild filled.
+    """
+
+    def __init__(self, max_zoom: int = MAX_CLUSTER_ZOOM):
+        self.max_zoom = max_zoom
+        self._cells: List[Cells] = [{} for _ in range(max_zoom + 1)]
+        self._lock = threading.Lock()
+        # Updates received while a rebuild runs, replayed onto its result
+        self._pending: Optional[List[Tuple[Optional[dict], Optional[dict]]]] = None
+        # One rebuild at a time, as they share _pending
+        self._rebuild_lock = threading.Lock()
+
+    def _deepest_cells(self, lats: np.ndarray, lons: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return mercator_cells(lats, lons, self.max_zoom + CELL_ZOOM_OFFSET)
+
+    def _apply(self, cells_by_zoom: List[Cells], camera_data: dict, sign: int) -> None:
+        location = parse_coordinates(camera_data)
+        if location is None:
+            return
+        lat, lon = location
+        working = int(camera_data.get("status_class") == StatusClass.WORKING)
+        government = int(camera_data.get("ownership_class") == OwnershipClass.GOVERNMENT)
+        xs, ys = self._deepest_cells(np.array([lat]), np.array([lon]))
+        x, y = int(xs[0]), int(ys[0])
+        for zoom, cells in enumerate(cells_by_zoom):
+            shift = self.max_zoom - zoom
+            cell = (x >> shift, y >> shift)
+            stats = cells.get(cell)
+            if stats is None:
+                stats = cells[cell] = [0, 0, 0, 0.0, 0.0]
+            stats[COUNT] += sign
+            stats[WORKING] += sign * working
+            stats[GOVERNMENT] += sign * government
+            stats[SUM_LAT] += sign * lat
+            stats[SUM_LON] += sign * lon
+            if stats[COUNT] <= 0:
+                del cells[cell]
+
+    def _build(self, lats: np.ndarray, lons: np.ndarray, status_class: np.ndarray,
+               ownership_class: np.ndarray) -> List[Cells]:
+        located = ~(np.isnan(lats) | np.isnan(lons))
+        lats, lons = lats[located], lons[located]
+        working = (status_class[located] == StatusClass.WORKING).astype(np.float64)
+        government = (ownership_class[located] == OwnershipClass.GOVERNMENT).astype(np.float64)
+        xs, ys = self._deepest_cells(lats, lons)
+
+        cells_by_zoom = []
+        for zoom in range(self.max_zoom + 1):
+            shift = self.max_zoom - zoom
+            size = 1 << (zoom + CELL_ZOOM_OFFSET)
+            keys, inverse = np.unique((xs >> shift) * size + (ys >> shift), return_inverse=True)
+            counts = np.bincount(inverse, minlength=len(keys))
+            sums = [np.rint(np.bincount(inverse, weights=working, minlength=len(keys))).astype(np.int64),
+                    np.rint(np.bincount(inverse, weights=government, minlength=len(keys))).astype(np.int64),
+                    np.bincount(inverse, weights=lats, minlength=len(keys)),
+                    np.bincount(inverse, weights=lons, minlength=len(keys))]
+            cells_by_zoom.append({
+                (x, y): [count, working_count, government_count, sum_lat, sum_lon]
+                for x, y, count, working_count, government_count, sum_lat, sum_lon in zip(
+                    (keys // size).tolist(), (keys % size).tolist(), counts.tolist(),
+                    *(values.tolist() for values in sums))
+            })
+        return cells_by_zoom
+
+    def rebuild(self, load: Callable[[], Columns]) -> None:
+        """Recompute every cell from ``load()``'s columns.
+
+        The cells are built without holding the lock, so tile requests keep
+        being served from the previous cells; updates that arrive meanwhile
+        are replayed onto the new cells before they are swapped in.
+        """
+        with self._rebuild_lock:
+            with self._lock:
+                self._pending = []
+            try:
+                cells_by_zoom = self._build(*load())
+            except BaseException:
+                with self._lock:
+                    self._pending = None
+                raise
+            with self._lock:
+                for old_data, new_data in self._pending:
+                    self._update(cells_by_zoom, old_data, new_data)
+                self._cells = cells_by_zoom
+                self._pending = None
+
+    def _update(self, cells_by_zoom: List[Cells], old_data: Optional[dict], new_data: Optional[dict]) -> None:
+        if old_data is not None:
+            self._apply(cells_by_zoom, old_data, -1)
+        if new_data is not None:
+            self._apply(cells_by_zoom, new_data, 1)
+
+    def update(self, old_data: Optional[dict], new_data: Optional[dict]) -> None:
+        with self._lock:
+            self._update(self._cells, old_data, new_data)
+            if self._pending is not None:
+                self._pending.append((old_data, new_data))
+
+    def tile(self, zoom: int, x: int, y: int) -> List[dict]:
+        """Clusters inside map tile zoom/x/y, one per non-empty cell."""
+        size = 1 << CELL_ZOOM_OFFSET
+        with self._lock:
+            cells = self._cells[zoom]
+            found = [(cx, cy, tuple(stats))
+                     for cx in range(x * size, (x + 1) * size)
+                     for cy in range(y * size, (y + 1) * size)
+                     for stats in (cells.get((cx, cy)),) if stats is not None]
+
+        clusters = []
+        for cx, cy, (count, working, government, sum_lat, sum_lon) in found:
+            clusters.append({
+                "cell": f"{zoom + CELL_ZOOM_OFFSET}/{cx}/{cy}",
+                "latitude": sum_lat / count,
+                "longitude": sum_lon / count,
+                "count": count,
+                "working": working,
+                "not_working": count - working,
+                "government": government,
+                "private": count - government,
+            })
+        return clusters
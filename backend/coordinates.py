@@ -0,0 +1,88 @@
+from typing import List, Optional
+
+from google.cloud.firestore import GeoPoint
+
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9  # ~5 m cells
+
+# Stored next to latitude/longitude, derived from them
+DERIVED_FIELDS = ("location_point", "geohash")
+
+
+def parse_coordinate(value, limit: float) -> Optional[float]:
+    """A latitude (limit 90) or longitude (limit 180) as a float, or None if missing/invalid.
+
+    Accepts numbers as well as the numeric strings older documents and
+    clients use.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        number = float(value.strip() if isinstance(value, str) else value)
+    except (TypeError, ValueError):
+        return None
+    return number if -limit <= number <= limit else None
+
+
+def geohash_encode(lat: float, lon: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        # Bits alternate between longitude and latitude, starting with longitude
+        interval, coordinate = (lon_range, lon) if even else (lat_range, lat)
+        mid = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= mid:
+            value |= 1
+            interval[0] = mid
+        else:
+            interval[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def geohash_cell_size(precision: int):
+    """(height, width) in degrees of a geohash cell."""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def geohash_prefixes(min_lat: float, max_lat: float, min_lon: float, max_lon: float) -> List[str]:
+    """Geohash prefixes whose cells together cover the box.
+
+    Uses the longest prefix whose cells are at least as large as the box, so
+    the box overlaps at most 2x2 cells. Each prefix is one range query on
+    the ``geohash`` field.
+    """
+    precision = GEOHASH_PRECISION
+    while precision > 0:
+        height, width = geohash_cell_size(precision)
+        if height >= max_lat - min_lat and width >= max_lon - min_lon:
+            break
+        precision -= 1
+    min_lat, max_lat = max(min_lat, -90.0), min(max_lat, 90.0)
+    min_lon, max_lon = max(min_lon, -180.0), min(max_lon, 180.0)
+    corners = [(min_lat, min_lon), (min_lat, max_lon), (max_lat, min_lon), (max_lat, max_lon)]
+    return sorted({geohash_encode(lat, lon, precision) for lat, lon in corners})
+
+
+def with_coordinates(camera_data: dict) -> dict:
+    """Store latitude/longitude as numbers and set location_point and geohash from them.
+
+    Documents whose coordinates are missing or invalid are left unchanged.
+    """
+    lat = parse_coordinate(camera_data.get("latitude"), 90)
+    lon = parse_coordinate(camera_data.get("longitude"), 180)
+    if lat is None or lon is None:
+        return camera_data
+    camera_data["latitude"] = lat
+    camera_data["longitude"] = lon
+    camera_data["location_point"] = GeoPoint(lat, lon)
+    camera_data["geohash"] = geohash_encode(lat, lon)
+    return camera_data
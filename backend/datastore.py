@@ -0,0 +1,92 @@
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from firebase_admin import firestore
+
+import metrics
+
+
+# The Firestore client is synchronous (gRPC). Calls are offloaded to this
+# bounded pool so a slow query never blocks the event loop, and the bound keeps
+# a burst of requests from opening an unbounded number of concurrent RPCs.
+FIRESTORE_THREADS = int(os.environ.get("FIRESTORE_THREADS", "32"))
+
+_executor = ThreadPoolExecutor(max_workers=FIRESTORE_THREADS, thread_name_prefix="firestore")
+_client = None
+
+
+def get_db():
+    """Return the process-wide Firestore client, creating it on first use."""
+    global _client
+    if _client is None:
+        _client = firestore.client()
+    return _client
+
+
+def use_client(client) -> None:
+    """Use the given client instead of creating one, e.g. the in-memory fake in bench/."""
+    global _client
+    _client = client
+
+
+async def run_db(fn, *args, **kwargs):
+    """Run a blocking call on the pool and await its result.
+
+    The call runs in a copy of the caller's context, so metrics recorded
+    inside it are attributed to the calling request.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, context.run, partial(fn, *args, **kwargs))
+
+
+# Firestore calls through these helpers are timed as the request's
+# "firestore" stage and counted the way Firestore bills them.
+
+def _timed(fn, *args):
+    with metrics.stage("firestore"):
+        return fn(*args)
+
+
+async def get_doc(ref):
+    """``ref.get()`` on the pool."""
+    snapshot = await run_db(_timed, ref.get)
+    metrics.count_reads(1)
+    return snapshot
+
+
+async def get_all(db, refs) -> list:
+    """Fetch many documents in one ``get_all`` round trip."""
+    snapshots = await run_db(_timed, lambda: list(db.get_all(refs)))
+    metrics.count_reads(len(snapshots))
+    return snapshots
+
+
+async def stream_all(query) -> list:
+    """Consume ``query.stream()`` on the pool and return the snapshots."""
+    snapshots = await run_db(_timed, lambda: list(query.stream()))
+    # A query is billed at least one read, even when it matches nothing
+    metrics.count_reads(max(1, len(snapshots)))
+    return snapshots
+
+
+async def write_doc(fn, *args, **kwargs):
+    """Run a single-document write such as ``ref.set`` or ``ref.delete`` on the pool."""
+    result = await run_db(_timed, partial(fn, *args, **kwargs))
+    metrics.count_writes(1)
+    return result
+
+
+async def commit_batch(batch):
+    """Commit a write batch on the pool."""
+    writes = len(batch)
+    result = await run_db(_timed, batch.commit)
+    metrics.count_writes(writes)
+    return result
+
+
+def shutdown() -> None:
+    _executor.shutdown(wait=False)
@@ -0,0 +1,171 @@
+import json
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from fastapi.responses import Response, StreamingResponse
+
+from coordinates import parse_coordinate
+
+
+CAMERA_FIELDS = ["id", "location", "private_govt", "owner_name", "contact_no", "latitude", "longitude",
+                 "coverage", "backup", "connected_network", "status"]
+NEARBY_CAMERA_FIELDS = CAMERA_FIELDS + ["camera_id", "distance"]
+# Values CameraInfo gives fields missing from the document
+CAMERA_DEFAULTS = {"status": "Pending"}
+
+# Low-cardinality text columns, dictionary-encoded in Arrow responses
+DICTIONARY_FIELDS = {"status", "private_govt", "backup", "connected_network"}
+FLOAT_FIELDS = {"latitude", "longitude", "distance"}
+COORDINATE_LIMITS = {"latitude": 90, "longitude": 180}
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+ARROW = "application/vnd.apache.arrow.stream"
+NDJSON = "application/x-ndjson"
+MEDIA_TYPE_ALIASES = {
+    "application/x-msgpack": MSGPACK,
+    "application/vnd.apache.arrow.file": ARROW,
+    "application/jsonl": NDJSON,
+}
+
+
+def camera_row(camera_data: dict, **extra) -> dict:
+    """Project a camera document onto the CameraInfo fields as a plain dict.
+
+    Mirrors the coercion CameraInfo applies (coordinates as floats, other
+    fields as strings, missing status as "Pending") without building a
+    pydantic object per camera.
+    """
+    row = {}
+    for field in CAMERA_FIELDS:
+        value = camera_data.get(field, CAMERA_DEFAULTS.get(field))
+        if field in COORDINATE_LIMITS:
+            row[field] = parse_coordinate(value, COORDINATE_LIMITS[field])
+        else:
+            row[field] = value if value is None or isinstance(value, str) else str(value)
+    row.update(extra)
+    return row
+
+
+def camera_rows(values: Dict[str, list], **extra: list) -> List[dict]:
+    """camera_row for many cameras at once, from one list of values per field.
+
+    ``values`` comes from CameraIndex.field_values with CAMERA_DEFAULTS;
+    ``extra`` adds columns the same way. Values are coerced a column at a
+    time and then zipped into one dict per camera.
+    """
+    columns = []
+    for field in CAMERA_FIELDS:
+        if field in COORDINATE_LIMITS:
+            limit = COORDINATE_LIMITS[field]
+            columns.append([parse_coordinate(value, limit) for value in values[field]])
+        else:
+            columns.append([value if value is None or isinstance(value, str) else str(value)
+                            for value in values[field]])
+    names = CAMERA_FIELDS + list(extra)
+    columns.extend(extra.values())
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+
+def _available(media_type: str) -> bool:
+    try:
+        if media_type == MSGPACK:
+            import msgpack  # noqa: F401
+        elif media_type == ARROW:
+            import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """Pick the response media type from an Accept header, JSON by default.
+
+    JSON is also the answer when nothing acceptable is on offer: browsers and
+    older clients send all kinds of headers, and a 406 would break them.
+    """
+    if not accept:
+        return JSON
+    offers = []
+    for position, item in enumerate(accept.split(",")):
+        media_type, _, params = item.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        offers.append((-quality, position, media_type.strip().lower()))
+
+    for negative_quality, _, media_type in sorted(offers):
+        if negative_quality == 0:
+            break
+        if media_type in ("*/*", "application/*", JSON):
+            return JSON
+        media_type = MEDIA_TYPE_ALIASES.get(media_type, media_type)
+        if media_type in (MSGPACK, ARROW, NDJSON) and _available(media_type):
+            return media_type
+    return JSON
+
+
+# Rows per streamed chunk. Starlette moves to a worker thread for every chunk
+# of a sync iterator, so one chunk per row costs more than encoding the row.
+NDJSON_CHUNK_ROWS = 500
+
+
+def _ndjson_lines(rows: Iterable[dict]) -> Iterator[bytes]:
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(row, default=str))
+        if len(lines) == NDJSON_CHUNK_ROWS:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def _arrow_table(rows: Iterable[dict], fields: List[str]):
+    import pyarrow as pa
+
+    columns = {field: [] for field in fields}
+    for row in rows:
+        for field in fields:
+            columns[field].append(row.get(field))
+
+    arrays = []
+    for field in fields:
+        values = columns[field]
+        if field in FLOAT_FIELDS:
+            arrays.append(pa.array([float(v) if v is not None else None for v in values], type=pa.float64()))
+        elif field in DICTIONARY_FIELDS:
+            arrays.append(pa.array(values, type=pa.string()).dictionary_encode())
+        else:
+            arrays.append(pa.array(values, type=pa.string()))
+    return pa.Table.from_arrays(arrays, names=fields)
+
+
+def _arrow_stream(table) -> bytes:
+    import pyarrow as pa
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def encode_rows(rows: Iterable[dict], fields: List[str], media_type: str) -> Response:
+    """Serialize rows in a non-JSON media type chosen by ``negotiate``.
+
+    NDJSON streams row by row; MessagePack keeps the JSON shape (a list of
+    maps); Arrow is columnar with dictionary-encoded text columns and float
+    coordinates.
+    """
+    if media_type == NDJSON:
+        return StreamingResponse(_ndjson_lines(rows), media_type=NDJSON)
+    if media_type == MSGPACK:
+        import msgpack
+        return Response(msgpack.packb(list(rows), default=str), media_type=MSGPACK)
+    if media_type == ARROW:
+        return Response(_arrow_stream(_arrow_table(rows, fields)), media_type=ARROW)
+    raise ValueError(f"Unsupported media type: {media_type}")
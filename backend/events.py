@@ -0,0 +1,251 @@
+import asyncio
+import json
+import threading
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Callable, Deque, Optional, Set, Tuple
+
+from geo import bbox_around
+
+# (min_lat, max_lat, min_lon, max_lon)
+BBox = Tuple[float, float, float, float]
+
+CAMERA = "camera"
+TICKET = "ticket"
+RESYNC = "resync"  # Tells the client to refetch, e.g. after missing events
+
+
+def _json_default(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+class Event:
+    __slots__ = ("seq", "kind", "action", "key", "payload", "locations", "statuses", "encoded")
+
+    def __init__(self, kind: str, action: str, key: Optional[str], payload: Optional[dict],
+                 locations: Tuple[Tuple[float, float], ...] = (), statuses: Tuple[str, ...] = ()):
+        self.seq = 0
+        self.kind = kind
+        self.action = action
+        self.key = key
+        self.payload = payload
+        # Where the camera was before and after the change, and the ticket's
+        # old and new status, so subscribers see things leaving their view too
+        self.locations = locations
+        self.statuses = statuses
+        self.encoded: Optional[bytes] = None
+
+
+class EventFilter:
+    """What a subscriber wants: event kinds, an area and ticket statuses."""
+
+    def __init__(self, kinds: Set[str], area: Optional[BBox] = None, ticket_statuses: Optional[Set[str]] = None):
+        self.kinds = kinds
+        self.area = area
+        self.ticket_statuses = ticket_statuses
+
+    @classmethod
+    def around(cls, kinds: Set[str], lat: float, lon: float, radius_km: float, **kwargs) -> "EventFilter":
+        return cls(kinds, bbox_around(lat, lon, radius_km), **kwargs)
+
+    def matches(self, event: Event) -> bool:
+        if event.kind == RESYNC:
+            return True
+        if event.kind not in self.kinds:
+            return False
+        if self.area is not None:
+            min_lat, max_lat, min_lon, max_lon = self.area
+            if not any(min_lat <= lat <= max_lat and min_lon <= lon <= max_lon for lat, lon in event.locations):
+                return False
+        if event.kind == TICKET and self.ticket_statuses is not None:
+            if not any(status.lower() in self.ticket_statuses for status in event.statuses):
+                return False
+        return True
+
+
+class Subscription:
+    def __init__(self, event_filter: EventFilter, queue_size: int):
+        self.filter = event_filter
+        self.queue: "asyncio.Queue[Event]" = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+
+class Broadcaster:
+    """Fans change events out to live subscribers, with a replay buffer.
+
+    ``publish`` may be called from any thread (the Firestore listener calls
+    it from its own); events are handed to the event loop, which numbers
+    them and delivers them in order. The last ``history`` events are kept so
+    a client reconnecting with the ID of the last event it saw gets what it
+    missed. Event IDs are "<epoch>:<seq>" with an epoch per process, since
+    each worker numbers its own events: a client resuming on another worker,
+    or further back than the buffer, gets a resync event instead.
+
+    A subscriber whose queue fills up (a stalled client) is sent a resync
+    and disconnected rather than slowing everyone else down.
+    """
+
+    def __init__(self, history: int = 1000, queue_size: int = 256):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.queue_size = queue_size
+        self._history: Deque[Event] = deque(maxlen=history)
+        self._seq = 0
+        self._subscribers: Set[Subscription] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def attach(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+
+    def publish(self, event: Event) -> None:
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return  # Not serving yet
+        loop.call_soon_threadsafe(self._dispatch, event)
+
+    def _dispatch(self, event: Event) -> None:
+        self._seq += 1
+        event.seq = self._seq
+        self._history.append(event)
+        for subscription in list(self._subscribers):
+            if subscription.overflowed or not subscription.filter.matches(event):
+                continue
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                subscription.overflowed = True
+
+    def event_id(self, event: Event) -> str:
+        return f"{self.epoch}:{event.seq}"
+
+    def subscribe(self, event_filter: EventFilter, last_event_id: Optional[str] = None) -> Subscription:
+        """Register a subscriber, queueing the events it missed since ``last_event_id``."""
+        subscription = Subscription(event_filter, self.queue_size)
+        if last_event_id:
+            missed = self._since(last_event_id)
+            if missed is None:
+                missed = [self._resync()]
+            for event in missed:
+                if event_filter.matches(event) and not subscription.queue.full():
+                    subscription.queue.put_nowait(event)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def _since(self, last_event_id: str) -> Optional[list]:
+        epoch, _, seq = last_event_id.partition(":")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        seq = int(seq)
+        oldest = self._history[0].seq if self._history else self._seq + 1
+        if seq < oldest - 1 or seq > self._seq:
+            return None
+        return [event for event in self._history if event.seq > seq]
+
+    def _resync(self) -> Event:
+        event = Event(RESYNC, RESYNC, None, None)
+        event.seq = self._seq
+        return event
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def encode(self, event: Event) -> bytes:
+        """The event as a Server-Sent Events message."""
+        if event.encoded is None:
+            data = {"action": event.action, "id": event.key, event.kind: event.payload} if event.kind != RESYNC else {}
+            event.encoded = (f"id: {self.event_id(event)}\nevent: {event.kind}\n"
+                             f"data: {json.dumps(data, default=_json_default)}\n\n").encode("utf-8")
+        return event.encoded
+
+    async def stream(self, subscription: Subscription, heartbeat_seconds: float = 15):
+        """SSE messages for the subscription until the client goes away."""
+        try:
+            # Tells EventSource clients how long to wait before reconnecting
+            yield b"retry: 3000\n\n"
+            while True:
+                if subscription.overflowed and subscription.queue.empty():
+                    yield self.encode(self._resync())
+                    return
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"  # Comment line keeps proxies from closing the stream
+                    continue
+                yield self.encode(event)
+        finally:
+            self.unsubscribe(subscription)
+
+
+class TicketStates:
+    """Last published state per ticket, to drop the listener's echo of our own writes.
+
+    The endpoints publish their ticket changes directly; the Firestore
+    listener then delivers the same change (and those of other workers).
+    Only the fields clients care about are compared, since timestamps come
+    back from Firestore in a different type.
+    """
+
+    FIELDS = ("status", "camera_id", "location", "description", "reported_by")
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._states: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def changed(self, ticket_id: str, ticket_data: Optional[dict]) -> Tuple[bool, Optional[tuple]]:
+        """(whether this differs from the last known state, the last known state)."""
+        state = tuple(ticket_data.get(field) for field in self.FIELDS) if ticket_data is not None else None
+        with self._lock:
+            previous = self._states.pop(ticket_id, None)
+            if state is not None:
+                self._states[ticket_id] = state
+                while len(self._states) > self.max_entries:
+                    self._states.popitem(last=False)
+        return state != previous, previous
+
+
+class TicketListener:
+    """Firestore listener for tickets written after startup, by any worker.
+
+    Listens to ``updated_at >= start time`` rather than the whole collection,
+    so starting it does not read every ticket.
+    """
+
+    def __init__(self, on_change: Callable[[str, Optional[dict]], None]):
+        self.on_change = on_change
+        self._watch = None
+        self._query = None
+        self._initial = True
+
+    def start(self, db) -> None:
+        self._query = db.collection("tickets").where("updated_at", ">=", datetime.utcnow())
+        self._listen()
+
+    def _listen(self) -> None:
+        self._initial = True
+        self._watch = self._query.on_snapshot(self._on_snapshot)
+
+    def _on_snapshot(self, documents, changes, read_time) -> None:
+        if self._initial:
+            self._initial = False  # The current result set, already published
+            return
+        for change in changes:
+            doc = change.document
+            try:
+                self.on_change(doc.id, None if change.type.name == "REMOVED" else doc.to_dict())
+            except Exception as e:
+                print(f"Failed to publish ticket change: {e}")
+
+    def check(self) -> None:
+        if self._watch is not None and not self._watch.is_active:
+            print("tickets listener stopped; restarting it")
+            self._listen()
+
+    def stop(self) -> None:
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
@@ -0,0 +1,233 @@
+import csv
+import io
+import os
+import tempfile
+from datetime import datetime, timezone
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
+
+from coordinates import parse_coordinate
+from datastore import run_db, stream_all
+from ingest import COLUMN_FIELDS
+
+
+# Documents read per Firestore page
+PAGE_SIZE = int(os.environ.get("EXPORT_PAGE_SIZE", "1000"))
+
+# (header, document field, kind) per exported column. Camera exports lead
+# with the upload headers, so an export can be uploaded again as is.
+Column = Tuple[str, str, str]
+CAMERA_COLUMNS: List[Column] = (
+    [(header, field, "number" if field in ("latitude", "longitude") else "text")
+     for header, field in COLUMN_FIELDS.items()]
+    + [("ID", "id", "text"), ("Updated At", "updated_at", "time")]
+)
+TICKET_COLUMNS: List[Column] = [
+    ("ID", "id", "text"),
+    ("Camera ID", "camera_id", "text"),
+    ("Location", "location", "text"),
+    ("Description", "description", "text"),
+    ("Status", "status", "text"),
+    ("Reported By", "reported_by", "text"),
+    ("Reported At", "reported_at", "time"),
+    ("Updated At", "updated_at", "time"),
+]
+EXPORTS = {
+    "cameras": ("camera_info", CAMERA_COLUMNS),
+    "tickets": ("tickets", TICKET_COLUMNS),
+}
+
+
+def _value(value, kind: str, field: str):
+    if value is None:
+        return None
+    if kind == "number":
+        return parse_coordinate(value, 90 if field == "latitude" else 180)
+    if kind == "time":
+        if not isinstance(value, datetime):
+            return None
+        # Firestore returns aware UTC timestamps; spreadsheets have no time zones
+        return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+    return value if isinstance(value, str) else str(value)
+
+
+def document_row(document_id: str, data: dict, columns: List[Column]) -> list:
+    data = {**data, "id": document_id}
+    return [_value(data.get(field), kind, field) for _, field, kind in columns]
+
+
+class CsvWriter:
+    media_type = "text/csv"
+    extension = "csv"
+
+    def __init__(self, columns: List[Column]):
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+        # The BOM makes Excel read the file as UTF-8; the upload reader skips it
+        self._buffer.write("\ufeff")
+        self._writer.writerow([header for header, _, _ in columns])
+
+    def write(self, rows: List[list]) -> bytes:
+        self._writer.writerows([[value.isoformat() if isinstance(value, datetime) else value for value in row]
+                                for row in rows])
+        return self._drain()
+
+    def _drain(self) -> bytes:
+        data = self._buffer.getvalue().encode("utf-8")
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+    def close(self) -> Iterator[bytes]:
+        yield self._drain()
+
+    def discard(self) -> None:
+        pass
+
+
+class XlsxWriter:
+    """Rows go to openpyxl's write-only sheet, which spools them to disk.
+
+    The workbook is a zip whose index comes last, so it is assembled in a
+    temporary file once every row is in and then streamed from there.
+    """
+
+    media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    extension = "xlsx"
+
+    def __init__(self, columns: List[Column]):
+        from openpyxl import Workbook
+
+        self._workbook = Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet("Export")
+        self._sheet.append([header for header, _, _ in columns])
+        self._path: Optional[str] = None
+
+    def write(self, rows: List[list]) -> bytes:
+        for row in rows:
+            self._sheet.append(row)
+        return b""
+
+    def close(self, chunk_size: int = 1 << 16) -> Iterator[bytes]:
+        handle, self._path = tempfile.mkstemp(suffix=".xlsx")
+        os.close(handle)
+        self._workbook.save(self._path)
+        with open(self._path, "rb") as f:
+            while True:
+                data = f.read(chunk_size)
+                if not data:
+                    break
+                yield data
+        self.discard()
+
+    def discard(self) -> None:
+        if self._path is not None:
+            try:
+                os.remove(self._path)
+            except OSError:
+                pass
+            self._path = None
+
+
+class _Sink:
+    """Write-only file object collecting what pyarrow writes until drained."""
+
+    closed = False
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+class ParquetWriter:
+    """One row group per page, sent as soon as it is written."""
+
+    media_type = "application/vnd.apache.parquet"
+    extension = "parquet"
+
+    def __init__(self, columns: List[Column]):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Parquet exports require the pyarrow package")
+
+        types = {"text": pa.string(), "number": pa.float64(), "time": pa.timestamp("us")}
+        self._pa = pa
+        self._schema = pa.schema([(header, types[kind]) for header, _, kind in columns])
+        self._sink = _Sink()
+        self._writer = pq.ParquetWriter(self._sink, self._schema)
+
+    def write(self, rows: List[list]) -> bytes:
+        columns = list(zip(*rows))
+        self._writer.write_table(self._pa.Table.from_arrays(
+            [self._pa.array(values, type=field.type) for values, field in zip(columns, self._schema)],
+            schema=self._schema))
+        return self._sink.drain()
+
+    def close(self) -> Iterator[bytes]:
+        self._writer.close()
+        yield self._sink.drain()
+
+    def discard(self) -> None:
+        pass
+
+
+WRITERS = {"csv": CsvWriter, "xlsx": XlsxWriter, "parquet": ParquetWriter}
+
+
+def export_query(db, collection: str, columns: List[Column], since: Optional[datetime] = None):
+    """The collection in a stable order, optionally only documents updated since ``since``."""
+    query = db.collection(collection).select([field for _, field, _ in columns if field != "id"])
+    if since is not None:
+        # Firestore requires range filters to order on the filtered field first
+        query = query.where("updated_at", ">=", since).order_by("updated_at")
+    return query.order_by("__name__")
+
+
+async def stream_export(query, columns: List[Column], writer, page_size: int = PAGE_SIZE) -> AsyncIterator[bytes]:
+    """Encoded export of every document the query matches, read ``page_size`` at a time.
+
+    Only one page is held in memory at once. Pages are read one after the
+    other, so writes made during a long export may or may not be included.
+    """
+    try:
+        page = query.limit(page_size)
+        while True:
+            docs = await stream_all(page)
+            if docs:
+                rows = [document_row(doc.id, doc.to_dict(), columns) for doc in docs]
+                data = await run_db(writer.write, rows)
+                if data:
+                    yield data
+            if len(docs) < page_size:
+                break
+            page = query.start_after(docs[-1]).limit(page_size)
+
+        chunks = writer.close()
+        while True:
+            data = await run_db(next, chunks, None)
+            if data is None:
+                break
+            yield data
+    finally:
+        writer.discard()
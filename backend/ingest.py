@@ -0,0 +1,417 @@
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from pydantic import BaseModel, Field
+
+from categories import with_categories
+from coordinates import with_coordinates
+from datastore import commit_batch, get_doc, run_db, write_doc
+from stats import StatsDelta, fit_batches
+
+
+# Spreadsheet header -> camera_info field
+COLUMN_FIELDS = {
+    "Location": "location",
+    "Private/Govt": "private_govt",
+    "Owner Name": "owner_name",
+    "Contact No": "contact_no",
+    "Working or not": "status",
+    "Latitude": "latitude",
+    "Longitude": "longitude",
+    "Coverage": "coverage",
+    "Backup": "backup",
+    "Connected to network": "connected_network",
+}
+REQUIRED_COLUMNS = ("Latitude", "Longitude")
+SUPPORTED_EXTENSIONS = (".xlsx", ".xls", ".csv", ".parquet")
+
+CHUNK_ROWS = 2000         # Rows read from the file per chunk
+BATCH_SIZE = 500          # Firestore limit of writes per batch
+COMMIT_CONCURRENCY = int(os.environ.get("UPLOAD_COMMIT_CONCURRENCY", "4"))
+MAX_REPORTED_ERRORS = 1000
+# Job state lives in Firestore so that any worker can report on any upload
+JOBS_COLLECTION = "upload_jobs"
+JOB_SAVE_SECONDS = float(os.environ.get("UPLOAD_JOB_SAVE_SECONDS", "2"))  # Between progress writes
+
+# (spreadsheet row number, camera document)
+RowDocument = Tuple[int, dict]
+# (spreadsheet row number, document id, camera document or None to delete, outcome)
+RowWrite = Tuple[int, Optional[str], Optional[dict], str]
+
+
+class RowError(BaseModel):
+    row: int
+    error: str
+
+
+class UploadJob(BaseModel):
+    job_id: str
+    filename: str
+    status: str = "queued"  # queued, running, completed, failed
+    rows_read: int = 0
+    mode: str = "append"
+    rows_written: int = 0
+    rows_inserted: int = 0
+    rows_updated: int = 0
+    rows_unchanged: int = 0
+    rows_deleted: int = 0
+    rows_skipped: int = 0
+    errors: List[RowError] = []
+    errors_truncated: int = 0
+    detail: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+
+    def add_error(self, row: int, error: str) -> None:
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(RowError(row=row, error=error))
+        else:
+            self.errors_truncated += 1
+
+
+def create_job(filename: str, mode: str = "append") -> UploadJob:
+    return UploadJob(job_id=uuid.uuid4().hex, filename=filename, mode=mode)
+
+
+async def save_job(db, job: UploadJob) -> None:
+    """Write the job's current state to ``upload_jobs``."""
+    await write_doc(db.collection(JOBS_COLLECTION).document(job.job_id).set, job.model_dump())
+
+
+async def load_job(db, job_id: str) -> Optional[UploadJob]:
+    doc = await get_doc(db.collection(JOBS_COLLECTION).document(job_id))
+    return UploadJob.model_validate(doc.to_dict()) if doc.exists else None
+
+
+def is_supported(filename: str) -> bool:
+    return filename.lower().endswith(SUPPORTED_EXTENSIONS)
+
+
+def _chunk_rows(header, rows, chunk_rows: int) -> Iterator[Dict[str, list]]:
+    header = [str(name).strip() if name is not None else "" for name in header]
+    if not header:
+        return
+    columns = {name: [] for name in header}
+    for row in rows:
+        for name, value in zip(header, row):
+            columns[name].append(value)
+        # Short rows (trailing empty cells) are padded so columns stay aligned
+        for name in header[len(row):]:
+            columns[name].append(None)
+        if len(columns[header[0]]) == chunk_rows:
+            yield columns
+            columns = {name: [] for name in header}
+    if columns[header[0]]:
+        yield columns
+
+
+def _iter_xlsx(path: str, chunk_rows: int) -> Iterator[Dict[str, list]]:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is not None:
+            yield from _chunk_rows(header, rows, chunk_rows)
+    finally:
+        workbook.close()
+
+
+def _iter_xls(path: str, chunk_rows: int) -> Iterator[Dict[str, list]]:
+    # Legacy .xls has no streaming reader; it is loaded whole through pandas.
+    import pandas as pd
+
+    df = pd.read_excel(path)
+    df = df.astype(object).where(df.notna(), None)
+    for start in range(0, len(df), chunk_rows):
+        yield {str(name).strip(): values.tolist() for name, values in df.iloc[start:start + chunk_rows].items()}
+
+
+def _iter_csv(path: str, chunk_rows: int) -> Iterator[Dict[str, list]]:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        rows = csv.reader(f)
+        header = next(rows, None)
+        if header is not None:
+            yield from _chunk_rows(header, rows, chunk_rows)
+
+
+def _iter_parquet(path: str, chunk_rows: int) -> Iterator[Dict[str, list]]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Parquet uploads require the pyarrow package")
+
+    parquet_file = pq.ParquetFile(path)
+    for record_batch in parquet_file.iter_batches(batch_size=chunk_rows):
+        yield {str(name).strip(): values for name, values in record_batch.to_pydict().items()}
+
+
+def iter_column_chunks(path: str, filename: str, chunk_rows: int = CHUNK_ROWS) -> Iterator[Dict[str, list]]:
+    """Read the upload incrementally as chunks of {header: [values...]}."""
+    extension = os.path.splitext(filename.lower())[1]
+    readers = {".xlsx": _iter_xlsx, ".xls": _iter_xls, ".csv": _iter_csv, ".parquet": _iter_parquet}
+    return readers[extension](path, chunk_rows)
+
+
+def _clean(value):
+    if value is None:
+        return None
+    if isinstance(value, float) and value != value:  # NaN
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    return value
+
+
+def _clean_coordinates(values: list, low: float, high: float) -> List[Optional[float]]:
+    cleaned = []
+    for value in values:
+        value = _clean(value)
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            cleaned.append(None if value is None else False)
+            continue
+        cleaned.append(number if low <= number <= high else False)
+    return cleaned
+
+
+def build_documents(columns: Dict[str, list], first_row: int, job: UploadJob) -> List[RowDocument]:
+    """Turn one chunk of columns into camera documents, recording row errors on the job.
+
+    Each column is cleaned in one pass; rows are only assembled at the end.
+    ``None`` in a coordinate column means the cell was empty and the row is
+    skipped, ``False`` means it held an invalid value and the row is reported.
+    """
+    missing = [name for name in REQUIRED_COLUMNS if name not in columns]
+    if missing:
+        raise ValueError(f"Missing required column(s): {', '.join(missing)}")
+
+    row_count = len(columns[REQUIRED_COLUMNS[0]])
+    fields = {}
+    for header, field in COLUMN_FIELDS.items():
+        values = columns.get(header, [None] * row_count)
+        if field == "latitude":
+            fields[field] = _clean_coordinates(values, -90, 90)
+        elif field == "longitude":
+            fields[field] = _clean_coordinates(values, -180, 180)
+        else:
+            fields[field] = [_clean(value) for value in values]
+
+    documents = []
+    names = list(fields)
+    for offset, values in enumerate(zip(*fields.values())):
+        row = first_row + offset
+        camera_data = dict(zip(names, values))
+        if camera_data["latitude"] is None or camera_data["longitude"] is None:
+            job.rows_skipped += 1
+            continue  # Skip this row if latitude or longitude is missing
+        if camera_data["latitude"] is False or camera_data["longitude"] is False:
+            job.rows_skipped += 1
+            job.add_error(row, "Invalid latitude/longitude")
+            continue
+        documents.append((row, with_coordinates(with_categories(camera_data))))
+    return documents
+
+
+def _normalized_coordinate(value) -> str:
+    return f"{float(value):.6f}"
+
+
+def camera_key(camera_data: dict) -> str:
+    """Deterministic document key from normalized lat/lon, plus owner and location when present."""
+    parts = [_normalized_coordinate(camera_data["latitude"]), _normalized_coordinate(camera_data["longitude"])]
+    for field in ("owner_name", "location"):
+        value = camera_data.get(field)
+        if value is not None and str(value).strip():
+            parts.append(" ".join(str(value).lower().split()))
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:20]
+
+
+def content_hash(camera_data: dict) -> str:
+    """Hash of the spreadsheet-backed fields, used to detect changed rows."""
+    values = []
+    for field in COLUMN_FIELDS.values():
+        value = camera_data.get(field)
+        if field in ("latitude", "longitude"):
+            value = _normalized_coordinate(value)
+        values.append(None if value is None else str(value))
+    return hashlib.sha1(json.dumps(values).encode("utf-8")).hexdigest()
+
+
+class UpsertPlan:
+    """Diff of an incoming sheet against the existing camera documents.
+
+    Existing documents are hashed once up front; each incoming row is then
+    classified as inserted, updated or unchanged by a dict lookup.
+    """
+
+    def __init__(self, existing_records: Iterable[dict]):
+        # key -> [(document id, content hash)], more than one when the
+        # collection already holds duplicates of the same camera
+        self.existing: Dict[str, List[Tuple[str, str]]] = {}
+        for record in existing_records:
+            try:
+                key = camera_key(record)
+            except (KeyError, TypeError, ValueError):
+                continue  # Records without usable coordinates cannot be matched
+            self.existing.setdefault(key, []).append((record["id"], content_hash(record)))
+        self.seen: Set[str] = set()
+
+    def diff(self, documents: List[RowDocument], job: UploadJob) -> List[RowWrite]:
+        writes = []
+        for row, camera_data in documents:
+            key = camera_key(camera_data)
+            if key in self.seen:
+                job.rows_skipped += 1
+                job.add_error(row, "Duplicate of an earlier row")
+                continue
+            self.seen.add(key)
+
+            matches = self.existing.get(key)
+            if not matches:
+                writes.append((row, key, camera_data, "inserted"))
+            elif matches[0][1] == content_hash(camera_data):
+                job.rows_unchanged += 1
+            else:
+                writes.append((row, matches[0][0], camera_data, "updated"))
+        return writes
+
+    def removals(self) -> List[RowWrite]:
+        """Existing documents missing from the sheet, plus redundant duplicates of rows in it."""
+        writes = []
+        for key, matches in self.existing.items():
+            stale = matches[1:] if key in self.seen else matches
+            writes.extend((0, doc_id, None, "deleted") for doc_id, _ in stale)
+        return writes
+
+
+async def run_upload(job: UploadJob, path: str, db, on_committed: Callable[[List[Tuple[str, Optional[dict]]]], None],
+                     plan: Optional[UpsertPlan] = None, delete_missing: bool = False,
+                     existing: Callable[[str], Optional[dict]] = lambda doc_id: None) -> None:
+    """Stream the file at ``path`` into camera_info, committing batches concurrently.
+
+    Without a ``plan`` every row is appended as a new auto-ID document. With
+    one, only inserted and changed rows are written, under deterministic IDs,
+    and ``delete_missing`` also removes documents absent from the file.
+    ``existing`` returns the current document for an ID, so the stats
+    counters committed with each batch can account for updates and deletes.
+    The job's progress is saved every JOB_SAVE_SECONDS and when it ends.
+    """
+    job.status = "running"
+    semaphore = asyncio.Semaphore(COMMIT_CONCURRENCY)
+    commits = set()
+    last_saved = 0.0
+
+    async def save(force: bool = False):
+        nonlocal last_saved
+        if not force and time.monotonic() - last_saved < JOB_SAVE_SECONDS:
+            return
+        last_saved = time.monotonic()
+        try:
+            await save_job(db, job)
+        except Exception as e:
+            # Progress reports are best effort; the upload itself goes on
+            print(f"Failed to save upload job {job.job_id}: {e}")
+
+    def counted(writes: List[RowWrite]):
+        for write in writes:
+            _, doc_id, camera_data, _ = write
+            old_data = existing(doc_id) if doc_id is not None else None
+            # Upserts are merged into the existing document
+            new_data = {**(old_data or {}), **camera_data} if camera_data is not None else None
+            yield write, StatsDelta().camera(old_data, new_data)
+
+    async def commit(writes: List[RowWrite]):
+        try:
+            # The counter updates can push a batch over the limit; split it then
+            for part, delta in fit_batches(counted(writes), BATCH_SIZE):
+                await commit_part(part, delta)
+        finally:
+            semaphore.release()
+
+    async def commit_part(writes: List[RowWrite], delta: StatsDelta):
+        try:
+            batch = db.batch()
+            committed = []
+            updated_at = datetime.utcnow()
+            for _, doc_id, camera_data, _ in writes:
+                if camera_data is None:
+                    batch.delete(db.collection("camera_info").document(doc_id))
+                elif doc_id is None:
+                    doc_ref = db.collection("camera_info").document()
+                    batch.set(doc_ref, {**camera_data, "updated_at": updated_at})
+                    doc_id = doc_ref.id
+                else:
+                    batch.set(db.collection("camera_info").document(doc_id),
+                              {**camera_data, "updated_at": updated_at}, merge=True)
+                committed.append((doc_id, camera_data))
+            delta.add_to(db, batch)
+            await commit_batch(batch)
+            on_committed(committed)
+            for _, _, camera_data, outcome in writes:
+                setattr(job, f"rows_{outcome}", getattr(job, f"rows_{outcome}") + 1)
+                if camera_data is not None:
+                    job.rows_written += 1
+        except Exception as e:
+            for row, doc_id, _, outcome in writes:
+                job.add_error(row, f"Write failed: {e}" if outcome != "deleted" else f"Delete of {doc_id} failed: {e}")
+
+    async def submit(writes: List[RowWrite]):
+        # Waiting here applies backpressure on reading the file
+        await semaphore.acquire()
+        task = asyncio.create_task(commit(writes))
+        commits.add(task)
+        task.add_done_callback(commits.discard)
+
+    try:
+        await save(force=True)
+        chunks = iter_column_chunks(path, job.filename)
+        first_row = 2  # Row 1 holds the headers
+        pending: List[RowWrite] = []
+        while True:
+            columns = await run_db(next, chunks, None)
+            if columns is None:
+                break
+            row_count = len(next(iter(columns.values()), []))
+            job.rows_read += row_count
+            documents = build_documents(columns, first_row, job)
+            if plan is None:
+                pending.extend((row, None, camera_data, "inserted") for row, camera_data in documents)
+            else:
+                pending.extend(plan.diff(documents, job))
+            first_row += row_count
+
+            while len(pending) >= BATCH_SIZE:
+                writes, pending = pending[:BATCH_SIZE], pending[BATCH_SIZE:]
+                await submit(writes)
+            await save()
+
+        if plan is not None and delete_missing:
+            pending.extend(plan.removals())
+        for start in range(0, len(pending), BATCH_SIZE):
+            await submit(pending[start:start + BATCH_SIZE])
+        if commits:
+            await asyncio.gather(*commits)
+        job.status = "completed"
+    except Exception as e:
+        if commits:
+            await asyncio.gather(*commits, return_exceptions=True)
+        job.status = "failed"
+        job.detail = str(e)
+    finally:
+        job.finished_at = datetime.utcnow()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        await save(force=True)
@@ -1,21 +1,52 @@
 import firebase_admin
-from fastapi import FastAPI, Depends, UploadFile, File, HTTPException, status
+from fastapi import FastAPI, Depends, UploadFile, File, HTTPException, Query, Request, Response, status
 from fastapi.security import OAuth2PasswordBearer
-from pydantic import BaseModel, Field, ValidationError, EmailStr
+from pydantic import BaseModel, BeforeValidator, Field, ValidationError, EmailStr
 from firebase_admin import firestore, credentials, auth
-from geopy.distance import geodesic
-from typing import List, Dict, Optional
-import pandas as pd
+from typing import Annotated, List, Dict, Literal, Optional, Tuple
+import numpy as np
 import math
-from datetime import datetime
+from datetime import datetime, timezone
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+import asyncio
+import hashlib
+import json
+import os
 import secrets
+import shutil
 import string
+import tempfile
+
+from camera_index import CameraIndex, Candidates, parse_coordinates
+from camera_sync import CameraSync
+from datastore import commit_batch, get_all, get_db, get_doc, run_db, stream_all, write_doc
+import metrics
+from ingest import UploadJob
+import datastore
+import ingest
+from categories import parse_ownership_filter, parse_status_filter, with_categories
+from coordinates import GEOHASH_ALPHABET, geohash_prefixes, parse_coordinate, with_coordinates
+from geo import HAVERSINE_GEODESIC_MARGIN, MIN_KM_PER_DEGREE, bbox_around, distance_km, geodesic_km, haversine_km, point_segment_distances
+from nearby_cache import NearbyCache
+from encoders import (CAMERA_DEFAULTS, CAMERA_FIELDS, JSON, NEARBY_CAMERA_FIELDS, camera_row, camera_rows,
+                      encode_rows, negotiate)
+from clusters import MAX_CLUSTER_ZOOM, ClusterAggregate
+import stats
+from stats import StatsDelta, fit_batches
+from events import CAMERA, RESYNC, TICKET, Broadcaster, Event, EventFilter, TicketListener, TicketStates
+from google.api_core.exceptions import FailedPrecondition
+from submissions import QueueFull, Submission, SubmissionStatus, WriteQueue
+import export
 
 
 # Initialize Firebase (Replace with your actual credentials path)
-cred = credentials.Certificate("cctv-locator-police-hackathon-firebase-adminsdk-w7zln-e12925260e.json")
-firebase_admin.initialize_app(cred)
+if os.environ.get("FIRESTORE_EMULATOR_HOST"):
+    # Local development/load testing against the Firestore emulator
+    firebase_admin.initialize_app(options={"projectId": os.environ.get("FIREBASE_PROJECT_ID", "cctv-locator-local")})
+else:
+    cred = credentials.Certificate("cctv-locator-police-hackathon-firebase-adminsdk-w7zln-e12925260e.json")
+    firebase_admin.initialize_app(cred)
 
 app = FastAPI()
 
@@ -27,6 +58,204 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+# Per-request stage timings and Firestore usage, exported on /metrics. The
+# slow request profiler is off unless PROFILE_SLOW_REQUESTS is set.
+slow_requests = metrics.SlowRequestProfiler(
+    keep=int(os.environ.get("PROFILE_SLOW_REQUESTS", "0")),
+    sample_rate=float(os.environ.get("PROFILE_SAMPLE_RATE", "0.1")),
+    interval=float(os.environ.get("PROFILE_INTERVAL_MS", "5")) / 1000,
+)
+app.add_middleware(
+    metrics.MetricsMiddleware,
+    server_timing=os.environ.get("SERVER_TIMING", "0") == "1",
+    profiler=slow_requests,
+)
+
+# Process-resident spatial index over camera_info, used by the read endpoints.
+# Writes made through this worker are applied immediately; CameraSync loads it
+# from the shared snapshot and applies writes made through the other workers.
+camera_index = CameraIndex()
+CAMERA_INDEX_MAX_STALENESS = float(os.environ.get("CAMERA_INDEX_MAX_STALENESS_SECONDS", "600"))
+camera_sync = CameraSync(
+    camera_index,
+    snapshot_dir=os.environ.get("CAMERA_SNAPSHOT_DIR", "camera_snapshot") or None,
+    # A worker starting from a snapshot no older than this is fresh at once
+    snapshot_max_age=float(os.environ.get("CAMERA_SNAPSHOT_MAX_AGE_SECONDS", CAMERA_INDEX_MAX_STALENESS)),
+    max_staleness=CAMERA_INDEX_MAX_STALENESS,
+    use_listener=os.environ.get("CAMERA_LISTENER", "1") == "1",
+    refresh_seconds=float(os.environ.get("CAMERA_INDEX_REFRESH_SECONDS", "300")),
+)
+CAMERA_SYNC_CHECK_SECONDS = 10
+
+BATCH_LIMIT = 500        # Firestore limit of writes per batch
+MAX_BATCH_CAMERAS = 1000 # Cameras per bulk request
+
+# Result cache for /nearby_cameras, invalidated by tile on every index change
+nearby_cache = NearbyCache(
+    max_entries=int(os.environ.get("NEARBY_CACHE_SIZE", "1024")),
+    ttl_seconds=float(os.environ.get("NEARBY_CACHE_TTL_SECONDS", "60")),
+    quantum_deg=float(os.environ.get("NEARBY_CACHE_QUANTUM_DEG", "0.0001")),
+)
+
+def invalidate_nearby_cache(camera_id, old_data, new_data):
+    if camera_id is None:
+        nearby_cache.clear()
+        return
+    for camera_data in (old_data, new_data):
+        location = parse_coordinates(camera_data) if camera_data else None
+        if location is not None:
+            nearby_cache.invalidate_point(*location)
+
+camera_index.add_listener(invalidate_nearby_cache)
+
+# Per-cell camera counts for the map, kept in step with the index
+camera_clusters = ClusterAggregate()
+
+def update_camera_clusters(camera_id, old_data, new_data):
+    if camera_id is None:
+        camera_clusters.rebuild(camera_index.columns)
+    else:
+        camera_clusters.update(old_data, new_data)
+
+camera_index.add_listener(update_camera_clusters)
+
+# Live change events for /events. Camera changes come from the index, so
+# they include other workers' writes once the listener delivers them.
+broadcaster = Broadcaster(
+    history=int(os.environ.get("EVENTS_HISTORY", "1000")),
+    queue_size=int(os.environ.get("EVENTS_QUEUE_SIZE", "256")),
+)
+
+def publish_camera_change(camera_id, old_data, new_data):
+    if camera_id is None:
+        broadcaster.publish(Event(RESYNC, RESYNC, None, None))
+        return
+    if old_data == new_data:
+        return  # The listener echoing a write this worker already applied
+    action = "created" if old_data is None else "deleted" if new_data is None else "updated"
+    locations = tuple(location for location in (parse_coordinates(old_data) if old_data else None,
+                                                parse_coordinates(new_data) if new_data else None)
+                      if location is not None)
+    payload = camera_row(new_data) if new_data is not None else None
+    broadcaster.publish(Event(CAMERA, action, camera_id, payload, locations=locations))
+
+camera_index.add_listener(publish_camera_change)
+
+ticket_states = TicketStates()
+
+def publish_ticket_change(ticket_id: str, ticket_data: Optional[dict]):
+    """Publish a ticket write; called by the endpoints and by the tickets listener."""
+    changed, previous = ticket_states.changed(ticket_id, ticket_data)
+    if not changed:
+        return
+    if ticket_data is None:
+        action = "deleted"
+    elif ticket_data.get("updated_at") == ticket_data.get("reported_at"):
+        action = "created"
+    else:
+        action = "updated"
+    # Old and new status, so subscribers to a status also see tickets leaving it
+    statuses = tuple(status for status in {previous[0] if previous else None,
+                                           ticket_data.get("status") if ticket_data else None}
+                     if status is not None)
+    camera_id = (ticket_data or {}).get("camera_id")
+    camera_data = camera_index.get(camera_id) if camera_id else None
+    location = parse_coordinates(camera_data) if camera_data else None
+    payload = {**ticket_data, "id": ticket_id} if ticket_data is not None else None
+    broadcaster.publish(Event(TICKET, action, ticket_id, payload,
+                              locations=(location,) if location else (), statuses=statuses))
+
+ticket_listener = TicketListener(publish_ticket_change)
+
+def submissions_written(submissions):
+    for submission in submissions:
+        if submission.camera_data is not None:
+            camera_index.upsert(submission.camera_id, submission.camera_data)
+        publish_ticket_change(submission.ticket_id, submission.ticket_data)
+
+# Field submissions (/report, /OnGroundCreateCamera) are acknowledged at once
+# and written in batches
+write_queue = WriteQueue(
+    camera_index, submissions_written,
+    max_pending=int(os.environ.get("SUBMISSION_QUEUE_SIZE", "2000")),
+    max_batch=int(os.environ.get("SUBMISSION_BATCH_SIZE", "100")),
+    max_delay=float(os.environ.get("SUBMISSION_FLUSH_MS", "50")) / 1000,
+    writers=int(os.environ.get("SUBMISSION_WRITERS", "2")),
+    retries=int(os.environ.get("SUBMISSION_RETRIES", "5")),
+)
+# Distance within which a new on-ground camera is taken for an existing one
+DUPLICATE_CAMERA_METERS = float(os.environ.get("DUPLICATE_CAMERA_METERS", "5"))
+
+# Background upload jobs, referenced here so they are not garbage collected
+upload_tasks = set()
+
+# With several workers, /metrics sums the metrics every worker saves here
+shared_metrics = (metrics.SharedMetrics(os.environ["METRICS_MULTIPROC_DIR"], metrics.registry)
+                  if os.environ.get("METRICS_MULTIPROC_DIR") else None)
+METRICS_SAVE_SECONDS = float(os.environ.get("METRICS_SAVE_SECONDS", "5"))
+
+async def save_shared_metrics():
+    while True:
+        await asyncio.sleep(METRICS_SAVE_SECONDS)
+        try:
+            await run_db(shared_metrics.save)
+        except Exception as e:
+            print(f"Failed to save metrics: {e}")
+
+async def check_camera_sync():
+    while True:
+        await asyncio.sleep(CAMERA_SYNC_CHECK_SECONDS)
+        try:
+            await run_db(camera_sync.check)
+            if camera_sync.use_listener:
+                await run_db(ticket_listener.check)
+        except Exception as e:
+            print(f"Failed to refresh camera index: {e}")
+
+@app.on_event("startup")
+async def load_camera_index():
+    broadcaster.attach(asyncio.get_running_loop())
+    # Create the shared Firestore client once, before serving requests
+    count = await run_db(camera_sync.start, get_db())
+    print(f"Loaded {count} cameras into the spatial index from {camera_sync.source}")
+    if camera_sync.use_listener:
+        # Ticket writes made through other workers; without listeners only
+        # this worker's writes are published
+        await run_db(ticket_listener.start, get_db())
+    write_queue.start(get_db())
+    asyncio.create_task(check_camera_sync())
+    if shared_metrics:
+        asyncio.create_task(save_shared_metrics())
+
+@app.on_event("shutdown")
+async def shutdown_datastore():
+    await write_queue.stop()
+    ticket_listener.stop()
+    camera_sync.stop()
+    if shared_metrics:
+        shared_metrics.save()
+    datastore.shutdown()
+
+# Readiness probe: 503 until the camera index is loaded and within its staleness bound
+@app.get("/ready")
+async def readiness(response: Response):
+    sync_status = camera_sync.status()
+    if not sync_status["ready"]:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return sync_status
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    rendered = await run_db(shared_metrics.render) if shared_metrics else metrics.registry.render()
+    return PlainTextResponse(rendered, media_type="text/plain; version=0.0.4")
+
+# Slowest requests seen by this worker, with stack samples for the profiled ones
+@app.get("/metrics/slow_requests")
+async def get_slow_requests():
+    if not slow_requests.enabled:
+        raise HTTPException(status_code=404, detail="Slow request profiling is disabled (set PROFILE_SLOW_REQUESTS)")
+    return slow_requests.slowest()
+
 # Data Models
 class UserDetails(BaseModel):
     email: EmailStr
@@ -45,14 +274,22 @@ class UserResponse(BaseModel):
     role: str = Field(..., description="User's role (e.g., 'admin', 'user')")
     temporary_password: str = Field(..., description="Temporary password for the user")
 
+# Coordinates are stored as numbers. Requests may send them as numbers or
+# numeric strings; documents written before the migration hold strings, and
+# unparseable legacy values read back as null.
+Latitude = Annotated[float, Field(ge=-90, le=90)]
+Longitude = Annotated[float, Field(ge=-180, le=180)]
+StoredLatitude = Annotated[Optional[float], BeforeValidator(lambda value: parse_coordinate(value, 90))]
+StoredLongitude = Annotated[Optional[float], BeforeValidator(lambda value: parse_coordinate(value, 180))]
+
 class CameraInfo(BaseModel):
     id: str
     location: Optional[str] = None
     private_govt: Optional[str] = None
     owner_name: Optional[str] = None
     contact_no: Optional[str] = None
-    latitude: str
-    longitude: str
+    latitude: StoredLatitude = None
+    longitude: StoredLongitude = None
     coverage: Optional[str] = None
     backup: Optional[str] = None
     connected_network: Optional[str] = None
@@ -63,20 +300,38 @@ class CameraUpdate(BaseModel):
     private_govt: Optional[str] = Field(None)
     owner_name: Optional[str] = Field(None)
     contact_no: Optional[str] = Field(None)
-    latitude: Optional[str] = Field(None)
-    longitude: Optional[str] = Field(None)
+    latitude: Optional[Latitude] = Field(None)
+    longitude: Optional[Longitude] = Field(None)
     coverage: Optional[str] = Field(None)
     backup: Optional[str] = Field(None)
     connected_network: Optional[str] = Field(None)
     status: Optional[str] = Field(None)
 
+class CameraPatch(CameraUpdate):
+    id: str
+
+class CameraBatchIds(BaseModel):
+    ids: List[str]
+
+class CameraBatchUpdate(BaseModel):
+    updates: List[CameraPatch]
+
+class CameraBatchItem(BaseModel):
+    id: str
+    ok: bool
+    camera: Optional[CameraInfo] = None
+    error: Optional[str] = None
+
+class CameraBatchResult(BaseModel):
+    results: List[CameraBatchItem]
+
 class OnGroundCreateCamera(BaseModel):
     location: Optional[str] = None
     private_govt: Optional[str] = None
     owner_name: Optional[str] = None
     contact_no: Optional[str] = None
-    latitude: str
-    longitude: str
+    latitude: Latitude
+    longitude: Longitude
     coverage: Optional[str] = None
     backup: Optional[str] = None
     connected_network: Optional[str] = None
@@ -88,8 +343,8 @@ class CreateCamera(BaseModel):
     private_govt: Optional[str] = None
     owner_name: Optional[str] = None
     contact_no: Optional[str] = None
-    latitude: str
-    longitude: str
+    latitude: Latitude
+    longitude: Longitude
     coverage: Optional[str] = None
     backup: Optional[str] = None
     connected_network: Optional[str] = None
@@ -117,6 +372,13 @@ class TicketInput(BaseModel):
     description: Optional[str]
     reported_by: Optional[str]
 
+class TicketWithCamera(Ticket):
+    camera: Optional[CameraInfo] = None
+
+class TicketPage(BaseModel):
+    tickets: List[TicketWithCamera]
+    next_cursor: Optional[str] = Field(None, description="Pass as 'cursor' to fetch the next page")
+
 class CameraTicketCreate(BaseModel):
     camera: CameraInfo
     ticket: TicketInfo
@@ -131,8 +393,59 @@ class UserLocation(BaseModel):
     radius_meters: int = Field(500, gt=0, description="Radius in meters (must be positive)")
     status_filter: Optional[str] = None
     ownership_filter: Optional[str] = None
+    distance_method: Literal["geodesic", "haversine"] = Field(
+        "geodesic", description="'geodesic' for exact WGS-84 distances, 'haversine' for the faster spherical approximation")
     
 
+class NearbyBatchQuery(BaseModel):
+    queries: List[UserLocation]
+    include_union: bool = Field(False, description="Also return the deduplicated union of all results")
+
+class UnionCameraInfo(NearbyCameraInfo):
+    distance: float = Field(..., description="Smallest distance to any of the matching query points, in kilometers")
+    query_indices: List[int] = Field(..., description="Positions of the queries that returned this camera")
+
+class NearbyBatchResult(BaseModel):
+    results: List[List[NearbyCameraInfo]]
+    union: Optional[List[UnionCameraInfo]] = None
+
+class RoutePoint(BaseModel):
+    latitude: float
+    longitude: float
+    timestamp: Optional[datetime] = None
+
+class RouteQuery(BaseModel):
+    points: List[RoutePoint] = Field(..., description="Polyline or GPS fixes in travel order")
+    buffer_meters: int = Field(100, gt=0, le=5000, description="Corridor half-width in meters")
+    status_filter: Optional[str] = None
+    ownership_filter: Optional[str] = None
+
+class RouteCameraInfo(CameraInfo):
+    camera_id: str
+    distance: float = Field(..., description="Distance from the route in kilometers")
+    route_position: float = Field(..., description="Distance along the route to the closest point, in kilometers")
+    passed_at: Optional[datetime] = Field(None, description="Interpolated time at the closest point, when the points have timestamps")
+
+class CameraStats(BaseModel):
+    total: int = 0
+    status: Dict[str, int] = Field({}, description="By working / not_working")
+    ownership: Dict[str, int] = Field({}, description="By government / private")
+    connected_network: Dict[str, int] = {}
+    backup: Dict[str, int] = {}
+
+class TicketStats(BaseModel):
+    total: int = 0
+    status: Dict[str, int] = {}
+    open: int = Field(0, description="Tickets that are not closed")
+
+class FleetStats(BaseModel):
+    cameras: CameraStats = CameraStats()
+    tickets: TicketStats = TicketStats()
+
+class AreaStats(BaseModel):
+    area: str = Field(..., description="Geohash of the area")
+    cameras: CameraStats
+
 class UserUpdate(BaseModel):
     officer_id: str
     name: str
@@ -149,11 +462,11 @@ def generate_password(length=12):
 @app.get("/users/{uid}", response_model=UserDetails)
 async def read_user(uid: str):
     try:
-        db = firestore.client()
+        db = get_db()
         user_ref = db.collection("users").document(uid)
         
         # Get the user document from Firestore
-        user_doc = user_ref.get()
+        user_doc = await get_doc(user_ref)
         if not user_doc.exists:
             raise HTTPException(status_code=404, detail="User not found")
         
@@ -173,7 +486,8 @@ async def create_user(user_data: User):
         temporary_password = generate_password()
         
         # Create the user in Firebase Authentication
-        user_record = auth.create_user(
+        user_record = await run_db(
+            auth.create_user,
             email=user_data.email,
             password=temporary_password,
         )
@@ -186,8 +500,8 @@ async def create_user(user_data: User):
         user_dict['uid'] = uid
         
         # Store the user data in Firestore
-        db = firestore.client()
-        db.collection("users").document(uid).set(user_dict)
+        db = get_db()
+        await write_doc(db.collection("users").document(uid).set, user_dict)
         
         # Return the user data along with the temporary password
         return UserResponse(
@@ -204,16 +518,16 @@ async def create_user(user_data: User):
 @app.put("/users/{uid}", response_model=UserUpdate)
 async def update_user(uid: str, user_update: UserUpdate):
     try:
-        db = firestore.client()
+        db = get_db()
         user_ref = db.collection("users").document(uid)
         
         # Check if the user exists
-        user_doc = user_ref.get()
+        user_doc = await get_doc(user_ref)
         if not user_doc.exists:
             raise HTTPException(status_code=404, detail="User not found")
         
         # Update the user document in Firestore
-        user_ref.update({
+        await write_doc(user_ref.update, {
             "officer_id": user_update.officer_id,
             "name": user_update.name,
             "phone_number": user_update.phone_number,
@@ -235,19 +549,19 @@ async def update_user(uid: str, user_update: UserUpdate):
 @app.delete("/users/{uid}")
 async def delete_user(uid: str):
     try:
-        db = firestore.client()
+        db = get_db()
         user_ref = db.collection("users").document(uid)
         
         # Check if the user exists in Firestore
-        user_doc = user_ref.get()
+        user_doc = await get_doc(user_ref)
         if not user_doc.exists:
             raise HTTPException(status_code=404, detail="User not found in Firestore")
         
         # Delete the user document from Firestore
-        user_ref.delete()
+        await write_doc(user_ref.delete)
         
         # Delete the user from Firebase Authentication
-        auth.delete_user(uid)
+        await run_db(auth.delete_user, uid)
         
         return {"message": f"User with UID {uid} has been deleted from both Firestore and Authentication."}
     except auth.UserNotFoundError:
@@ -255,62 +569,90 @@ async def delete_user(uid: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error deleting user: {str(e)}")
 
-# Updated Endpoint to upload and process Excel file (Admin only)
-@app.post("/upload_camera_data")
-async def upload_camera_data(file: UploadFile = File(...)):
-    # Check if file is an Excel file
-    if not file.filename.endswith('.xlsx') and not file.filename.endswith('.xls'):
+# Endpoint to upload and process an Excel/CSV/Parquet file (Admin only).
+# The file is ingested in the background; poll the returned job for progress.
+@app.post("/upload_camera_data", response_model=UploadJob, status_code=status.HTTP_202_ACCEPTED)
+async def upload_camera_data(file: UploadFile = File(...),
+                             mode: Literal["append", "upsert"] = "append",
+                             delete_missing: bool = False):
+    # Check if file is a supported spreadsheet
+    if not ingest.is_supported(file.filename):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
-                            detail="Invalid file type. Please upload an Excel file.")
+                            detail="Invalid file type. Please upload an Excel, CSV or Parquet file.")
 
     try:
-        df = pd.read_excel(file.file)
-        db = firestore.client()
-
-        batch = db.batch()  # Initialize a batch operation
-        batch_size = 500     # Number of operations to include in each batch
-        operations_count = 0
-
-        for _, row in df.iterrows():
-            if pd.isna(row["Latitude"]) or pd.isna(row["Longitude"]):
-                continue  # Skip this row if latitude or longitude is missing
-
-            camera_data = {
-                "location": row["Location"],
-                "private_govt": row["Private/Govt"],
-                "owner_name": row["Owner Name"],
-                "contact_no": row["Contact No"],
-                "status": row["Working or not"],
-                "latitude": str(row["Latitude"]),
-                "longitude": str(row["Longitude"]),
-                "coverage": row["Coverage"],
-                "backup": row["Backup"],
-                "connected_network": row["Connected to network"],
-            }
-
-            doc_ref = db.collection("camera_info").document()
-            batch.set(doc_ref, camera_data)
-            operations_count += 1
-
-            if operations_count == batch_size:
-                batch.commit()  # Commit the batch when it reaches the desired size
-                batch = db.batch()  # Start a new batch
-                operations_count = 0
-
-        if operations_count > 0:
-            batch.commit()  # Commit any remaining operations in the last batch
-
-        return {"message": "Camera data uploaded and processed successfully!"}
-
+        # Spool the upload to disk so it outlives the request
+        suffix = os.path.splitext(file.filename)[1]
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as spooled:
+            await run_db(shutil.copyfileobj, file.file, spooled)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                             detail=f"Error processing file: {e}")
 
+    def index_committed(documents):
+        for camera_id, camera_data in documents:
+            if camera_data is None:
+                camera_index.remove(camera_id)
+            else:
+                # Upserts are merged into the existing document
+                camera_index.upsert(camera_id, {**(camera_index.get(camera_id) or {}), **camera_data})
+
+    db = get_db()
+    plan = None
+    if mode == "upsert":
+        # Diff against a fresh view of the collection, not one that may be
+        # missing writes made through other workers
+        if not camera_sync.listening:
+            await run_db(camera_sync.reload)
+        plan = ingest.UpsertPlan(camera_index.records())
+
+    job = ingest.create_job(file.filename, mode=mode)
+    try:
+        # Saved before answering, so that any worker can report on it right away
+        await ingest.save_job(db, job)
+    except Exception as e:
+        os.remove(spooled.name)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail=f"Error creating upload job: {e}")
+    task = asyncio.create_task(ingest.run_upload(job, spooled.name, db, index_committed,
+                                                 plan=plan, delete_missing=delete_missing,
+                                                 existing=camera_index.get))
+    upload_tasks.add(task)
+    task.add_done_callback(upload_tasks.discard)
+    return job
+
+@app.get("/upload_camera_data/{job_id}", response_model=UploadJob)
+async def get_upload_job(job_id: str):
+    job = await ingest.load_job(get_db(), job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Upload job not found")
+    return job
+
+
+# Download a whole collection, or what changed since a time, as a file.
+# Camera exports use the upload column headers, so they can be uploaded back.
+@app.get("/export/{collection}")
+async def export_collection(
+    collection: Literal["cameras", "tickets"],
+    format: Literal["xlsx", "csv", "parquet"] = "xlsx",
+    since: Optional[datetime] = Query(None, description="Only records created or updated at or after this time (UTC)"),
+):
+    collection_name, columns = export.EXPORTS[collection]
+    try:
+        writer = export.WRITERS[format](columns)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    query = export.export_query(get_db(), collection_name, columns, since)
+    filename = f"{collection}-{datetime.utcnow():%Y%m%d-%H%M%S}.{writer.extension}"
+    return StreamingResponse(export.stream_export(query, columns, writer), media_type=writer.media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
 
 # Create (Add a new camera)
 @app.post("/cameras", response_model=CameraInfo)
 async def create_camera(camera_info: CreateCamera):
-    db = firestore.client()
+    db = get_db()
     doc_ref = db.collection("camera_info").document()
     
     # Create a dictionary from the CreateCamera model
@@ -320,20 +662,49 @@ async def create_camera(camera_info: CreateCamera):
     camera_data["id"] = doc_ref.id
     if "status" not in camera_data or camera_data["status"] is None:
         camera_data["status"] = "Pending"
+    camera_data["updated_at"] = datetime.utcnow()
+    with_categories(camera_data)
+    with_coordinates(camera_data)
     
-    # Set the data in Firestore
-    doc_ref.set(camera_data)
+    # Set the data in Firestore, counting the camera in the same batch
+    batch = db.batch()
+    batch.set(doc_ref, camera_data)
+    StatsDelta().camera(None, camera_data).add_to(db, batch)
+    await commit_batch(batch)
+    camera_index.upsert(doc_ref.id, camera_data)
     
     # Create and return a CameraInfo object
     return CameraInfo(**camera_data)
 
 
+# List the whole camera fleet from the index. Supports the same Accept
+# formats as /nearby_cameras; NDJSON streams without materializing the list.
+@app.get("/cameras", response_model=List[CameraInfo])
+async def list_cameras(request: Request):
+    media_type = negotiate(request.headers.get("accept"))
+    rows = (
+        camera_row(camera_data)
+        for camera_data in camera_index.records()
+        if parse_coordinates(camera_data) is not None
+    )
+    if media_type != JSON:
+        return encode_rows(rows, CAMERA_FIELDS, media_type)
+    return list(rows)
+
+
 # Read (Get camera details by ID)
 @app.get("/cameras/{camera_id}", response_model=CameraInfo)
 async def read_camera(camera_id: str):
-    db = firestore.client()
+    # Served from the index while it is fresh; cameras it has not seen yet
+    # (e.g. just written through another worker) fall through to Firestore
+    if camera_sync.is_fresh():
+        camera_data = camera_index.get(camera_id)
+        if camera_data is not None:
+            return CameraInfo(**camera_data)
+
+    db = get_db()
     doc_ref = db.collection("camera_info").document(camera_id)
-    doc = doc_ref.get()
+    doc = await get_doc(doc_ref)
     if doc.exists:
         camera_data = doc.to_dict()
         camera_data["id"] = camera_id 
@@ -342,42 +713,195 @@ async def read_camera(camera_id: str):
         raise HTTPException(status_code=404, detail="Camera not found")
 
 
+def camera_changes(current_data: dict, camera_update: CameraUpdate) -> dict:
+    """Fields of camera_update to write, with the derived categories and updated_at refreshed."""
+    changes = {"updated_at": datetime.utcnow()}
+    # CameraPatch carries the target id, which is the document key rather than a field
+    for key, value in camera_update.dict(exclude_none=True, exclude={"id"}).items():
+        # Skip Swagger's "string" placeholder unless it is the stored value
+        if value != "string" or current_data.get(key) == "string":
+            changes[key] = value
+    categories = with_categories({**current_data, **changes})
+    changes["status_class"] = categories["status_class"]
+    changes["ownership_class"] = categories["ownership_class"]
+    if "latitude" in changes or "longitude" in changes:
+        # Rewrite both coordinates and the fields derived from them
+        coordinates = with_coordinates({**current_data, **changes})
+        for key in ("latitude", "longitude", "location_point", "geohash"):
+            if key in coordinates:
+                changes[key] = coordinates[key]
+    return changes
+
 @app.put("/cameras/{camera_id}", response_model=CameraInfo)
 async def update_camera(camera_id: str, camera_update: CameraUpdate):
-    db = firestore.client()
+    db = get_db()
     doc_ref = db.collection("camera_info").document(camera_id)
-    doc = doc_ref.get()
-    if doc.exists:
-        current_data = doc.to_dict()
-        update_data = camera_update.dict(exclude_none=True)
-        
-        # Update fields that are present in update_data
-        for key, value in update_data.items():
-            if value != "string" or current_data.get(key) == "string":
-                current_data[key] = value
-        
-        # Ensure the 'id' field is set correctly
-        current_data['id'] = camera_id
-        
-        # Update the document in Firestore
-        doc_ref.set(current_data)
-        
-        # Return the updated CameraInfo
-        return CameraInfo(**current_data)
-    else:
-        raise HTTPException(status_code=404, detail="Camera not found")
+
+    def write_changes(doc, batch, option):
+        if not doc.exists:
+            raise HTTPException(status_code=404, detail="Camera not found")
+        old_data = doc.to_dict()
+        changes = camera_changes(old_data, camera_update)
+        # Write only the changed fields to Firestore
+        batch.update(doc_ref, changes, option=option)
+        current_data = {**old_data, **changes}
+        StatsDelta().camera(old_data, current_data).add_to(db, batch)
+        return current_data
+
+    current_data = await commit_unchanged(db, doc_ref, write_changes)
+
+    # Ensure the 'id' field is set correctly
+    current_data['id'] = camera_id
+    camera_index.upsert(camera_id, current_data)
+
+    # Return the updated CameraInfo
+    return CameraInfo(**current_data)
 
 # Delete (Remove a camera)
 @app.delete("/cameras/{camera_id}")
 async def delete_camera(camera_id: str):
-    db = firestore.client()
+    db = get_db()
     doc_ref = db.collection("camera_info").document(camera_id)
-    doc = doc_ref.get()
-    if doc.exists:
-        doc_ref.delete()
-        return {"message": "Camera deleted successfully"}
-    else:
-        raise HTTPException(status_code=404, detail="Camera not found")
+
+    def write_delete(doc, batch, option):
+        if not doc.exists:
+            raise HTTPException(status_code=404, detail="Camera not found")
+        batch.delete(doc_ref, option=option)
+        StatsDelta().camera(doc.to_dict(), None).add_to(db, batch)
+
+    await commit_unchanged(db, doc_ref, write_delete)
+    camera_index.remove(camera_id)
+    return {"message": "Camera deleted successfully"}
+
+
+# Bulk endpoints. Each item gets its own result so one missing or invalid
+# camera does not fail the whole request.
+@app.post("/cameras:batchGet", response_model=CameraBatchResult)
+async def batch_get_cameras(request: CameraBatchIds):
+    check_batch_size(request.ids)
+    db = get_db()
+    docs = await get_camera_docs(db, request.ids)
+
+    results = []
+    for camera_id in request.ids:
+        doc = docs.get(camera_id)
+        if doc is None or not doc.exists:
+            results.append(CameraBatchItem(id=camera_id, ok=False, error="Camera not found"))
+            continue
+        try:
+            results.append(CameraBatchItem(id=camera_id, ok=True, camera=CameraInfo(**{**doc.to_dict(), "id": camera_id})))
+        except ValidationError as e:
+            results.append(CameraBatchItem(id=camera_id, ok=False, error=f"Invalid camera data: {e}"))
+    return CameraBatchResult(results=results)
+
+@app.post("/cameras:batchUpdate", response_model=CameraBatchResult)
+async def batch_update_cameras(request: CameraBatchUpdate):
+    check_batch_size(request.updates)
+    db = get_db()
+    docs = await get_camera_docs(db, [update.id for update in request.updates])
+
+    # One write per camera: a camera listed twice gets its last update, and
+    # its counters change once
+    updates = {update.id: update for update in request.updates}
+
+    results = {}
+    writes = []
+    for update in updates.values():
+        doc = docs.get(update.id)
+        if doc is None or not doc.exists:
+            results[update.id] = CameraBatchItem(id=update.id, ok=False, error="Camera not found")
+            continue
+        old_data = doc.to_dict()
+        changes = camera_changes(old_data, update)
+        current_data = {**old_data, **changes, "id": update.id}
+        writes.append(((update.id, changes, current_data), StatsDelta().camera(old_data, current_data)))
+
+    for chunk, delta in fit_batches(writes, BATCH_LIMIT):
+        batch = db.batch()
+        for camera_id, changes, _ in chunk:
+            batch.update(db.collection("camera_info").document(camera_id), changes)
+        delta.add_to(db, batch)
+        try:
+            await commit_batch(batch)
+        except Exception as e:
+            for camera_id, _, _ in chunk:
+                results[camera_id] = CameraBatchItem(id=camera_id, ok=False, error=f"Update failed: {e}")
+            continue
+        for camera_id, _, current_data in chunk:
+            camera_index.upsert(camera_id, current_data)
+            results[camera_id] = CameraBatchItem(id=camera_id, ok=True, camera=CameraInfo(**current_data))
+
+    return CameraBatchResult(results=[results[update.id] for update in request.updates])
+
+@app.post("/cameras:batchDelete", response_model=CameraBatchResult)
+async def batch_delete_cameras(request: CameraBatchIds):
+    check_batch_size(request.ids)
+    db = get_db()
+    docs = await get_camera_docs(db, request.ids)
+
+    results = {}
+    existing = []
+    # Each camera is deleted, and uncounted, once however often it is listed
+    for camera_id in dict.fromkeys(request.ids):
+        doc = docs.get(camera_id)
+        if doc is None or not doc.exists:
+            results[camera_id] = CameraBatchItem(id=camera_id, ok=False, error="Camera not found")
+        else:
+            existing.append((camera_id, StatsDelta().camera(doc.to_dict(), None)))
+
+    for chunk, delta in fit_batches(existing, BATCH_LIMIT):
+        batch = db.batch()
+        for camera_id in chunk:
+            batch.delete(db.collection("camera_info").document(camera_id))
+        delta.add_to(db, batch)
+        try:
+            await commit_batch(batch)
+        except Exception as e:
+            for camera_id in chunk:
+                results[camera_id] = CameraBatchItem(id=camera_id, ok=False, error=f"Delete failed: {e}")
+            continue
+        for camera_id in chunk:
+            camera_index.remove(camera_id)
+            results[camera_id] = CameraBatchItem(id=camera_id, ok=True)
+
+    return CameraBatchResult(results=[results[camera_id] for camera_id in request.ids])
+
+def check_batch_size(items: list) -> None:
+    if not items:
+        raise HTTPException(status_code=400, detail="At least one camera is required")
+    if len(items) > MAX_BATCH_CAMERAS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_CAMERAS} cameras per request")
+
+# Read-modify-write attempts on one document before reporting a conflict
+MAX_WRITE_ATTEMPTS = 5
+
+async def commit_unchanged(db, doc_ref, build):
+    """Read doc_ref, fill a batch with build(snapshot, batch, option) and commit it
+    only if the document has not changed since the read, reading again otherwise.
+
+    build passes ``option`` to its write of doc_ref, so counter updates computed
+    from the old document commit only together with the change they describe,
+    and concurrent requests cannot apply the same transition twice. Returns
+    what build returns.
+    """
+    for _ in range(MAX_WRITE_ATTEMPTS):
+        doc = await get_doc(doc_ref)
+        batch = db.batch()
+        option = db.write_option(last_update_time=doc.update_time) if doc.exists else None
+        result = build(doc, batch, option)
+        if not len(batch):
+            return result
+        try:
+            await commit_batch(batch)
+            return result
+        except FailedPrecondition:
+            continue  # Changed by another request in between
+    raise HTTPException(status_code=409, detail="The record is being changed by other requests, retry shortly")
+
+async def get_camera_docs(db, camera_ids: List[str]) -> dict:
+    """Fetch many camera documents in one get_all round trip, keyed by ID."""
+    refs = [db.collection("camera_info").document(camera_id) for camera_id in dict.fromkeys(camera_ids)]
+    return {doc.id: doc for doc in await get_all(db, refs)}
 
 
 def validate_coordinates(lat: float, lon: float) -> None:
@@ -386,105 +910,511 @@ def validate_coordinates(lat: float, lon: float) -> None:
     if not (-180 <= lon <= 180):
         raise ValueError(f"Longitude must be in the [-180; 180] range. Got {lon}")
 
+def filter_code(category: Optional[int]) -> int:
+    """A parsed status/ownership filter as an int, -1 when there is none."""
+    return -1 if category is None else int(category)
+
+class CandidateSet:
+    """Candidate cameras from the index, with their result rows built in bulk."""
+
+    def __init__(self, candidates: Candidates):
+        self.candidates = candidates
+        self.lats, self.lons = candidates.lats, candidates.lons
+        self.status_classes = candidates.status_class
+        self.ownership_classes = candidates.ownership_class
+        self.not_working = ~candidates.working
+
+    def __len__(self) -> int:
+        return len(self.candidates)
+
+    def matches(self, positions: np.ndarray, mask: np.ndarray, status_codes, ownership_codes) -> np.ndarray:
+        """``mask`` narrowed to the candidates passing the filters (codes from filter_code)."""
+        mask = mask & ((status_codes < 0) | (self.status_classes[positions] == status_codes))
+        return mask & ((ownership_codes < 0) | (self.ownership_classes[positions] == ownership_codes))
+
+    def rows(self, positions: np.ndarray, distances: np.ndarray) -> List[Optional[dict]]:
+        """Result rows of the candidates at ``positions``, None for cameras removed since the lookup.
+
+        Each camera is read from the index once, column-wise, however many
+        times it appears.
+        """
+        unique, inverse = np.unique(positions, return_inverse=True)
+        found, values = self.candidates.values(unique, CAMERA_FIELDS, CAMERA_DEFAULTS)
+        bases: List[Optional[dict]] = [None] * len(unique)
+        camera_ids = self.candidates.camera_ids(found)
+        for k, base in zip(np.searchsorted(unique, found).tolist(), camera_rows(values, camera_id=camera_ids)):
+            bases[k] = base
+        return [None if base is None else {**base, "distance": distance}
+                for base, distance in zip([bases[k] for k in inverse.tolist()], distances.tolist())]
+
+    def rank(self, distances: np.ndarray, radius_km: float, status_filter: Optional[str] = None,
+             ownership_filter: Optional[str] = None) -> List[dict]:
+        """Rows within radius_km that pass the filters, by distance then working first."""
+        with metrics.stage("rank"):
+            mask = self.matches(slice(None), distances <= radius_km,
+                                filter_code(parse_status_filter(status_filter)),
+                                filter_code(parse_ownership_filter(ownership_filter)))
+            # Order by distance, then working cameras first
+            selected = np.flatnonzero(mask)
+            order = selected[np.lexsort((self.not_working[selected], distances[selected]))]
+
+        with metrics.stage("rows"):
+            return [row for row in self.rows(order, distances[order]) if row is not None]
+
+def load_area_index(db, min_lat: float, max_lat: float, min_lon: float, max_lon: float) -> CameraIndex:
+    """Index of the cameras in the box, read from Firestore by geohash range queries.
+
+    Used while the process index is unavailable or stale. Cameras whose
+    coordinates have not been migrated (no geohash) are not found.
+    """
+    documents = {}
+    for prefix in geohash_prefixes(min_lat, max_lat, min_lon, max_lon):
+        query = (db.collection("camera_info")
+                 .where("geohash", ">=", prefix)
+                 .where("geohash", "<", prefix + "~"))
+        with metrics.stage("firestore"):
+            docs = list(query.stream())
+        metrics.count_reads(max(1, len(docs)))
+        for doc in docs:
+            documents[doc.id] = doc.to_dict()
+    area_index = CameraIndex()
+    area_index.replace_all(documents.items())
+    return area_index
+
+def find_nearby_cameras(user_lat: float, user_lon: float, radius_km: float, status_filter: Optional[str] = None,
+                        ownership_filter: Optional[str] = None, distance_method: str = "geodesic",
+                        index: CameraIndex = camera_index) -> List[dict]:
+    """Cameras within radius_km of the point, ordered by distance then working first.
+
+    Rows are plain dicts with the NearbyCameraInfo fields.
+    """
+    with metrics.stage("index"):
+        candidates = CandidateSet(index.query_bbox(*bbox_around(user_lat, user_lon, radius_km)))
+    if not len(candidates):
+        metrics.record_candidates(0, 0)
+        return []
+
+    with metrics.stage("distance"):
+        distances = distance_km(user_lat, user_lon, candidates.lats, candidates.lons, method=distance_method)
+    cameras = candidates.rank(distances, radius_km, status_filter, ownership_filter)
+    metrics.record_candidates(len(candidates), len(cameras))
+    return cameras
+
+# (query, candidate) pairs whose distances are computed at once in batch lookups
+BATCH_CHUNK_PAIRS = 2_000_000
+MAX_BATCH_QUERIES = 500
+
+def find_nearby_cameras_batch(queries: List[Tuple[tuple, "UserLocation"]]) -> List[List[dict]]:
+    """Nearby cameras for many (snapped center, query) pairs from one candidate set.
+
+    Candidates of all queries are merged and deduplicated. Distances are
+    computed for every query and candidate in its box in one vectorized
+    pass, haversine first; queries asking for geodesic distances get exact
+    distances for the pairs within HAVERSINE_GEODESIC_MARGIN of their radius.
+    The pairs of all queries are then filtered and ordered together and
+    their rows built in one go. Pairs are processed in chunks of whole
+    queries to bound memory.
+    """
+    with metrics.stage("index"):
+        candidates, members = camera_index.query_bboxes(
+            [bbox_around(lat, lon, query.radius_meters / 1000) for (lat, lon), query in queries])
+        candidates = CandidateSet(candidates)
+    if not len(candidates):
+        metrics.record_candidates(0, 0)
+        return [[] for _ in queries]
+
+    centers = np.array([center for center, _ in queries], dtype=np.float64).reshape(-1, 2)
+    radii = np.array([query.radius_meters / 1000 for _, query in queries], dtype=np.float64)
+    exact = np.array([query.distance_method == "geodesic" for _, query in queries])
+    status_codes = np.array([filter_code(parse_status_filter(query.status_filter)) for _, query in queries])
+    ownership_codes = np.array([filter_code(parse_ownership_filter(query.ownership_filter)) for _, query in queries])
+    sizes = np.array([len(box) for box in members], dtype=np.int64)
+
+    pair_queries, pair_cameras, pair_distances = [], [], []
+    start = 0
+    while start < len(queries):
+        # Whole queries, at least one, up to BATCH_CHUNK_PAIRS pairs
+        stop = start + max(1, int(np.searchsorted(np.cumsum(sizes[start:]), BATCH_CHUNK_PAIRS, side="right")))
+        queries_of = np.repeat(np.arange(start, stop), sizes[start:stop])
+        cameras = np.concatenate(members[start:stop])
+        with metrics.stage("distance"):
+            lats, lons = candidates.lats[cameras], candidates.lons[cameras]
+            distances = haversine_km(centers[queries_of, 0], centers[queries_of, 1], lats, lons)
+            geodesic = exact[queries_of]
+            refine = geodesic & (distances <= radii[queries_of] * HAVERSINE_GEODESIC_MARGIN)
+            distances[geodesic & ~refine] = np.inf
+            if refine.any():
+                distances[refine] = geodesic_km(centers[queries_of[refine], 0], centers[queries_of[refine], 1],
+                                                lats[refine], lons[refine])
+        with metrics.stage("rank"):
+            keep = candidates.matches(cameras, distances <= radii[queries_of],
+                                      status_codes[queries_of], ownership_codes[queries_of])
+        pair_queries.append(queries_of[keep])
+        pair_cameras.append(cameras[keep])
+        pair_distances.append(distances[keep])
+        start = stop
+
+    with metrics.stage("rank"):
+        queries_of, cameras, distances = (np.concatenate(parts) for parts in (pair_queries, pair_cameras, pair_distances))
+        # By query, then distance, then working cameras first
+        order = np.lexsort((candidates.not_working[cameras], distances, queries_of))
+        queries_of, cameras, distances = queries_of[order], cameras[order], distances[order]
+        bounds = np.searchsorted(queries_of, np.arange(len(queries) + 1)).tolist()
+    with metrics.stage("rows"):
+        rows = candidates.rows(cameras, distances)
+        results = [[row for row in rows[bounds[i]:bounds[i + 1]] if row is not None] for i in range(len(queries))]
+    # Candidates are shared by all queries; count each camera returned once
+    metrics.record_candidates(len(candidates), len({row["camera_id"] for rows in results for row in rows}))
+    return results
+
+MAX_ROUTE_POINTS = 10000
+
+def find_route_cameras(route: RouteQuery) -> List[dict]:
+    """Cameras within the corridor around the route, ordered along the route."""
+    buffer_km = route.buffer_meters / 1000
+    lats = np.array([point.latitude for point in route.points], dtype=np.float64)
+    lons = np.array([point.longitude for point in route.points], dtype=np.float64)
+    if len(lats) == 1:
+        lats, lons = np.repeat(lats, 2), np.repeat(lons, 2)  # A single point is a zero-length segment
+
+    # Candidate (camera, segment) pairs from each segment's buffered bounding box
+    lat_diff = buffer_km / MIN_KM_PER_DEGREE
+    lon_diff = buffer_km / (MIN_KM_PER_DEGREE * max(math.cos(math.radians(np.abs(lats).max() + lat_diff)), 1e-6))
+    boxes = []
+    for segment in range(len(lats) - 1):
+        lat_lo, lat_hi = sorted((lats[segment], lats[segment + 1]))
+        lon_lo, lon_hi = sorted((lons[segment], lons[segment + 1]))
+        boxes.append((lat_lo - lat_diff, lat_hi + lat_diff, lon_lo - lon_diff, lon_hi + lon_diff))
+    with metrics.stage("index"):
+        candidates, members = camera_index.query_bboxes(boxes)
+    pair_cameras = np.concatenate(members)
+    pair_segments = np.repeat(np.arange(len(members)), [len(box) for box in members])
+
+    if not len(pair_cameras):
+        metrics.record_candidates(0, 0)
+        return []
+
+    # Point-to-segment distance for every pair in one vectorized pass
+    with metrics.stage("distance"):
+        distances, t, segment_lengths = point_segment_distances(
+            candidates.lats[pair_cameras], candidates.lons[pair_cameras],
+            lats[pair_segments], lons[pair_segments], lats[pair_segments + 1], lons[pair_segments + 1])
+
+    with metrics.stage("rank"):
+        # Closest segment per camera
+        order = np.lexsort((distances, pair_cameras))
+        first = order[np.unique(pair_cameras[order], return_index=True)[1]]
+        keep = first[distances[first] <= buffer_km]
+
+        status_class = parse_status_filter(route.status_filter)
+        ownership_class = parse_ownership_filter(route.ownership_filter)
+        if status_class is not None:
+            keep = keep[candidates.status_class[pair_cameras[keep]] == status_class]
+        if ownership_class is not None:
+            keep = keep[candidates.ownership_class[pair_cameras[keep]] == ownership_class]
+    metrics.record_candidates(len(candidates), len(keep))
+    if len(keep) == 0:
+        return []
+
+    # Distance along the route to each segment start, plus the offset within it
+    _, _, all_lengths = point_segment_distances(lats[:-1], lons[:-1], lats[:-1], lons[:-1], lats[1:], lons[1:])
+    route_offsets = np.concatenate(([0.0], np.cumsum(all_lengths)[:-1]))
+    positions = route_offsets[pair_segments[keep]] + t[keep] * segment_lengths[keep]
+
+    # Naive timestamps are taken as UTC, so they can be mixed with aware ones
+    timestamps = [None if timestamp is None
+                  else timestamp.replace(tzinfo=timezone.utc) if timestamp.tzinfo is None
+                  else timestamp.astimezone(timezone.utc)
+                  for timestamp in (point.timestamp for point in route.points)]
+    timed = len(route.points) > 1 and all(timestamp is not None for timestamp in timestamps)
+
+    with metrics.stage("rows"):
+        cameras = []
+        for pair, position in sorted(zip(keep.tolist(), positions.tolist()), key=lambda item: (item[1], distances[item[0]])):
+            camera_data = candidates.record(pair_cameras[pair])
+            if camera_data is None:
+                continue  # Removed since the lookup
+            segment = pair_segments[pair]
+            extra = {"camera_id": camera_data["id"], "distance": float(distances[pair]), "route_position": position}
+            if timed:
+                start, end = timestamps[segment], timestamps[segment + 1]
+                extra["passed_at"] = start + (end - start) * float(t[pair])
+            cameras.append(camera_row(camera_data, **extra))
+    return cameras
+
+def require_fresh_index() -> None:
+    """503 while the index is not loaded yet or too stale to answer from.
+
+    For lookups spanning too large an area to fall back to Firestore the way
+    /nearby_cameras does.
+    """
+    if not camera_sync.is_fresh():
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="The camera index is not up to date, retry shortly", headers={"Retry-After": "5"})
+
+# Endpoint to fetch cameras along a travel route
+@app.post("/route_cameras", response_model=List[RouteCameraInfo])
+async def get_route_cameras(route: RouteQuery):
+    if not route.points:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="At least one route point is required")
+    if len(route.points) > MAX_ROUTE_POINTS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"At most {MAX_ROUTE_POINTS} route points per request")
+    try:
+        for point in route.points:
+            validate_coordinates(point.latitude, point.longitude)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    require_fresh_index()
+
+    try:
+        return find_route_cameras(route)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail=f"An error occurred while fetching route cameras: {str(e)}")
+
 # Endpoint to fetch nearby cameras
 @app.post("/nearby_cameras", response_model=List[NearbyCameraInfo])
-async def get_nearby_cameras(user_location: UserLocation):
+async def get_nearby_cameras(user_location: UserLocation, request: Request):
     radius_km = user_location.radius_meters / 1000
+    media_type = negotiate(request.headers.get("accept"))
 
     try:
-        db = firestore.client()
-        cameras_ref = db.collection("camera_info")
+        validate_coordinates(user_location.latitude, user_location.longitude)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
-        user_lat, user_lon = user_location.latitude, user_location.longitude
+    try:
+        if not camera_sync.is_fresh():
+            # The index is not loaded yet or is too stale: query Firestore for the area instead
+            area_index = await run_db(load_area_index, get_db(), *bbox_around(
+                user_location.latitude, user_location.longitude, radius_km))
+            nearby_cameras = find_nearby_cameras(user_location.latitude, user_location.longitude, radius_km,
+                                                 user_location.status_filter, user_location.ownership_filter,
+                                                 user_location.distance_method, index=area_index)
+        else:
+            cache_key = nearby_cache.key(user_location.latitude, user_location.longitude, user_location.status_filter,
+                                         user_location.ownership_filter, user_location.distance_method)
+            with metrics.stage("cache"):
+                nearby_cameras = nearby_cache.get(cache_key, radius_km)
+            if nearby_cameras is None:
+                # Results are computed for the snapped center so they can be shared
+                user_lat, user_lon = nearby_cache.snap(user_location.latitude, user_location.longitude)
+                generation = nearby_cache.generation
+                nearby_cameras = find_nearby_cameras(user_lat, user_lon, radius_km, user_location.status_filter,
+                                                     user_location.ownership_filter, user_location.distance_method)
+                nearby_cache.put(cache_key, radius_km, nearby_cameras, generation)
 
-        try:
-            validate_coordinates(user_lat, user_lon)
-        except ValueError as e:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        if media_type != JSON:
+            with metrics.stage("serialize"):
+                return encode_rows(nearby_cameras, NEARBY_CAMERA_FIELDS, media_type)
+        return nearby_cameras
 
-        lat_diff = radius_km / 111.1  # Approximate 1 degree latitude = 111.1 km
-        lon_diff = radius_km / (111.1 * math.cos(math.radians(user_lat)))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail=f"An error occurred while fetching nearby cameras: {str(e)}")
 
-        query = cameras_ref.where("latitude", ">=", str(user_lat - lat_diff)) \
-                           .where("latitude", "<=", str(user_lat + lat_diff)) \
-                           .where("longitude", ">=", str(user_lon - lon_diff)) \
-                           .where("longitude", "<=", str(user_lon + lon_diff))
+class CameraCluster(BaseModel):
+    cell: str = Field(..., description="Cell as zoom/x/y in slippy-map tile coordinates")
+    latitude: float = Field(..., description="Centroid of the cameras in the cell")
+    longitude: float
+    count: int
+    working: int
+    not_working: int
+    government: int
+    private: int
 
-        filtered_cameras = query.stream()
+# Endpoint serving camera clusters for one map tile
+@app.get("/camera_clusters/{zoom}/{x}/{y}", response_model=List[CameraCluster])
+async def get_camera_clusters(zoom: int, x: int, y: int, request: Request, response: Response):
+    if not (0 <= zoom <= MAX_CLUSTER_ZOOM):
+        raise HTTPException(status_code=400, detail=f"Zoom must be in the [0; {MAX_CLUSTER_ZOOM}] range")
+    if not (0 <= x < 1 << zoom and 0 <= y < 1 << zoom):
+        raise HTTPException(status_code=400, detail="Tile is outside the map")
 
-        nearby_cameras = []
-        for camera in filtered_cameras:
-            camera_data = camera.to_dict()
-            camera_data["id"] = camera.id
+    clusters = camera_clusters.tile(zoom, x, y)
+    etag = '"' + hashlib.sha1(json.dumps(clusters).encode()).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=30"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return clusters
 
-            try:
-                camera_lat = float(camera_data.get("latitude", ""))
-                camera_lon = float(camera_data.get("longitude", ""))
-                validate_coordinates(camera_lat, camera_lon)
-            except (ValueError, TypeError):
-                continue
-            
-            camera_location = (camera_lat, camera_lon)
-            user_location_tuple = (user_lat, user_lon)
-            distance = geodesic(camera_location, user_location_tuple).km
-            
-            if distance <= radius_km:
-                # Apply status filter
-                if user_location.status_filter:
-                    status = str(camera_data.get("status", "")).lower()
-                    if user_location.status_filter.lower() == "working":
-                        if not any(keyword in status for keyword in ["working", "yes", "-do-", "active"]) or "not working" in status:
-                            continue
-                    elif user_location.status_filter.lower() == "not working":
-                        if any(keyword in status for keyword in ["working", "yes", "-do-", "active"]) and "not working" not in status:
-                            continue
-
-                # Apply ownership filter (unchanged)
-                if user_location.ownership_filter:
-                    private_govt = str(camera_data.get("private_govt", "")).lower()
-                    if user_location.ownership_filter.lower() == "government":
-                        if not any(keyword in private_govt for keyword in ["govt.", "govt", "government"]):
-                            continue
-                    elif user_location.ownership_filter.lower() == "private":
-                        if any(keyword in private_govt for keyword in ["govt.", "govt", "government"]):
-                            continue
-
-                nearby_cameras.append(NearbyCameraInfo(**camera_data, distance=distance, camera_id=camera.id))
-                
-        nearby_cameras_sorted = sorted(nearby_cameras, key=lambda camera: (camera.distance, camera.status != "Working"))
-        return nearby_cameras_sorted
+# Endpoint to fetch nearby cameras for many points at once
+@app.post("/nearby_cameras:batch", response_model=NearbyBatchResult)
+async def get_nearby_cameras_batch(batch: NearbyBatchQuery):
+    if not batch.queries:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="At least one query is required")
+    if len(batch.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"At most {MAX_BATCH_QUERIES} queries per request")
+    try:
+        for query in batch.queries:
+            validate_coordinates(query.latitude, query.longitude)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    require_fresh_index()
+
+    try:
+        results = [None] * len(batch.queries)
+        misses = []
+        for position, query in enumerate(batch.queries):
+            cache_key = nearby_cache.key(query.latitude, query.longitude, query.status_filter,
+                                         query.ownership_filter, query.distance_method)
+            results[position] = nearby_cache.get(cache_key, query.radius_meters / 1000)
+            if results[position] is None:
+                misses.append((position, cache_key, query))
+
+        if misses:
+            generation = nearby_cache.generation
+            # CPU-bound on large batches; keep the event loop free meanwhile
+            computed = await run_db(find_nearby_cameras_batch,
+                                    [(nearby_cache.snap(query.latitude, query.longitude), query)
+                                     for _, _, query in misses])
+            for (position, cache_key, query), cameras in zip(misses, computed):
+                nearby_cache.put(cache_key, query.radius_meters / 1000, cameras, generation)
+                results[position] = cameras
+
+        union = None
+        if batch.include_union:
+            shared = {}
+            for position, cameras in enumerate(results):
+                for camera in cameras:
+                    entry = shared.get(camera["camera_id"])
+                    if entry is None:
+                        entry = shared[camera["camera_id"]] = {**camera, "query_indices": []}
+                    entry["query_indices"].append(position)
+                    entry["distance"] = min(entry["distance"], camera["distance"])
+            union = sorted(shared.values(), key=lambda camera: (-len(camera["query_indices"]), camera["distance"]))
+
+        # Rows are built by camera_row, already in the NearbyCameraInfo shape;
+        # validating them again would cost more than finding them
+        with metrics.stage("serialize"):
+            return Response(json.dumps({"results": results, "union": union}), media_type=JSON)
 
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                             detail=f"An error occurred while fetching nearby cameras: {str(e)}")
 
+@app.get("/nearby_cameras/cache")
+async def get_nearby_cache_stats():
+    return nearby_cache.stats()
 
 
+# Fleet dashboard counters, maintained on every camera and ticket write.
+# Costs one read per counter shard, however large the collections are.
+@app.get("/stats", response_model=FleetStats)
+async def get_stats():
+    db = get_db()
+    counts = stats.sum_counts(doc.to_dict() for doc in await get_all(db, stats.shard_refs(db)))
+    tickets = counts.get("tickets", {})
+    tickets["open"] = tickets.get("total", 0) - tickets.get("status", {}).get("Closed", 0)
+    return FleetStats(cameras=counts.get("cameras", {}), tickets=tickets)
+
+# Camera counters per area, for the geohash cells starting with prefix,
+# grouped to the requested precision
+@app.get("/stats/areas", response_model=List[AreaStats])
+async def get_area_stats(
+    prefix: str = Query("", description="Geohash prefix of the region"),
+    precision: int = Query(stats.AREA_PRECISION, ge=1, le=stats.AREA_PRECISION,
+                           description="Geohash length of the returned areas"),
+):
+    prefix = prefix.lower()
+    if any(char not in GEOHASH_ALPHABET for char in prefix) or len(prefix) > precision:
+        raise HTTPException(status_code=400, detail=f"Prefix must be a geohash of at most {precision} characters")
+    db = get_db()
+    query = db.collection(stats.AREA_STATS_COLLECTION)
+    if prefix:
+        query = query.where("area", ">=", prefix).where("area", "<", prefix + "~")
+
+    areas = {}
+    for doc in await stream_all(query):
+        areas.setdefault(doc.id[:precision], []).append(doc.to_dict())
+    results = []
+    for area, documents in sorted(areas.items()):
+        cameras = stats.sum_counts(documents).get("cameras", {})
+        if cameras.get("total"):
+            results.append(AreaStats(area=area, cameras=cameras))
+    return results
+
+# Live camera and ticket changes as Server-Sent Events. Reconnecting
+# EventSource clients send Last-Event-ID and receive what they missed.
+@app.get("/events")
+async def stream_events(
+    request: Request,
+    types: str = Query("camera,ticket", description="Comma separated event types: camera, ticket"),
+    latitude: Optional[float] = Query(None, ge=-90, le=90),
+    longitude: Optional[float] = Query(None, ge=-180, le=180),
+    radius_meters: int = Query(2000, gt=0, le=50000, description="Area around latitude/longitude"),
+    ticket_status: Optional[str] = Query(None, description="Comma separated ticket statuses"),
+    last_event_id: Optional[str] = Query(None, description="Resume after this event (or send Last-Event-ID)"),
+):
+    kinds = {kind.strip().lower() for kind in types.split(",") if kind.strip()}
+    if not kinds or kinds - {CAMERA, TICKET}:
+        raise HTTPException(status_code=400, detail="types must be camera, ticket or both")
+    if (latitude is None) != (longitude is None):
+        raise HTTPException(status_code=400, detail="latitude and longitude must be given together")
+
+    statuses = ({status.strip().lower() for status in ticket_status.split(",") if status.strip()}
+                if ticket_status else None)
+    if latitude is not None:
+        event_filter = EventFilter.around(kinds, latitude, longitude, radius_meters / 1000, ticket_statuses=statuses)
+    else:
+        event_filter = EventFilter(kinds, ticket_statuses=statuses)
+
+    subscription = broadcaster.subscribe(event_filter, last_event_id or request.headers.get("last-event-id"))
+    return StreamingResponse(broadcaster.stream(subscription), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 # Endpoint to report a camera issue
-@app.post("/report", response_model=Ticket)
+def submit(submission: Submission):
+    try:
+        write_queue.submit(submission)
+    except QueueFull as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail=f"Too many submissions, retry shortly ({e})", headers={"Retry-After": "1"})
+
+# The ticket is written in the background: the response carries its ID, and
+# /submissions/{id} tells when it has been written
+@app.post("/report", response_model=Ticket, status_code=status.HTTP_202_ACCEPTED)
 async def report_issue(ticket_input: TicketInput):
-    db = firestore.client()
+    db = get_db()
     doc_ref = db.collection("tickets").document()
     
     ticket_data = ticket_input.dict()
     ticket_data['id'] = doc_ref.id
     ticket_data['status'] = "Pending"
-    ticket_data['reported_at'] = datetime.utcnow()
+    ticket_data['reported_at'] = ticket_data['updated_at'] = datetime.utcnow()
     
-    doc_ref.set(ticket_data)
+    submit(Submission(doc_ref.id, ticket_data))
     
     return Ticket(**ticket_data)
 
 #endpoint for on ground personnelto create ticket
-@app.post("/OnGroundCreateCamera", response_model=CameraTicketCreate)
-async def create_camera_and_ticket(data: OnGroundCreateCamera):
-    db = firestore.client()
+@app.post("/OnGroundCreateCamera", response_model=CameraTicketCreate, status_code=status.HTTP_202_ACCEPTED)
+async def create_camera_and_ticket(
+    data: OnGroundCreateCamera,
+    allow_duplicate: bool = Query(False, description="Create the camera even if one is already recorded within a few meters"),
+):
+    db = get_db()
     
     # Create camera (excluding description)
+    now = datetime.utcnow()
     camera_data = data.dict(exclude={'description'})
     camera_ref = db.collection("camera_info").document()
     camera_data['id'] = camera_ref.id
-    camera_ref.set(camera_data)
+    camera_data['updated_at'] = now
+    with_categories(camera_data)
+    with_coordinates(camera_data)
+
+    if not allow_duplicate:
+        duplicate_id = write_queue.find_duplicate(camera_data['latitude'], camera_data['longitude'],
+                                                  DUPLICATE_CAMERA_METERS)
+        if duplicate_id is not None:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                                detail=f"Camera {duplicate_id} is already recorded within {DUPLICATE_CAMERA_METERS:g} m; "
+                                       f"report on it or pass allow_duplicate=true")
     
     # Create corresponding ticket
     ticket_data = {
@@ -494,79 +1424,185 @@ async def create_camera_and_ticket(data: OnGroundCreateCamera):
         'description': data.description,
         'status': "Pending",
         'reported_by': "On-ground Personnel",  # You might want to add this field to OnGroundCreateCamera
-        'reported_at': datetime.utcnow()
+        'reported_at': now,
+        'updated_at': now,
     }
-    db.collection("tickets").document(ticket_data['id']).set(ticket_data)
+
+    # Both are written, and counted, in the same batch
+    submit(Submission(ticket_data['id'], ticket_data, camera_ref.id, camera_data))
     
     return CameraTicketCreate(
         camera=CameraInfo(**camera_data),
         ticket=TicketInfo(**ticket_data)
     )
 
-@app.get("/tickets", response_model=List[Ticket])
-async def list_tickets():
-    db = firestore.client()
+@app.get("/submissions/{submission_id}", response_model=SubmissionStatus)
+async def get_submission(submission_id: str):
+    submission_status = await write_queue.status(submission_id)
+    if submission_status is None:
+        raise HTTPException(status_code=404, detail="Submission not found")
+    return submission_status
+
+TICKET_FIELDS = set(Ticket.__fields__) - {"id"}
+
+@app.get("/tickets", response_model=TicketPage)
+async def list_tickets(
+    limit: int = Query(50, gt=0, le=500, description="Maximum number of tickets per page"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    ticket_status: Optional[str] = Query(None, alias="status"),
+    camera_id: Optional[str] = None,
+    reported_from: Optional[datetime] = None,
+    reported_to: Optional[datetime] = None,
+    order_by: Literal["id", "reported_at"] = "id",
+    descending: bool = False,
+    fields: Optional[str] = Query(None, description="Comma separated ticket fields to return"),
+    embed_camera: bool = Query(False, description="Include the related camera record"),
+):
+    db = get_db()
+    query = db.collection("tickets")
+
+    if ticket_status:
+        query = query.where("status", "==", ticket_status)
+    if camera_id:
+        query = query.where("camera_id", "==", camera_id)
+    if reported_from:
+        query = query.where("reported_at", ">=", reported_from)
+    if reported_to:
+        query = query.where("reported_at", "<", reported_to)
+
+    # Firestore requires range filters to order on the filtered field first
+    direction = firestore.Query.DESCENDING if descending else firestore.Query.ASCENDING
+    if order_by == "reported_at" or reported_from or reported_to:
+        query = query.order_by("reported_at", direction=direction)
+    query = query.order_by("__name__", direction=direction)
+
+    if fields:
+        selected = {field.strip() for field in fields.split(",") if field.strip()}
+        unknown = selected - TICKET_FIELDS - {"id"}
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown ticket field(s): {', '.join(sorted(unknown))}")
+        returned = selected | {"id"} | ({"camera"} if embed_camera else set())
+        if embed_camera:
+            selected.add("camera_id")
+        query = query.select(sorted(selected - {"id"}))
+
+    if cursor:
+        cursor_doc = await get_doc(db.collection("tickets").document(cursor))
+        if not cursor_doc.exists:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.start_after(cursor_doc)
+
+    # Fetch one extra document to know whether there is a next page
+    docs = await stream_all(query.limit(limit + 1))
+    next_cursor = docs[limit - 1].id if len(docs) > limit else None
+
     tickets = []
-    for doc in db.collection("tickets").stream():
+    for doc in docs[:limit]:
         ticket_data = doc.to_dict()
         ticket_data['id'] = doc.id
         try:
             # Attempt to create a Ticket object
-            ticket = Ticket(**ticket_data)
+            ticket = TicketWithCamera(**ticket_data)
             tickets.append(ticket)
         except ValidationError:
             # If validation fails, skip this ticket
             print(f"Skipping invalid ticket with ID: {doc.id}")
             continue
-    
-    if not tickets:
-        raise HTTPException(status_code=404, detail="No valid tickets found")
-    
-    return tickets
+
+    if embed_camera:
+        await embed_ticket_cameras(db, tickets)
+
+    page = TicketPage(tickets=tickets, next_cursor=next_cursor)
+    if fields:
+        # Only the requested fields; the others were not read and would come
+        # back as their defaults
+        return Response(page.model_dump_json(include={"tickets": {"__all__": returned}, "next_cursor": True}),
+                        media_type=JSON)
+    return page
+
+async def embed_ticket_cameras(db, tickets: List[TicketWithCamera]) -> None:
+    """Attach camera records to tickets, from the index where possible."""
+    cameras = {}
+    missing = set()
+    for ticket in tickets:
+        if ticket.camera_id and ticket.camera_id not in cameras:
+            camera_data = camera_index.get(ticket.camera_id)
+            if camera_data is None:
+                missing.add(ticket.camera_id)
+            else:
+                cameras[ticket.camera_id] = camera_data
+
+    # Cameras written through another worker may not be indexed yet
+    if missing:
+        refs = [db.collection("camera_info").document(camera_id) for camera_id in missing]
+        for doc in await get_all(db, refs):
+            if doc.exists:
+                cameras[doc.id] = {**doc.to_dict(), "id": doc.id}
+
+    for ticket in tickets:
+        camera_data = cameras.get(ticket.camera_id)
+        if camera_data is not None:
+            try:
+                ticket.camera = CameraInfo(**camera_data)
+            except ValidationError:
+                continue
 
 @app.put("/tickets/{ticket_id}", response_model=Ticket)
 async def update_ticket(ticket_id: str, status: str):
-    db = firestore.client()
+    db = get_db()
     ticket_ref = db.collection("tickets").document(ticket_id)
-    ticket_doc = ticket_ref.get()
-    
-    if not ticket_doc.exists:
-        raise HTTPException(status_code=404, detail="Ticket not found")
-    
-    ticket_data = ticket_doc.to_dict()
-    ticket_data['status'] = status
-    ticket_ref.update({'status': status})
+
+    def write_status(ticket_doc, batch, option):
+        if not ticket_doc.exists:
+            raise HTTPException(status_code=404, detail="Ticket not found")
+        old_ticket = ticket_doc.to_dict()
+        changes = {'status': status, 'updated_at': datetime.utcnow()}
+        batch.update(ticket_ref, changes, option=option)
+        ticket_data = {**old_ticket, **changes}
+        StatsDelta().ticket(old_ticket, ticket_data).add_to(db, batch)
+        return ticket_data
+
+    ticket_data = await commit_unchanged(db, ticket_ref, write_status)
+    publish_ticket_change(ticket_id, ticket_data)
     
     # If the ticket is for a camera, update the camera status
     if ticket_data.get('camera_id'):
         camera_ref = db.collection("camera_info").document(ticket_data['camera_id'])
-        camera_doc = camera_ref.get()
-        
-        if camera_doc.exists:
-            if status == "Rejected":
-                camera_ref.delete()
+
+        def write_rejection(camera_doc, batch, option):
+            if camera_doc.exists and status == "Rejected":
+                batch.delete(camera_ref, option=option)
+                StatsDelta().camera(camera_doc.to_dict(), None).add_to(db, batch)
+                return True
             # else:
             #     camera_ref.update({'status': status})
+            return False
+
+        if await commit_unchanged(db, camera_ref, write_rejection):
+            camera_index.remove(ticket_data['camera_id'])
     
     return Ticket(**ticket_data)
 
 @app.put("/tickets/{ticket_id}/close", response_model=Ticket)
 async def close_ticket(ticket_id: str):
-    db = firestore.client()
+    db = get_db()
     ticket_ref = db.collection("tickets").document(ticket_id)
-    ticket_doc = ticket_ref.get()
-    
-    if not ticket_doc.exists:
-        raise HTTPException(status_code=404, detail="Ticket not found")
-    
-    ticket_data = ticket_doc.to_dict()
-    current_status = ticket_data.get('status')
-    
-    if current_status not in ["Rejected", "Approved"]:
-        raise HTTPException(status_code=400, detail="Pending tickets cannot be closed until a decision is made")
-    
-    ticket_data['status'] = "Closed"
-    ticket_ref.update({'status': "Closed"})
+
+    def write_close(ticket_doc, batch, option):
+        if not ticket_doc.exists:
+            raise HTTPException(status_code=404, detail="Ticket not found")
+        old_ticket = ticket_doc.to_dict()
+        current_status = old_ticket.get('status')
+        if current_status not in ["Rejected", "Approved"]:
+            raise HTTPException(status_code=400, detail="Pending tickets cannot be closed until a decision is made")
+        changes = {'status': "Closed", 'updated_at': datetime.utcnow()}
+        batch.update(ticket_ref, changes, option=option)
+        ticket_data = {**old_ticket, **changes}
+        StatsDelta().ticket(old_ticket, ticket_data).add_to(db, batch)
+        return ticket_data
+
+    ticket_data = await commit_unchanged(db, ticket_ref, write_close)
+    publish_ticket_change(ticket_id, ticket_data)
     
     return Ticket(**ticket_data)
 
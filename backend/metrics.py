@@ -0,0 +1,418 @@
+import bisect
+import heapq
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+
+# Histogram buckets in seconds, from a cache hit to a slow full scan
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Share of the spatial candidates that end up in the response
+SELECTIVITY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0)
+
+# Labels for work done outside any request (index loads, listener updates)
+BACKGROUND = ("", "background")
+
+# Registry attributes, with the buckets of the histogram ones
+COUNTERS = ("requests", "reads", "writes", "candidates", "returned")
+HISTOGRAMS = {"durations": LATENCY_BUCKETS, "stages": LATENCY_BUCKETS, "selectivity": SELECTIVITY_BUCKETS}
+
+
+class RequestMetrics:
+    """Stage timings and Firestore usage of one request.
+
+    Stages are summed by name, so a stage entered several times (one ranking
+    per query in a batch) reports its total.
+    """
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.method = scope.get("method", "")
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.reads = 0
+        self.writes = 0
+        self.candidates = 0
+        self.returned = 0
+        self.stacks: Optional[Counter] = None  # Folded stack samples, when profiled
+
+    @property
+    def endpoint(self) -> str:
+        # The router stores the matched route in the scope, so the label is
+        # the path template rather than one series per camera ID
+        route = self.scope.get("route")
+        return getattr(route, "path", None) or "unmatched"
+
+    @property
+    def label(self) -> Tuple[str, str]:
+        return self.method, self.endpoint
+
+    def server_timing(self, total: float) -> str:
+        entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.stages.items()]
+        entries.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(entries)
+
+
+_current: ContextVar[Optional[RequestMetrics]] = ContextVar("request_metrics", default=None)
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        position = bisect.bisect_left(self.buckets, value)
+        if position < len(self.counts):
+            self.counts[position] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name: str, labels: str) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+def _labels(**labels) -> str:
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for value in labels.values())
+    return ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped))
+
+
+class Registry:
+    """Process-wide counters and histograms, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Keyed by (method, endpoint) labels, plus the stage or status code
+        self.requests: Counter = Counter()
+        self.durations: Dict[Tuple[str, str], Histogram] = {}
+        self.stages: Dict[Tuple[str, str, str], Histogram] = {}
+        self.reads: Counter = Counter()
+        self.writes: Counter = Counter()
+        self.candidates: Counter = Counter()
+        self.returned: Counter = Counter()
+        self.selectivity: Dict[Tuple[str, str], Histogram] = {}
+
+    @staticmethod
+    def _histogram(histograms: dict, key, buckets: Tuple[float, ...]) -> Histogram:
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = Histogram(buckets)
+        return histogram
+
+    def observe_request(self, request: RequestMetrics, status_code: int, seconds: float) -> None:
+        with self._lock:
+            self.requests[request.label + (str(status_code),)] += 1
+            self._histogram(self.durations, request.label, LATENCY_BUCKETS).observe(seconds)
+
+    def observe_stage(self, label: Tuple[str, str], stage: str, seconds: float) -> None:
+        with self._lock:
+            self._histogram(self.stages, label + (stage,), LATENCY_BUCKETS).observe(seconds)
+
+    def count_reads(self, label: Tuple[str, str], documents: int) -> None:
+        with self._lock:
+            self.reads[label] += documents
+
+    def count_writes(self, label: Tuple[str, str], documents: int) -> None:
+        with self._lock:
+            self.writes[label] += documents
+
+    def observe_candidates(self, label: Tuple[str, str], candidates: int, returned: int) -> None:
+        with self._lock:
+            self.candidates[label] += candidates
+            self.returned[label] += returned
+            if candidates:
+                self._histogram(self.selectivity, label, SELECTIVITY_BUCKETS).observe(returned / candidates)
+
+    def state(self) -> dict:
+        """Every counter and histogram, as JSON-serializable lists."""
+        with self._lock:
+            return {
+                "counters": {name: [[list(key), value] for key, value in getattr(self, name).items()]
+                             for name in COUNTERS},
+                "histograms": {name: [[list(key), histogram.counts, histogram.sum, histogram.count]
+                                      for key, histogram in getattr(self, name).items()]
+                               for name in HISTOGRAMS},
+            }
+
+    def merge(self, state: dict) -> None:
+        """Add another registry's ``state()`` to this one."""
+        with self._lock:
+            for name, values in state["counters"].items():
+                counter = getattr(self, name)
+                for key, value in values:
+                    counter[tuple(key)] += value
+            for name, values in state["histograms"].items():
+                for key, counts, total, count in values:
+                    histogram = self._histogram(getattr(self, name), tuple(key), HISTOGRAMS[name])
+                    histogram.counts = [a + b for a, b in zip(histogram.counts, counts)]
+                    histogram.sum += total
+                    histogram.count += count
+
+    def render(self) -> str:
+        lines = []
+
+        def family(name: str, kind: str, help_text: str):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def counters(name: str, help_text: str, values: Counter):
+            family(name, "counter", help_text)
+            for (method, endpoint), count in sorted(values.items()):
+                lines.append(f"{name}{{{_labels(method=method, endpoint=endpoint)}}} {count}")
+
+        def histograms(name: str, help_text: str, values: dict):
+            family(name, "histogram", help_text)
+            for (method, endpoint, *stage), histogram in sorted(values.items()):
+                labels = dict(method=method, endpoint=endpoint)
+                if stage:
+                    labels["stage"] = stage[0]
+                lines.extend(histogram.samples(name, _labels(**labels)))
+
+        with self._lock:
+            family("cctv_http_requests_total", "counter", "Requests by endpoint and status code.")
+            for (method, endpoint, status_code), count in sorted(self.requests.items()):
+                labels = _labels(method=method, endpoint=endpoint, status=status_code)
+                lines.append(f"cctv_http_requests_total{{{labels}}} {count}")
+            histograms("cctv_http_request_duration_seconds", "Time to handle the request, including sending the response.", self.durations)
+            histograms("cctv_stage_duration_seconds", "Time spent per request stage.", self.stages)
+            counters("cctv_firestore_reads_total", "Firestore documents read, as billed.", self.reads)
+            counters("cctv_firestore_writes_total", "Firestore documents written.", self.writes)
+            counters("cctv_spatial_candidates_total", "Cameras returned by the bounding box lookup.", self.candidates)
+            counters("cctv_spatial_returned_total", "Candidates that passed the distance and filters.", self.returned)
+            histograms("cctv_spatial_selectivity", "Returned / candidate cameras per lookup.", self.selectivity)
+
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+class SharedMetrics:
+    """Metrics summed over every worker of a multi-process deployment.
+
+    Each worker's registry is its own, and requests to ``/metrics`` land on
+    any one worker. As in prometheus_client's multiprocess mode, every worker
+    saves its registry to ``directory`` (one file per process, replaced
+    atomically) and ``render`` sums all the files. Files of workers that
+    have exited are still counted, so counters never go backwards; empty the
+    directory when the deployment (re)starts.
+    """
+
+    def __init__(self, directory: str, local: Registry):
+        self.directory = directory
+        self.local = local
+        self.path = os.path.join(directory, f"worker-{os.getpid()}.json")
+        os.makedirs(directory, exist_ok=True)
+
+    def save(self) -> None:
+        with open(self.path + ".tmp", "w") as f:
+            json.dump(self.local.state(), f)
+        os.replace(self.path + ".tmp", self.path)
+
+    def render(self) -> str:
+        self.save()
+        combined = Registry()
+        for name in sorted(os.listdir(self.directory)):
+            if not (name.startswith("worker-") and name.endswith(".json")):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    combined.merge(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable metrics file {name}: {e}")
+        return combined.render()
+
+
+def _label(request: Optional[RequestMetrics]) -> Tuple[str, str]:
+    return request.label if request is not None else BACKGROUND
+
+
+@contextmanager
+def stage(name: str):
+    """Time the enclosed block as a stage of the current request."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        request = _current.get()
+        if request is not None:
+            request.stages[name] = request.stages.get(name, 0.0) + seconds
+        registry.observe_stage(_label(request), name, seconds)
+
+
+def count_reads(documents: int) -> None:
+    request = _current.get()
+    if request is not None:
+        request.reads += documents
+    registry.count_reads(_label(request), documents)
+
+
+def count_writes(documents: int) -> None:
+    request = _current.get()
+    if request is not None:
+        request.writes += documents
+    registry.count_writes(_label(request), documents)
+
+
+def record_candidates(candidates: int, returned: int) -> None:
+    """Record how many index candidates a spatial lookup examined and kept."""
+    request = _current.get()
+    if request is not None:
+        request.candidates += candidates
+        request.returned += returned
+    registry.observe_candidates(_label(request), candidates, returned)
+
+
+def _fold(frame) -> str:
+    """A frame's stack as 'outer;...;inner', the format flame graph tools read."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SlowRequestProfiler:
+    """Keeps the ``keep`` slowest requests, with stack samples for a share of them.
+
+    A ``sample_rate`` share of requests is profiled: while one runs, a thread
+    samples the event loop thread's stack every ``interval`` seconds. The
+    loop interleaves concurrent requests, so a profile may contain samples of
+    other requests' work; under light load it shows where the time went.
+    Firestore calls run on the pool and show up as time awaiting them.
+    """
+
+    def __init__(self, keep: int, sample_rate: float = 0.1, interval: float = 0.005):
+        self.keep = keep
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self._slowest: List[Tuple[float, int, dict]] = []  # Min-heap on duration
+        self._sequence = 0
+        self._active: Dict[RequestMetrics, int] = {}
+        self._lock = threading.Lock()
+        self._sampler: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.keep > 0
+
+    def begin(self, request: RequestMetrics) -> None:
+        if not self.enabled or random.random() >= self.sample_rate:
+            return
+        request.stacks = Counter()
+        with self._lock:
+            self._active[request] = threading.get_ident()
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample, name="profiler", daemon=True)
+                self._sampler.start()
+
+    def _sample(self) -> None:
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._sampler = None
+                    return
+                active = list(self._active.items())
+            frames = sys._current_frames()
+            for request, thread_id in active:
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    request.stacks[_fold(frame)] += 1
+            time.sleep(self.interval)
+
+    def end(self, request: RequestMetrics, status_code: int, seconds: float) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._active.pop(request, None)
+            if len(self._slowest) >= self.keep and seconds <= self._slowest[0][0]:
+                return
+            self._sequence += 1
+            entry = {
+                "method": request.method,
+                "path": request.scope.get("path"),
+                "endpoint": request.endpoint,
+                "status": status_code,
+                "duration_ms": round(seconds * 1000, 2),
+                "finished_at": time.time(),
+                "stages_ms": {name: round(value * 1000, 2) for name, value in request.stages.items()},
+                "firestore_reads": request.reads,
+                "firestore_writes": request.writes,
+                "candidates": request.candidates,
+                "returned": request.returned,
+                "stacks": [f"{stack} {count}" for stack, count in request.stacks.most_common()]
+                          if request.stacks is not None else None,
+            }
+            heapq.heappush(self._slowest, (seconds, self._sequence, entry))
+            if len(self._slowest) > self.keep:
+                heapq.heappop(self._slowest)
+
+    def slowest(self) -> List[dict]:
+        with self._lock:
+            return [entry for _, _, entry in sorted(self._slowest, reverse=True)]
+
+
+class MetricsMiddleware:
+    """ASGI middleware that opens a RequestMetrics for every HTTP request.
+
+    The metrics object lives in a context variable, so stage timers and
+    Firestore counters anywhere below the handler (including pool threads
+    started through datastore.run_db and background tasks the request
+    creates) are attributed to the request's endpoint.
+    """
+
+    def __init__(self, app, server_timing: bool = False, profiler: Optional[SlowRequestProfiler] = None):
+        self.app = app
+        self.server_timing = server_timing
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request = RequestMetrics(scope)
+        token = _current.set(request)
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.server_timing:
+                    timing = request.server_timing(time.perf_counter() - request.started)
+                    message = {**message, "headers": list(message.get("headers", []))
+                               + [(b"server-timing", timing.encode("latin-1"))]}
+            await send(message)
+
+        if self.profiler is not None:
+            self.profiler.begin(request)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            seconds = time.perf_counter() - request.started
+            registry.observe_request(request, status_code, seconds)
+            if self.profiler is not None:
+                self.profiler.end(request, status_code, seconds)
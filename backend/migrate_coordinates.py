@@ -0,0 +1,84 @@
+"""Migrate camera_info coordinates from strings to numbers, adding location_point and geohash.
+
+Safe to re-run: documents that are already migrated are not rewritten.
+
+Usage: python migrate_coordinates.py [--dry-run] [--workers N]
+"""
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+
+from coordinates import DERIVED_FIELDS, with_coordinates
+
+
+BATCH_SIZE = 500
+COORDINATE_FIELDS = ("latitude", "longitude") + DERIVED_FIELDS
+
+
+def coordinate_changes(camera_data: dict) -> dict:
+    """Fields to write to bring the document's coordinates to the numeric form."""
+    migrated = with_coordinates(dict(camera_data))
+    return {
+        key: migrated[key]
+        for key in COORDINATE_FIELDS
+        if key in migrated and camera_data.get(key) != migrated[key]
+    }
+
+
+def migrate(db, dry_run: bool = False, workers: int = 8):
+    """Returns (updated, invalid): documents rewritten and documents with unusable coordinates."""
+    updated = 0
+    invalid = []
+    pending = set()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        batch = db.batch()
+        operations_count = 0
+        for doc in db.collection("camera_info").stream():
+            camera_data = doc.to_dict()
+            changes = coordinate_changes(camera_data)
+            if "geohash" not in changes and "geohash" not in camera_data:
+                invalid.append(doc.id)
+                continue
+            if not changes:
+                continue
+
+            updated += 1
+            if dry_run:
+                continue
+            batch.update(doc.reference, changes)
+            operations_count += 1
+            if operations_count == BATCH_SIZE:
+                # Commit batches concurrently, with at most 2 per worker in flight
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                pending.add(executor.submit(batch.commit))
+                batch = db.batch()
+                operations_count = 0
+
+        if operations_count > 0:
+            pending.add(executor.submit(batch.commit))
+        for future in pending:
+            future.result()
+    return updated, invalid
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="Only count the documents that need updating")
+    parser.add_argument("--workers", type=int, default=8, help="Batches committed in parallel")
+    args = parser.parse_args()
+
+    cred = credentials.Certificate("cctv-locator-police-hackathon-firebase-adminsdk-w7zln-e12925260e.json")
+    firebase_admin.initialize_app(cred)
+
+    count, invalid = migrate(firestore.client(), dry_run=args.dry_run, workers=args.workers)
+    print(f"{'Would update' if args.dry_run else 'Updated'} {count} camera documents")
+    if invalid:
+        print(f"{len(invalid)} documents have missing or invalid coordinates and were left unchanged:")
+        for camera_id in invalid:
+            print(f"  {camera_id}")
@@ -0,0 +1,156 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+from geo import bbox_around
+
+
+# Tiles used for invalidation. A write to a camera drops every cached result
+# whose search area overlaps the camera's tile.
+TILE_SIZE_DEG = 0.01
+
+
+class _Entry:
+    __slots__ = ("radius_km", "results", "expires_at", "tiles")
+
+    def __init__(self, radius_km: float, results: list, expires_at: float, tiles: Set[Tuple[int, int]]):
+        self.radius_km = radius_km
+        self.results = results
+        self.expires_at = expires_at
+        self.tiles = tiles
+
+
+class NearbyCache:
+    """LRU + TTL cache of /nearby_cameras results.
+
+    Query centers are snapped to a grid of ``quantum_deg`` so that requests
+    from roughly the same spot share an entry; results are computed for the
+    snapped center. One entry is kept per (center, filters) with the largest
+    radius seen, and smaller radii are answered by cutting its distance-sorted
+    results.
+
+    A result computed while a camera in its area was being written could
+    predate the write, so callers read ``generation`` before computing and
+    pass it to ``put``, which skips the result if a tile it covers was
+    invalidated since.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 60, quantum_deg: float = 0.0001):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.quantum_deg = quantum_deg
+        self._entries: "OrderedDict[tuple, _Entry]" = OrderedDict()
+        self._tiles: Dict[Tuple[int, int], Set[tuple]] = {}
+        self._lock = threading.Lock()
+        # Bumped by every invalidation; the last value per invalidated tile, and at the last clear()
+        self._generation = 0
+        self._invalidated_at: Dict[Tuple[int, int], int] = {}
+        self._cleared_at = 0
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def snap(self, lat: float, lon: float) -> Tuple[float, float]:
+        if not self.enabled:
+            return lat, lon
+        q = self.quantum_deg
+        return round(round(lat / q) * q, 7), round(round(lon / q) * q, 7)
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def key(self, lat: float, lon: float, *filters) -> tuple:
+        lat, lon = self.snap(lat, lon)
+        return (lat, lon) + tuple(str(f).lower() if f is not None else None for f in filters)
+
+    def get(self, key: tuple, radius_km: float) -> Optional[list]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at < time.monotonic() or entry.radius_km < radius_km:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if entry.radius_km == radius_km:
+                self.hits += 1
+                return entry.results
+            self.partial_hits += 1
+            return [result for result in entry.results if result["distance"] <= radius_km]
+
+    def put(self, key: tuple, radius_km: float, results: list, generation: int) -> None:
+        """Cache results computed after reading ``generation``."""
+        if not self.enabled:
+            return
+        min_lat, max_lat, min_lon, max_lon = bbox_around(key[0], key[1], radius_km)
+        tiles = {
+            (ty, tx)
+            for ty in range(math.floor(min_lat / TILE_SIZE_DEG), math.floor(max_lat / TILE_SIZE_DEG) + 1)
+            for tx in range(math.floor(min_lon / TILE_SIZE_DEG), math.floor(max_lon / TILE_SIZE_DEG) + 1)
+        }
+        with self._lock:
+            if self._cleared_at > generation or any(
+                    self._invalidated_at.get(tile, -1) > generation for tile in tiles):
+                return  # A write in the area may have landed after the results were computed
+            existing = self._entries.get(key)
+            if existing is not None and existing.radius_km > radius_km and existing.expires_at >= time.monotonic():
+                return  # Keep the entry that can answer more queries
+            self._drop(key)
+            self._entries[key] = _Entry(radius_km, results, time.monotonic() + self.ttl_seconds, tiles)
+            for tile in tiles:
+                self._tiles.setdefault(tile, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key: tuple) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tile in entry.tiles:
+            keys = self._tiles.get(tile)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tiles[tile]
+
+    def invalidate_point(self, lat: float, lon: float) -> None:
+        tile = (math.floor(lat / TILE_SIZE_DEG), math.floor(lon / TILE_SIZE_DEG))
+        with self._lock:
+            self._generation += 1
+            self._invalidated_at[tile] = self._generation
+            for key in list(self._tiles.get(tile, ())):
+                self._drop(key)
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._cleared_at = self._generation
+            self._invalidated_at.clear()
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._tiles.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.partial_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "partial_hits": self.partial_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits + self.partial_hits) / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,59 @@
+"""Rebuild the stats and area_stats counters from a full scan of camera_info and tickets.
+
+Use it to initialize the counters, after changing STATS_AREA_PRECISION, or
+after writes that bypassed the API. Writes made while it runs may be
+counted twice or not at all, so run it when the API is idle.
+
+Usage: python rebuild_stats.py [--dry-run]
+"""
+import argparse
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+
+from stats import AREA_STATS_COLLECTION, STATS_COLLECTION, full_counts, plain
+
+
+BATCH_SIZE = 500
+
+
+def rebuild(db, dry_run: bool = False) -> dict:
+    """Recount and overwrite the counters; returns the fleet counts."""
+    cameras = (doc.to_dict() for doc in db.collection("camera_info").stream())
+    tickets = (doc.to_dict() for doc in db.collection("tickets").stream())
+    documents = dict(full_counts(cameras, tickets).documents())
+    fleet = plain(documents.pop(None, {}))
+    if dry_run:
+        return fleet
+
+    # The whole count goes to shard 0; the other shards and areas that no
+    # longer hold cameras are removed
+    writes = [(db.collection(STATS_COLLECTION).document("shard_0"), fleet)]
+    writes += [(doc.reference, None) for doc in db.collection(STATS_COLLECTION).stream() if doc.id != "shard_0"]
+    writes += [(doc.reference, None) for doc in db.collection(AREA_STATS_COLLECTION).stream()
+               if doc.id not in documents]
+    writes += [(db.collection(AREA_STATS_COLLECTION).document(area), {"area": area, **plain(counts)})
+               for area, counts in documents.items()]
+
+    for start in range(0, len(writes), BATCH_SIZE):
+        batch = db.batch()
+        for ref, data in writes[start:start + BATCH_SIZE]:
+            if data is None:
+                batch.delete(ref)
+            else:
+                batch.set(ref, data)
+        batch.commit()
+    return fleet
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="Only print the recounted totals")
+    args = parser.parse_args()
+
+    cred = credentials.Certificate("cctv-locator-police-hackathon-firebase-adminsdk-w7zln-e12925260e.json")
+    firebase_admin.initialize_app(cred)
+
+    fleet = rebuild(firestore.client(), dry_run=args.dry_run)
+    print(f"{'Counted' if args.dry_run else 'Rebuilt counters for'} "
+          f"{fleet.get('cameras', {}).get('total', 0)} cameras and {fleet.get('tickets', {}).get('total', 0)} tickets")
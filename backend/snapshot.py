@@ -0,0 +1,365 @@
+import base64
+import json
+import math
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional
+
+import numpy as np
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+from google.cloud.firestore import GeoPoint
+
+from camera_index import CELL_SIZE_DEG, TEXT_FIELDS, parse_coordinates
+
+try:
+    import fcntl
+except ImportError:  # Windows: snapshots are still written atomically, just not serialized
+    fcntl = None
+
+
+SNAPSHOT_VERSION = 4
+
+# Text field codes that are not string table offsets
+NULL = -1
+NUMERIC = -2  # A coordinate stored as a number: read the float column
+ABSENT = -3   # The document has no such field
+EXTRA = -4    # Neither a string nor None: the value is in the row's extra fields
+
+# Fields the index derives, never stored in the extra fields
+_INDEX_FIELDS = {"id", "status_class", "ownership_class"}
+_TEXT_COLUMNS = {field: column for column, field in enumerate(TEXT_FIELDS)}
+
+_absent = object()
+
+# Cell key of rows without valid coordinates; sorts after every real cell
+_NO_CELL = np.iinfo(np.int64).max
+
+
+def cell_keys(lat: np.ndarray, lon: np.ndarray, cell_size: float) -> np.ndarray:
+    """Grid cell of each point as one int64 that sorts by cell row, then column."""
+    valid = ~(np.isnan(lat) | np.isnan(lon))
+    keys = np.full(len(lat), _NO_CELL, dtype=np.int64)
+    keys[valid] = (np.floor(lat[valid] / cell_size).astype(np.int64) * 2**32
+                   + np.floor(lon[valid] / cell_size).astype(np.int64) + 2**31)
+    return keys
+
+
+def encode_value(value):
+    """A Firestore field value as JSON, tagging the types JSON has no notation for."""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, DatetimeWithNanoseconds):
+        return {"$type": "timestamp", "value": value.rfc3339()}
+    if isinstance(value, datetime):
+        return {"$type": "datetime", "value": value.isoformat()}
+    if isinstance(value, bytes):
+        return {"$type": "bytes", "value": base64.b64encode(value).decode("ascii")}
+    if isinstance(value, GeoPoint):
+        return {"$type": "geopoint", "value": [value.latitude, value.longitude]}
+    if isinstance(value, list):
+        return [encode_value(item) for item in value]
+    if isinstance(value, dict):
+        encoded = {key: encode_value(item) for key, item in value.items()}
+        # A map that happens to have a $type key must not read back as a tagged value
+        return {"$type": "map", "value": encoded} if "$type" in value else encoded
+    raise TypeError(f"Cannot store {type(value).__name__} values in a camera snapshot")
+
+
+def decode_value(value):
+    if isinstance(value, list):
+        return [decode_value(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+    kind = value.get("$type")
+    if kind is None:
+        return {key: decode_value(item) for key, item in value.items()}
+    if kind == "map":
+        return {key: decode_value(item) for key, item in value["value"].items()}
+    if kind == "timestamp":
+        return DatetimeWithNanoseconds.from_rfc3339(value["value"])
+    if kind == "datetime":
+        return datetime.fromisoformat(value["value"])
+    if kind == "bytes":
+        return base64.b64decode(value["value"])
+    if kind == "geopoint":
+        return GeoPoint(*value["value"])
+    raise ValueError(f"Unknown value type in camera snapshot: {kind}")
+
+
+class CameraSnapshot:
+    """Read-only view of an on-disk camera_info snapshot.
+
+    Every array is memory-mapped, so the pages are shared by all workers
+    that open the same snapshot; CameraIndex answers queries from them
+    directly and only keeps cameras changed since in its own memory. Rows
+    are sorted by grid cell (``cell_key``), so the rows of a run of cells
+    along one cell row are contiguous. Strings are interned into a single
+    UTF-8 blob; each text field is an int32 column of offsets into that
+    table, or one of the negative codes above. Fields outside TEXT_FIELDS,
+    and text fields holding other types, are stored per row as JSON objects
+    in a second blob, with tagged values for types JSON lacks (see
+    ``encode_value``).
+    """
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta["version"] != SNAPSHOT_VERSION or meta["text_fields"] != TEXT_FIELDS:
+            raise ValueError(f"Incompatible snapshot format in {path}")
+        self.path = path
+        self.created_at: float = meta["created_at"]
+        self.count: int = meta["count"]
+        self.cell_size: float = meta["cell_size"]
+        # String table code of "Working", -1 when no camera has that status
+        self.working_code: int = meta["working_code"]
+
+        def load(name):
+            # A plain ndarray over the mapping: np.memmap indexing is several times slower
+            return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r").view(np.ndarray)
+
+        self.ids = load("ids")
+        self.id_order = load("id_order")
+        self.cell_key = load("cell_key")
+        self.latitude = load("latitude")
+        self.longitude = load("longitude")
+        self.status_class = load("status_class")
+        self.ownership_class = load("ownership_class")
+        self.text = load("text")
+        self.string_offsets = load("string_offsets")
+        self.string_blob = memoryview(load("string_blob"))
+        self.extra_offsets = load("extra_offsets")
+        self.extra_blob = load("extra_blob")
+
+    def __len__(self) -> int:
+        return self.count
+
+    def string(self, code: int) -> Optional[str]:
+        if code < 0:
+            return None
+        start, end = self.string_offsets[code], self.string_offsets[code + 1]
+        return str(self.string_blob[start:end], "utf-8")
+
+    def camera_id(self, row: int) -> str:
+        return self.string(int(self.ids[row]))
+
+    def camera_ids(self, rows: np.ndarray) -> List[str]:
+        return [self.string(code) for code in self.ids[rows].tolist()]
+
+    def find(self, camera_id: str) -> Optional[int]:
+        """Row of a camera, by binary search over the ids in sorted order."""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.camera_id(int(self.id_order[mid])) < camera_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count:
+            row = int(self.id_order[lo])
+            if self.camera_id(row) == camera_id:
+                return row
+        return None
+
+    def rows_by_id(self) -> dict:
+        """Every camera id mapped to its row; for bulk lookups, where ``find`` per id is too slow."""
+        return dict(zip(self.camera_ids(np.arange(self.count)), range(self.count)))
+
+    def extra(self, row: int) -> dict:
+        start, end = self.extra_offsets[row], self.extra_offsets[row + 1]
+        if end == start:
+            return {}
+        return decode_value(json.loads(self.extra_blob[start:end].tobytes().decode("utf-8")))
+
+    def record(self, row: int) -> dict:
+        """Rebuild the camera document stored in a row, as _Store.record does."""
+        extra = self.extra(row)
+        camera_data = {"id": self.camera_id(row)}
+        for field, code in zip(TEXT_FIELDS, self.text[row].tolist()):
+            if code == NUMERIC:
+                camera_data[field] = float((self.latitude if field == "latitude" else self.longitude)[row])
+            elif code == EXTRA:
+                camera_data[field] = extra.pop(field)
+            elif code != ABSENT:
+                camera_data[field] = self.string(code)
+        camera_data["status_class"] = int(self.status_class[row])
+        camera_data["ownership_class"] = int(self.ownership_class[row])
+        camera_data.update(extra)
+        return camera_data
+
+    def records(self) -> Iterator[dict]:
+        for row in range(self.count):
+            yield self.record(row)
+
+    def bbox_rows(self, min_lat: float, max_lat: float, min_lon: float, max_lon: float) -> np.ndarray:
+        """Rows whose coordinates fall inside the box."""
+        if not self.count:
+            return np.zeros(0, dtype=np.int64)
+        cell_rows = np.arange(math.floor(min_lat / self.cell_size), math.floor(max_lat / self.cell_size) + 1,
+                              dtype=np.int64)
+        # One contiguous range of rows per cell row crossed by the box
+        lon_lo, lon_hi = math.floor(min_lon / self.cell_size), math.floor(max_lon / self.cell_size)
+        starts = np.searchsorted(self.cell_key, cell_rows * 2**32 + (lon_lo + 2**31))
+        ends = np.searchsorted(self.cell_key, cell_rows * 2**32 + (lon_hi + 2**31), side="right")
+        lengths = ends - starts
+        if not lengths.sum():
+            return np.zeros(0, dtype=np.int64)
+        rows = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        lats, lons = self.latitude[rows], self.longitude[rows]
+        return rows[(lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)]
+
+    def working(self, rows: np.ndarray) -> np.ndarray:
+        """Whether each row's status is exactly "Working"."""
+        if self.working_code < 0:
+            return np.zeros(len(rows), dtype=bool)
+        return self.text[rows, _TEXT_COLUMNS["status"]] == self.working_code
+
+    def values(self, rows: np.ndarray, field: str, default=None) -> list:
+        """One field of many rows, ``default`` where it is missing; see _Store.values."""
+        row_list = rows.tolist()
+        if field == "id":
+            return self.camera_ids(rows)
+        column = _TEXT_COLUMNS.get(field)
+        if column is None:
+            values = [default] * len(row_list)
+            extra_fields = range(len(row_list))
+        else:
+            # Decode each distinct string once
+            codes = self.text[rows, column]
+            distinct, inverse = np.unique(codes, return_inverse=True)
+            decoded = [self.string(code) if code >= 0 else None if code == NULL else default
+                       for code in distinct.tolist()]
+            values = [decoded[k] for k in inverse.tolist()]
+            if field == "latitude" or field == "longitude":
+                coordinates = self.latitude if field == "latitude" else self.longitude
+                for i in np.flatnonzero(codes == NUMERIC).tolist():
+                    values[i] = float(coordinates[row_list[i]])
+            extra_fields = np.flatnonzero(codes == EXTRA).tolist()
+        starts, ends = self.extra_offsets[rows], self.extra_offsets[rows + 1]
+        for i in extra_fields:
+            if ends[i] > starts[i]:
+                extra = self.extra(row_list[i])
+                if field in extra:
+                    values[i] = extra[field]
+        return values
+def write_snapshot(directory: str, records: Iterable[dict], cell_size: float = CELL_SIZE_DEG) -> str:
+    """Write records (camera dicts with an ``id``) as a new snapshot and make it current."""
+    strings: List[bytes] = []
+    interned = {}
+
+    def intern(value: str) -> int:
+        code = interned.get(value)
+        if code is None:
+            code = interned[value] = len(strings)
+            strings.append(value.encode("utf-8"))
+        return code
+
+    ids, camera_ids, latitude, longitude, status_class, ownership_class, text = [], [], [], [], [], [], []
+    extras: List[bytes] = []
+    for camera_data in records:
+        camera_ids.append(camera_data["id"])
+        ids.append(intern(camera_data["id"]))
+        # The same coordinates the index keeps: NaN unless both are valid
+        location = parse_coordinates(camera_data)
+        lat, lon = location if location is not None else (math.nan, math.nan)
+        latitude.append(lat)
+        longitude.append(lon)
+        status_class.append(camera_data.get("status_class", 0))
+        ownership_class.append(camera_data.get("ownership_class", 0))
+        codes = []
+        extra = {field: value for field, value in camera_data.items()
+                 if field not in TEXT_FIELDS and field not in _INDEX_FIELDS}
+        for field in TEXT_FIELDS:
+            value = camera_data.get(field, _absent)
+            if value is _absent:
+                codes.append(ABSENT)
+            elif value is None:
+                codes.append(NULL)
+            elif isinstance(value, str):
+                codes.append(intern(value))
+            elif field in ("latitude", "longitude") and isinstance(value, float) and \
+                    value == (lat if field == "latitude" else lon):
+                codes.append(NUMERIC)
+            else:
+                codes.append(EXTRA)
+                extra[field] = value
+        text.append(codes)
+        extras.append(json.dumps(encode_value(extra)).encode("utf-8") if extra else b"")
+
+    latitude = np.array(latitude, dtype=np.float64)
+    longitude = np.array(longitude, dtype=np.float64)
+    keys = cell_keys(latitude, longitude, cell_size)
+    order = np.argsort(keys, kind="stable")
+    ids = np.array(ids, dtype=np.int32)[order]
+    text = np.array(text, dtype=np.int32).reshape(len(text), len(TEXT_FIELDS))[order]
+    extras = [extras[row] for row in order.tolist()]
+    camera_ids = [camera_ids[row] for row in order.tolist()]
+
+    created_at = time.time()
+    os.makedirs(directory, exist_ok=True)
+    name = f"snapshot-{time.time_ns()}"
+    path = os.path.join(directory, name)
+    os.makedirs(path)
+
+    np.save(os.path.join(path, "ids.npy"), ids)
+    np.save(os.path.join(path, "id_order.npy"),
+            np.array(sorted(range(len(camera_ids)), key=camera_ids.__getitem__), dtype=np.int64))
+    np.save(os.path.join(path, "cell_key.npy"), keys[order])
+    np.save(os.path.join(path, "latitude.npy"), latitude[order])
+    np.save(os.path.join(path, "longitude.npy"), longitude[order])
+    np.save(os.path.join(path, "status_class.npy"), np.array(status_class, dtype=np.int8)[order])
+    np.save(os.path.join(path, "ownership_class.npy"), np.array(ownership_class, dtype=np.int8)[order])
+    np.save(os.path.join(path, "text.npy"), text)
+    offsets = np.zeros(len(strings) + 1, dtype=np.int64)
+    np.cumsum([len(s) for s in strings], out=offsets[1:])
+    np.save(os.path.join(path, "string_offsets.npy"), offsets)
+    np.save(os.path.join(path, "string_blob.npy"), np.frombuffer(b"".join(strings), dtype=np.uint8))
+    offsets = np.zeros(len(extras) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in extras], out=offsets[1:])
+    np.save(os.path.join(path, "extra_offsets.npy"), offsets)
+    np.save(os.path.join(path, "extra_blob.npy"), np.frombuffer(b"".join(extras), dtype=np.uint8))
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump({"version": SNAPSHOT_VERSION, "created_at": created_at, "count": len(ids),
+                   "text_fields": TEXT_FIELDS, "cell_size": cell_size,
+                   "working_code": interned.get("Working", -1)}, f)
+
+    # Switch CURRENT atomically; readers never see a partially written snapshot
+    pointer = os.path.join(directory, "CURRENT")
+    with open(pointer + ".tmp", "w") as f:
+        f.write(name)
+    os.replace(pointer + ".tmp", pointer)
+
+    # Keep the previous snapshot for workers that may still be opening it.
+    # Deleting a snapshot another worker has mapped is safe on POSIX.
+    snapshots = sorted(entry for entry in os.listdir(directory) if entry.startswith("snapshot-"))
+    for old in snapshots[:-2]:
+        shutil.rmtree(os.path.join(directory, old), ignore_errors=True)
+    return path
+
+
+def read_snapshot(directory: str) -> Optional[CameraSnapshot]:
+    """Open the current snapshot, or return None if there is no usable one."""
+    try:
+        with open(os.path.join(directory, "CURRENT")) as f:
+            name = f.read().strip()
+        return CameraSnapshot(os.path.join(directory, name))
+    except (OSError, ValueError, KeyError) as e:
+        if not isinstance(e, FileNotFoundError):
+            print(f"Ignoring unreadable camera snapshot: {e}")
+        return None
+
+
+@contextmanager
+def snapshot_lock(directory: str):
+    """Exclusive lock so only one worker rebuilds the snapshot at a time."""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "snapshot.lock"), "w") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
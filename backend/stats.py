@@ -0,0 +1,186 @@
+import os
+import random
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from google.cloud.firestore import Increment
+
+from categories import classify_ownership, classify_status
+from coordinates import geohash_encode, parse_coordinate
+
+
+# Fleet counters are spread over shards so concurrent writes (bulk uploads,
+# field surveys) do not contend on one document; reads sum the shards.
+STATS_COLLECTION = "stats"
+STATS_SHARDS = int(os.environ.get("STATS_SHARDS", "8"))
+
+# Per-area camera counters, one document per geohash cell (~5 km at precision 5)
+AREA_STATS_COLLECTION = "area_stats"
+AREA_PRECISION = int(os.environ.get("STATS_AREA_PRECISION", "5"))
+
+# Key used for cameras/tickets without a value in a breakdown field
+MISSING = "(none)"
+
+# Counter path, e.g. ("cameras", "status", "working")
+Path = Tuple[str, ...]
+
+
+def _key(value) -> str:
+    text = str(value).strip() if value is not None else ""
+    return text or MISSING
+
+
+def camera_counts(camera_data: dict) -> Counter:
+    """The counters one camera document contributes to."""
+    return Counter([
+        ("cameras", "total"),
+        ("cameras", "status", classify_status(camera_data.get("status", "")).name.lower()),
+        ("cameras", "ownership", classify_ownership(camera_data.get("private_govt", "")).name.lower()),
+        ("cameras", "connected_network", _key(camera_data.get("connected_network"))),
+        ("cameras", "backup", _key(camera_data.get("backup"))),
+    ])
+
+
+def ticket_counts(ticket_data: dict) -> Counter:
+    return Counter([("tickets", "total"), ("tickets", "status", _key(ticket_data.get("status")))])
+
+
+def camera_area(camera_data: dict) -> Optional[str]:
+    lat = parse_coordinate(camera_data.get("latitude"), 90)
+    lon = parse_coordinate(camera_data.get("longitude"), 180)
+    if lat is None or lon is None:
+        return None
+    return geohash_encode(lat, lon, AREA_PRECISION)
+
+
+def _nested(counts: Dict[Path, int], wrap=Increment) -> dict:
+    document = {}
+    for path, count in counts.items():
+        node = document
+        for part in path[:-1]:
+            node = node.setdefault(part, {})
+        node[path[-1]] = wrap(count)
+    return document
+
+
+class StatsDelta:
+    """Counter changes caused by a set of writes, added to the batch that makes them.
+
+    Each change is described as (old document, new document), None for a
+    document that did not exist or was deleted, so the counters follow
+    creates, updates and deletes alike. Writing the increments in the same
+    batch keeps the counters consistent with the documents.
+    """
+
+    def __init__(self):
+        self.fleet: Counter = Counter()
+        self.areas: Dict[str, Counter] = defaultdict(Counter)
+
+    def camera(self, old: Optional[dict], new: Optional[dict]) -> "StatsDelta":
+        for camera_data, sign in ((old, -1), (new, 1)):
+            if camera_data is None:
+                continue
+            counts = camera_counts(camera_data)
+            area = camera_area(camera_data)
+            for path, count in counts.items():
+                self.fleet[path] += sign * count
+                if area is not None:
+                    self.areas[area][path] += sign * count
+        return self
+
+    def ticket(self, old: Optional[dict], new: Optional[dict]) -> "StatsDelta":
+        for ticket_data, sign in ((old, -1), (new, 1)):
+            if ticket_data is not None:
+                for path, count in ticket_counts(ticket_data).items():
+                    self.fleet[path] += sign * count
+        return self
+
+    def update(self, other: "StatsDelta") -> "StatsDelta":
+        self.fleet.update(other.fleet)
+        for area, counts in other.areas.items():
+            self.areas[area].update(counts)
+        return self
+
+    def documents(self) -> Iterable[Tuple[Optional[str], Dict[Path, int]]]:
+        """(area, non-zero counts) per counter document, area None for the fleet."""
+        fleet = {path: count for path, count in self.fleet.items() if count}
+        if fleet:
+            yield None, fleet
+        for area, counts in self.areas.items():
+            counts = {path: count for path, count in counts.items() if count}
+            if counts:
+                yield area, counts
+
+    @property
+    def writes(self) -> int:
+        """Number of counter documents add_to() writes."""
+        return sum(1 for _ in self.documents())
+
+    def add_to(self, db, batch) -> None:
+        for area, counts in self.documents():
+            if area is None:
+                shard = db.collection(STATS_COLLECTION).document(f"shard_{random.randrange(STATS_SHARDS)}")
+                batch.set(shard, _nested(counts), merge=True)
+            else:
+                batch.set(db.collection(AREA_STATS_COLLECTION).document(area),
+                          {"area": area, **_nested(counts)}, merge=True)
+
+
+T = TypeVar("T")
+
+
+def fit_batches(items: Iterable[Tuple[T, StatsDelta]], limit: int) -> Iterator[Tuple[List[T], StatsDelta]]:
+    """Group (write, its StatsDelta) pairs so each group's writes plus counter updates fit in ``limit``."""
+    group, delta = [], StatsDelta()
+    for item, item_delta in items:
+        if group and len(group) + 1 + delta.writes + item_delta.writes > limit:
+            yield group, delta
+            group, delta = [], StatsDelta()
+        group.append(item)
+        delta.update(item_delta)
+    if group:
+        yield group, delta
+
+
+def shard_refs(db) -> list:
+    return [db.collection(STATS_COLLECTION).document(f"shard_{shard}") for shard in range(STATS_SHARDS)]
+
+
+def sum_counts(documents: Iterable[Optional[dict]]) -> dict:
+    """Add up counter documents (shards or areas) into one nested dict."""
+    total = {}
+
+    def add(target: dict, source: dict):
+        for key, value in source.items():
+            if isinstance(value, dict):
+                add(target.setdefault(key, {}), value)
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                target[key] = target.get(key, 0) + value
+
+    def prune(node: dict):
+        # Breakdown keys whose count went back to zero
+        for key, value in list(node.items()):
+            if isinstance(value, dict):
+                prune(value)
+            elif value == 0 and key != "total":
+                del node[key]
+
+    for document in documents:
+        if document:
+            add(total, document)
+    prune(total)
+    return total
+
+
+def full_counts(cameras: Iterable[dict], tickets: Iterable[dict]) -> StatsDelta:
+    """Counters computed from scratch, for rebuilding them."""
+    delta = StatsDelta()
+    for camera_data in cameras:
+        delta.camera(None, camera_data)
+    for ticket_data in tickets:
+        delta.ticket(None, ticket_data)
+    return delta
+
+
+def plain(counts: Dict[Path, int]) -> dict:
+    return _nested(counts, wrap=int)
@@ -0,0 +1,244 @@
+import asyncio
+import random
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from google.api_core.exceptions import AlreadyExists
+from pydantic import BaseModel
+
+from camera_index import CameraIndex
+from datastore import commit_batch, get_doc
+from geo import bbox_around, haversine_km
+from stats import StatsDelta
+
+
+# Each submission is at most a camera, a ticket and one area counter, plus
+# one fleet counter shard per batch, within Firestore's 500 writes per batch
+MAX_BATCH_SUBMISSIONS = (500 - 1) // 3
+MAX_TRACKED_SUBMISSIONS = 10000
+# Failed submissions are recorded here; written ones are found by their ticket
+FAILURES_COLLECTION = "submission_failures"
+
+
+class QueueFull(Exception):
+    """Raised by WriteQueue.submit when too many submissions are waiting to be written."""
+
+
+class SubmissionStatus(BaseModel):
+    id: str
+    status: str = "queued"  # queued, written, failed
+    camera_id: Optional[str] = None
+    ticket_id: Optional[str] = None
+    submitted_at: datetime
+    written_at: Optional[datetime] = None
+    attempts: int = 0
+    detail: Optional[str] = None
+
+
+class Submission:
+    """A ticket, and optionally the camera it reports, written together.
+
+    The ticket ID doubles as the submission ID the client gets back.
+    """
+
+    def __init__(self, ticket_id: str, ticket_data: dict,
+                 camera_id: Optional[str] = None, camera_data: Optional[dict] = None):
+        self.ticket_id = ticket_id
+        self.ticket_data = ticket_data
+        self.camera_id = camera_id
+        self.camera_data = camera_data
+        self.delta = StatsDelta().camera(None, camera_data).ticket(None, ticket_data)
+        self.status = SubmissionStatus(id=ticket_id, camera_id=camera_id, ticket_id=ticket_id,
+                                       submitted_at=datetime.utcnow())
+
+    def add_to(self, db, batch) -> None:
+        # create() rather than set(): a retry of a commit that did land fails
+        # instead of counting the documents twice
+        if self.camera_data is not None:
+            batch.create(db.collection("camera_info").document(self.camera_id), self.camera_data)
+        batch.create(db.collection("tickets").document(self.ticket_id), self.ticket_data)
+
+
+class WriteQueue:
+    """Coalesces single submissions into batched, atomic Firestore commits.
+
+    Endpoints hand a Submission to ``submit`` and answer right away; writer
+    tasks take what is queued, up to ``max_batch`` submissions or whatever
+    arrived within ``max_delay`` seconds of the first, and commit it as one
+    batch together with the stats counters. A failed commit is retried with
+    backoff; the batch is atomic, so either every submission in it is
+    written or none is. The queue is bounded: when writes cannot keep up,
+    ``submit`` raises QueueFull instead of buffering without limit.
+
+    Cameras waiting in the queue are checked by ``find_duplicate`` alongside
+    the index, so two officers submitting the same camera at once are caught
+    before either is written.
+
+    ``statuses`` only holds this worker's submissions; ``status`` also
+    answers for the other workers' once they are written or have failed.
+    """
+
+    def __init__(self, index: CameraIndex, on_committed: Callable[[List[Submission]], None],
+                 max_pending: int = 2000, max_batch: int = 100, max_delay: float = 0.05,
+                 writers: int = 2, retries: int = 5, backoff: float = 0.2):
+        self.index = index
+        self.on_committed = on_committed
+        self.max_batch = max(1, min(max_batch, MAX_BATCH_SUBMISSIONS))
+        self.max_delay = max_delay
+        self.writers = writers
+        self.retries = retries
+        self.backoff = backoff
+        self.statuses: Dict[str, SubmissionStatus] = {}
+        self._queue: "asyncio.Queue[Submission]" = asyncio.Queue(maxsize=max_pending)
+        self._full = asyncio.Event()
+        # camera_id -> (lat, lon) of cameras queued but not yet written
+        self._pending_cameras: Dict[str, Tuple[float, float]] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._db = None
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def start(self, db) -> None:
+        self._db = db
+        self._tasks = [asyncio.create_task(self._write_loop()) for _ in range(self.writers)]
+
+    async def stop(self, timeout: float = 10) -> None:
+        """Write what is still queued, then stop the writers."""
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"{self._queue.qsize()} submissions were not written before shutdown")
+        for task in self._tasks:
+            task.cancel()
+
+    def find_duplicate(self, lat: float, lon: float, meters: float) -> Optional[str]:
+        """ID of an indexed or queued camera within ``meters`` of the point, if any."""
+        radius_km = meters / 1000
+        candidates = self.index.query_bbox(*bbox_around(lat, lon, radius_km))
+        if len(candidates):
+            distances = haversine_km(lat, lon, candidates.lats, candidates.lons)
+            nearest = int(np.argmin(distances))
+            if distances[nearest] <= radius_km:
+                return candidates.camera_id(nearest)
+        if self._pending_cameras:
+            camera_ids = list(self._pending_cameras)
+            points = np.array(list(self._pending_cameras.values()), dtype=np.float64)
+            distances = haversine_km(lat, lon, points[:, 0], points[:, 1])
+            nearest = int(np.argmin(distances))
+            if distances[nearest] <= radius_km:
+                return camera_ids[nearest]
+        return None
+
+    async def status(self, submission_id: str) -> Optional[SubmissionStatus]:
+        """Status of a submission made to any worker, None if unknown.
+
+        Submissions queued on another worker are unknown until they are
+        written (their ticket exists) or have failed (recorded in
+        FAILURES_COLLECTION).
+        """
+        submission_status = self.statuses.get(submission_id)
+        if submission_status is not None:
+            return submission_status
+        db = self._db
+        failure = await get_doc(db.collection(FAILURES_COLLECTION).document(submission_id))
+        if failure.exists:
+            return SubmissionStatus.model_validate(failure.to_dict())
+        ticket = await get_doc(db.collection("tickets").document(submission_id))
+        if ticket.exists:
+            ticket_data = ticket.to_dict()
+            return SubmissionStatus(id=submission_id, status="written", camera_id=ticket_data.get("camera_id"),
+                                    ticket_id=submission_id, submitted_at=ticket_data["reported_at"])
+        return None
+
+    def submit(self, submission: Submission) -> SubmissionStatus:
+        try:
+            self._queue.put_nowait(submission)
+        except asyncio.QueueFull:
+            raise QueueFull(f"{self._queue.qsize()} submissions are waiting to be written")
+        if submission.camera_data is not None:
+            self._pending_cameras[submission.camera_id] = (
+                submission.camera_data["latitude"], submission.camera_data["longitude"])
+        if self._queue.qsize() >= self.max_batch:
+            self._full.set()
+        self._track(submission.status)
+        return submission.status
+
+    def _track(self, status: SubmissionStatus) -> None:
+        self.statuses[status.id] = status
+        # Forget the oldest finished submissions so the registry stays bounded
+        for submission_id in list(self.statuses)[:max(0, len(self.statuses) - MAX_TRACKED_SUBMISSIONS)]:
+            if self.statuses[submission_id].status != "queued":
+                del self.statuses[submission_id]
+
+    async def _write_loop(self) -> None:
+        while True:
+            group = [await self._queue.get()]
+            # Flush on a full batch or when the first submission has waited max_delay
+            if self._queue.qsize() < self.max_batch - 1:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+            while len(group) < self.max_batch and not self._queue.empty():
+                group.append(self._queue.get_nowait())
+            if self._queue.qsize() < self.max_batch:
+                self._full.clear()
+            try:
+                await self._commit(group)
+            finally:
+                for submission in group:
+                    self._pending_cameras.pop(submission.camera_id, None)
+                    self._queue.task_done()
+
+    async def _commit(self, group: List[Submission]) -> None:
+        db = self._db
+        delta = StatsDelta()
+        for submission in group:
+            delta.update(submission.delta)
+
+        for attempt in range(1, self.retries + 1):
+            for submission in group:
+                submission.status.attempts = attempt
+            batch = db.batch()
+            for submission in group:
+                submission.add_to(db, batch)
+            delta.add_to(db, batch)
+            try:
+                await commit_batch(batch)
+                break
+            except AlreadyExists:
+                if attempt == 1:
+                    await self._failed(group, "Document already exists")
+                    return
+                break  # An earlier attempt was committed even though it reported an error
+            except Exception as e:
+                if attempt == self.retries:
+                    await self._failed(group, f"Write failed: {e}")
+                    return
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+
+        written_at = datetime.utcnow()
+        for submission in group:
+            submission.status.status = "written"
+            submission.status.written_at = written_at
+        try:
+            self.on_committed(group)
+        except Exception as e:
+            print(f"Failed to process written submissions: {e}")
+
+    async def _failed(self, group: List[Submission], detail: str) -> None:
+        print(f"Dropped {len(group)} submissions: {detail}")
+        db = self._db
+        batch = db.batch()
+        for submission in group:
+            submission.status.status = "failed"
+            submission.status.detail = detail
+            batch.set(db.collection(FAILURES_COLLECTION).document(submission.ticket_id),
+                      submission.status.model_dump())
+        try:
+            await commit_batch(batch)
+        except Exception as e:
+            print(f"Failed to record the failed submissions: {e}")
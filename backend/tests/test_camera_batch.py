@@ -0,0 +1,53 @@
+import os
+import sys
+
+os.environ.setdefault("FIRESTORE_EMULATOR_HOST", "localhost:1")
+os.environ["CAMERA_SNAPSHOT_DIR"] = ""
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.join(BACKEND, "bench"))
+
+import pytest
+from fastapi.testclient import TestClient
+
+import datastore
+import fake_firestore
+
+
+@pytest.fixture(scope="module")
+def client():
+    # The shutdown hook closes the datastore pool, so start the app once per module
+    datastore._client = fake_firestore.Client()
+    import main
+    with TestClient(main.app) as client:
+        yield client
+
+
+def create_camera(client, **fields):
+    body = {"location": "Gate 1", "latitude": "17.385", "longitude": "78.4867", **fields}
+    response = client.post("/cameras", json=body)
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def test_batch_get_created_camera(client):
+    camera_id = create_camera(client)
+    response = client.post("/cameras:batchGet", json={"ids": [camera_id, "missing"]})
+    assert response.status_code == 200, response.text
+    found, missing = response.json()["results"]
+    assert found["ok"] and found["camera"]["id"] == camera_id
+    assert found["camera"]["location"] == "Gate 1"
+    assert not missing["ok"]
+
+
+def test_batch_update_does_not_write_id(client):
+    camera_id = create_camera(client)
+    response = client.post("/cameras:batchUpdate", json={"updates": [{"id": camera_id, "status": "Working"}]})
+    assert response.status_code == 200, response.text
+    assert response.json()["results"][0]["ok"]
+
+    stored = datastore._client.collection("camera_info").document(camera_id).get().to_dict()
+    assert stored["id"] == camera_id and stored["status"] == "Working"
+
+    response = client.post("/cameras:batchGet", json={"ids": [camera_id]})
+    assert response.json()["results"][0]["camera"]["status"] == "Working"
@@ -100,7 +100,8 @@ async function handleFileUpload(event) {
         });
 
         if (response.ok) {
-            console.log('File uploaded successfully');
+            const job = await response.json();
+            console.log('File uploaded, import job started:', job.job_id);
         } else {
             console.error('File upload failed');
         }
@@ -14,8 +14,21 @@ import {
 } from "@/components/ui/dialog"
 import { Alert, AlertTitle, AlertDescription } from "@/components/ui/alert"
 
+// Apply a ticket event from /events to the list of pending tickets
+function applyTicketEvent(tickets, { action, id, ticket }) {
+    if (action === "deleted" || !ticket || ticket.status !== "Pending") {
+        return tickets.filter(existing => existing.id !== id);
+    }
+    if (tickets.some(existing => existing.id === id)) {
+        // Keep the embedded camera, which events do not carry
+        return tickets.map(existing => existing.id === id ? { ...existing, ...ticket } : existing);
+    }
+    return [ticket, ...tickets];
+}
+
 const Tickets = () => {
     const [tickets, setTickets] = useState([])
+    const [nextCursor, setNextCursor] = useState(null)
     const [isTicketDialogOpen, setIsTicketDialogOpen] = useState(false)
     const [selectedTicket, setSelectedTicket] = useState(null);
     const [alertVisible, setAlertVisible] = useState(false);
@@ -31,14 +44,18 @@ const Tickets = () => {
         { title: "System Status", content: "Operational" },
     ]
 
-    async function fetchTickets() {
+    async function fetchTickets(cursor = null) {
         try {
-            const response = await fetch('http://10.70.13.203:8080/tickets'); // Replace with your API endpoint
+            // Pending tickets only, one page at a time, with the camera record embedded
+            const params = new URLSearchParams({ status: "Pending", embed_camera: "true", limit: "50" });
+            if (cursor) params.set("cursor", cursor);
+            const response = await fetch(`http://10.70.13.203:8080/tickets?${params}`); // Replace with your API endpoint
             if (!response.ok) {
                 throw new Error('Network response was not ok');
             }
             const data = await response.json();
-            setTickets(data);
+            setTickets(previous => cursor ? [...previous, ...data.tickets] : data.tickets);
+            setNextCursor(data.next_cursor ?? null);
         } catch (error) {
             setError(error.message);
         } finally {
@@ -46,15 +63,18 @@ const Tickets = () => {
         }
     }
 
-    const handleCardClick = async (ticket_camera_id, ticket_id) => {
-        // Fetch details for the selected ticket from another API using ticket.camera_id
+    const handleCardClick = async (ticket) => {
+        // The camera record is embedded in the ticket; fall back to fetching it
         try {
-            const response = await fetch(`http://10.70.13.203:8080/cameras/${ticket_camera_id}`); // Replace with your details API endpoint
-            if (!response.ok) throw new Error('Network response was not ok');
-            const data = await response.json();
+            let data = ticket.camera;
+            if (!data) {
+                const response = await fetch(`http://10.70.13.203:8080/cameras/${ticket.camera_id}`); // Replace with your details API endpoint
+                if (!response.ok) throw new Error('Network response was not ok');
+                data = await response.json();
+            }
             const updatedData = {
                 ...data, // Spread the existing data properties
-                id: ticket_id // Replace id with the ticket's id
+                id: ticket.id // Replace id with the ticket's id
             };
             setSelectedTicket(updatedData);
             setIsTicketDialogOpen(true); // Open the dialog
@@ -85,7 +105,8 @@ const Tickets = () => {
             setAlertVisible(true);
 
             setIsTicketDialogOpen(false); // Close the dialog after the operation
-            fetchTickets();
+            // No longer pending; the ticket event does the same for other admins
+            setTickets(previous => previous.filter(ticket => ticket.id !== ticket_id));
             setTimeout(() => {
                 setAlertVisible(false);
             }, 3000);
@@ -96,6 +117,14 @@ const Tickets = () => {
 
     useEffect(() => {
         fetchTickets();
+        // Live changes to pending tickets, including tickets leaving that status
+        const events = new EventSource("http://10.70.13.203:8080/events?types=ticket&ticket_status=Pending"); // Replace with your API endpoint
+        events.addEventListener("ticket", (event) => {
+            setTickets(previous => applyTicketEvent(previous, JSON.parse(event.data)));
+        });
+        // Sent when events were missed; the list has to be loaded again
+        events.addEventListener("resync", () => fetchTickets());
+        return () => events.close();
     }, [])
 
     return (
@@ -119,7 +148,7 @@ const Tickets = () => {
                         {tickets
                             .filter(ticket => ticket.status === "Pending") // Filter to include only pending tickets
                             .map((ticket) => (
-                                <Card key={ticket.id} onClick={() => handleCardClick(ticket.camera_id, ticket.id)}>
+                                <Card key={ticket.id} onClick={() => handleCardClick(ticket)}>
                                     <CardHeader>
                                         <CardTitle className={"text-lg"}>{ticket.description || "Untitled"}</CardTitle> {/* Use description as the title */}
                                     </CardHeader>
@@ -133,6 +162,11 @@ const Tickets = () => {
                                     </CardContent>
                                 </Card>
                             ))}
+                        {nextCursor && (
+                            <Button variant="outline" onClick={() => fetchTickets(nextCursor)}>
+                                Load more
+                            </Button>
+                        )}
                         <Dialog open={isTicketDialogOpen} onOpenChange={setIsTicketDialogOpen}>
                             <DialogContent className="sm:max-w-[425px]">
                                 <DialogHeader>